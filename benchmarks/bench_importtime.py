@@ -0,0 +1,100 @@
+"""
+Regression benchmark of the command line startup time, based on `python -X importtime`. It fails
+if running `--help` imports any heavy dependency, or if the modules it imports besides typer and
+its rendering dependencies take longer than the budget to import.
+
+Usage:
+    python benchmarks/bench_importtime.py --budget-ms 50
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+# Only needed by commands which crawl, load or plot, never to start the command line
+HEAVY_MODULES: tuple[str, ...] = (
+    "matplotlib",
+    "numpy",
+    "pandas",
+    "PIL",
+    "pyarrow",
+    "pyexifinfo",
+    "seaborn",
+)
+# Imported by typer itself to parse arguments and render help
+TYPER_MODULES: tuple[str, ...] = ("typer", "click", "rich", "markdown_it", "pygments", "shellingham")
+COMMANDS: tuple[tuple[str, ...], ...] = (
+    ("--help",),
+    ("crawl", "--help"),
+    ("load", "--help"),
+    ("merge", "--help"),
+    ("cache", "--help"),
+    ("watch", "--help"),
+)
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(arguments: tuple[str, ...]) -> tuple[float, list[tuple[str, int, int]]]:
+    """
+    Run the command line with the provided arguments under `-X importtime`.
+
+    Returns:
+        The wall time of the run in seconds, and a list of the imported top-level modules with
+        their name, depth and cumulative import time in microseconds.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "photocrawl", *arguments],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_time = time.perf_counter() - start
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match.group(4), len(match.group(3)) // 2, int(match.group(2))))
+    return wall_time, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=50.0,
+        help="Maximum import time, in milliseconds, of modules other than typer and its dependencies.",
+    )
+    args = parser.parse_args()
+
+    failures: list[str] = []
+    for arguments in COMMANDS:
+        wall_time, modules = import_times(arguments)
+        command = " ".join(arguments)
+        heavy = sorted({name for name, _, _ in modules if name.split(".")[0] in HEAVY_MODULES})
+        own_time_ms = (
+            sum(
+                cumulative
+                for name, depth, cumulative in modules
+                if depth == 0 and name.split(".")[0] not in TYPER_MODULES
+            )
+            / 1000
+        )
+        print(f"'{command}': {wall_time * 1000:.0f} ms wall time, {own_time_ms:.1f} ms of own imports")
+        if heavy:
+            failures.append(f"'{command}' imports heavy modules {heavy}")
+        if own_time_ms > args.budget_ms:
+            failures.append(f"'{command}' own imports take {own_time_ms:.1f} ms, over {args.budget_ms} ms")
+
+    if failures:
+        print("\n".join(["FAILED:", *failures]))
+        sys.exit(1)
+    print("Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
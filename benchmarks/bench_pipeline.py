@@ -0,0 +1,147 @@
+"""
+Benchmark of the stages of the pipeline on synthetic photo libraries of increasing sizes, see
+`synthetic_library.py`. The `crawl_files`, `process_files`, `refactor_exif_data` and
+`plot_insight` steps are timed separately, and the best time of several repeats is kept.
+
+Results are written as JSON, and can be compared with those of a baseline run, so that changes
+in performance show up in review. The comparison fails if a stage got slower than the tolerance.
+Libraries are generated once in the libraries directory and reused by later runs, timings are
+therefore those of a warm filesystem cache.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --compare results.json
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from typing import Callable
+
+from loguru import logger
+from synthetic_library import generate_library
+
+from photocrawl import PhotoCrawler, __version__
+from photocrawl.backends import make_backend
+from photocrawl.plotting_functions import plot_insight
+
+DEFAULT_SIZES: tuple[int, ...] = (1_000, 10_000, 100_000)
+
+
+def best_time(function: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """The best wall time of `repeat` calls of the function, in seconds, and its last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench_library(library: pathlib.Path, backend: str, repeat: int, dpi: int) -> dict[str, float]:
+    """
+    Time each stage of the pipeline on a library.
+
+    Returns:
+        A dictionary of stage names to their best wall time in seconds. The time of
+        `process_files` includes crawling the library, as it crawls by itself.
+    """
+    crawler = PhotoCrawler(library, backend=make_backend(backend))
+    timings: dict[str, float] = {}
+    timings["crawl_files"], _ = best_time(lambda: list(crawler.crawl_files()), repeat)
+    timings["process_files"], exif_data = best_time(crawler.process_files, repeat)
+    timings["refactor_exif_data"], refactored = best_time(
+        lambda: crawler.refactor_exif_data(exif_data), repeat
+    )
+    with tempfile.TemporaryDirectory() as output_directory:
+        timings["plot_insight"], _ = best_time(
+            lambda: plot_insight(
+                refactored, pathlib.Path(output_directory), savefig=True, dpi=dpi, use_render_cache=False
+            ),
+            repeat,
+        )
+    return timings
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Print the ratio of each timing to that of the baseline.
+
+    Returns:
+        A list describing the stages which got slower than the tolerance.
+    """
+    baseline_timings = {(entry["files"], entry["stage"]): entry["seconds"] for entry in baseline["results"]}
+    regressions: list[str] = []
+    print("\n| Files | Stage | Baseline (s) | Current (s) | Ratio |\n|---:|---|---:|---:|---:|")
+    for entry in results["results"]:
+        reference = baseline_timings.get((entry["files"], entry["stage"]))
+        if reference is None:
+            continue
+        ratio = entry["seconds"] / reference
+        flag = " (slower)" if ratio > 1 + tolerance else ""
+        print(
+            f"| {entry['files']} | {entry['stage']} | {reference:.4f} | {entry['seconds']:.4f} "
+            f"| {ratio:.2f}{flag} |"
+        )
+        if flag:
+            regressions.append(f"{entry['stage']} on {entry['files']} files is {ratio:.2f}x slower")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Numbers of files of the libraries."
+    )
+    parser.add_argument(
+        "--libraries",
+        type=pathlib.Path,
+        default=pathlib.Path(tempfile.gettempdir()) / "photocrawl-benchmark-libraries",
+        help="Directory in which libraries are generated and reused.",
+    )
+    parser.add_argument("--depth", type=int, default=3, help="Depth of the nested directories of libraries.")
+    parser.add_argument("--backend", default="native", help="Metadata backend, 'native' or 'exiftool'.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each stage, best is kept.")
+    parser.add_argument("--dpi", type=int, default=100, help="Resolution of the saved figures.")
+    parser.add_argument("--output", type=pathlib.Path, help="JSON file to write the results to.")
+    parser.add_argument("--compare", type=pathlib.Path, help="JSON file of baseline results to compare to.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Relative slowdown over which a stage fails comparison."
+    )
+    args = parser.parse_args()
+    logger.remove()
+    warnings.filterwarnings("ignore", category=FutureWarning)  # seaborn's palette deprecations
+
+    results = {
+        "photocrawl": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "repeat": args.repeat,
+        "results": [],
+    }
+    print("| Files | Stage | Time (s) | Files/s |\n|---:|---|---:|---:|")
+    for size in args.sizes:
+        library = generate_library(args.libraries / f"library_{size}", size, depth=args.depth)
+        for stage, seconds in bench_library(library, args.backend, args.repeat, args.dpi).items():
+            results["results"].append({"files": size, "stage": stage, "seconds": seconds})
+            print(f"| {size} | {stage} | {seconds:.4f} | {size / seconds:.0f} |")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to '{args.output}'")
+    if args.compare is not None:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print("\n".join(["FAILED:", *regressions]))
+            sys.exit(1)
+        print("\nNo stage slower than the baseline beyond the tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the inter-process communication overhead of the 'per_file' exiftool engine's
+process pool, comparing the former dispatch of the bound method `PhotoCrawler.get_exif` with a
+chunksize of 1 and a new pool for each call, to the supervised dispatch of `ExifToolBackend`,
+which sends only paths to the module-level worker of a shared pool, in adaptive chunks with one
+pending chunk per worker process so that each chunk can be timed out.
+
+Extraction itself is replaced by a no-op in both cases, so that only the cost of sending tasks
+and results between processes is measured.
+
+Usage:
+    python benchmarks/bench_pool_ipc.py --files 20000 --calls 3
+"""
+
+import argparse
+import pathlib
+import pickle
+import time
+from multiprocessing import Pool, cpu_count
+from unittest import mock
+
+from loguru import logger
+
+from photocrawl import PhotoCrawler, backends
+from photocrawl.backends import ExifToolBackend, MetadataBackend, _init_exif_worker, close_shared_process_pool
+from photocrawl.utils import adaptive_chunksize
+from photocrawl.faults import FaultTolerance
+
+
+class NoOpCrawler(PhotoCrawler):
+    """A crawler whose bound `get_exif` is pickled as before, but does not run exiftool."""
+
+    __slots__ = ()
+
+    def get_exif(self, photo_file: str) -> dict[str, str]:  # noqa: ARG002
+        return {}
+
+
+def noop_worker(photo_files: list[str]) -> list[dict[str, str]]:
+    """Same as `photocrawl.backends._exif_worker`, without running exiftool."""
+    return [{} for _ in photo_files]
+
+
+def former_dispatch(crawler: PhotoCrawler, photo_files: list[str], workers: int) -> None:
+    with Pool(workers) as pool:
+        for _ in pool.imap_unordered(crawler.get_exif, photo_files):
+            pass
+
+
+def supervised_dispatch(features: list[str], photo_files: list[str], workers: int) -> None:
+    backend = ExifToolBackend("per_file", workers=workers, tolerance=FaultTolerance(timeout=None))
+    with mock.patch.object(backends, "_exif_worker", noop_worker):  # workers fork from this process
+        for _ in backend.extract(photo_files, features):
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=20_000, help="Number of files to dispatch per call.")
+    parser.add_argument("--calls", type=int, default=3, help="Number of extraction calls, e.g. of crawls.")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="Number of worker processes.")
+    args = parser.parse_args()
+    logger.remove()
+
+    crawler = NoOpCrawler(pathlib.Path("/photos"), backend=MetadataBackend())  # pickled along, as before
+    features = crawler.interesting_features
+    photo_files = [f"/photos/{index // 1000:04d}/DSC{index:06d}.JPG" for index in range(args.files)]
+
+    former_bytes = len(pickle.dumps((crawler.get_exif, (photo_files[0],))))
+    chunksize = adaptive_chunksize(args.files, args.workers)
+    supervised_bytes = len(pickle.dumps((backends._exif_worker, (photo_files[:chunksize],)))) / chunksize
+    initializer_bytes = len(pickle.dumps((_init_exif_worker, (tuple(features),))))
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        former_dispatch(crawler, photo_files, args.workers)
+    former_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        supervised_dispatch(features, photo_files, args.workers)
+    supervised_time = time.perf_counter() - start
+    close_shared_process_pool()
+
+    tasks = args.calls * args.files
+    print(f"Files: {args.files} per call, {args.calls} calls, {args.workers} workers, chunks of {chunksize}")
+    print(f"Former: {former_bytes} bytes pickled per file, {former_time / tasks * 1e6:.1f} us per file")
+    print(
+        f"Supervised: {supervised_bytes:.0f} bytes pickled per file and {initializer_bytes} bytes once per "
+        f"worker, {supervised_time / tasks * 1e6:.1f} us per file"
+    )
+    print(f"IPC overhead reduction: {former_time / supervised_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of `PhotoCrawler.refactor_exif_data`, comparing the vectorized date and focal length
+parsing with the former row-by-row implementation, and checking that both give the same results.
+
+The former implementation is reproduced here as a reference, and needs `pendulum` installed.
+
+Usage:
+    python benchmarks/bench_refactor.py --rows 200000
+"""
+
+import argparse
+import pathlib
+import shlex
+import time
+
+import numpy as np
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from photocrawl import PhotoCrawler
+from photocrawl.utils import figure_focal_range
+
+FOCAL_LENGTHS: tuple[str, ...] = ("10.0 mm", "16.0 mm", "23.0 mm", "35.0 mm", "56.0 mm", "140.0 mm", "300.0 mm")
+
+
+def make_raw_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic frame shaped as the output of `PhotoCrawler.process_files`."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 10 * 365 * 86400, rows), unit="s")
+    return pd.DataFrame(
+        {
+            "DateTimeOriginal": timestamps.strftime("%Y:%m:%d %H:%M:%S"),
+            "ExposureCompensation": rng.choice(["0", "+1/3", "-2/3", "+1"], rows),
+            "ExposureProgram": rng.choice(["Aperture-priority AE", "Manual", "Program AE"], rows),
+            "FNumber": rng.choice([1.4, 2.8, 5.6, 8.0], rows),
+            "Flash": rng.choice(["Off, Did not fire", "On, Fired"], rows),
+            "FocalLength": rng.choice(FOCAL_LENGTHS, rows),
+            "ISO": rng.choice([160, 200, 400, 3200], rows),
+            "LensMake": "FUJIFILM",
+            "LensModel": rng.choice(["XF23mmF1.4 R", "XF56mmF1.2 R APD", "XF10-24mmF4 R OIS"], rows),
+            "Make": "FUJIFILM",
+            "MeteringMode": rng.choice(["Multi-segment", "Center-weighted average", "Spot"], rows),
+            "Model": rng.choice(["X-T4", "X-T2", "X100F"], rows),
+            "ShutterSpeedValue": rng.choice(["1/250", "1/60", "1/1000", "2"], rows),
+            "WhiteBalance": rng.choice(["Auto", "Manual"], rows),
+        }
+    )
+
+
+def rowwise_dates_and_focals(raw: pd.DataFrame) -> pd.DataFrame:
+    """The former, row-by-row parsing of dates and focal lengths."""
+    result = pd.DataFrame(index=raw.index)
+    result["Year"] = raw["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).year)
+    result["Month"] = raw["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).month)
+    result["Day"] = raw["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).day)
+    result["Focal_Length"] = raw["FocalLength"].apply(lambda x: float(shlex.split(x)[0]))
+    result["Focal_Range"] = result["Focal_Length"].apply(figure_focal_range)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of rows of the synthetic frame.")
+    args = parser.parse_args()
+    logger.remove()
+
+    raw = make_raw_frame(args.rows)
+    crawler = PhotoCrawler(pathlib.Path())
+
+    start = time.perf_counter()
+    reference = rowwise_dates_and_focals(raw)
+    rowwise_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    refactored = crawler.refactor_exif_data(raw)
+    vectorized_time = time.perf_counter() - start
+
+    for column in ("Year", "Month", "Day", "Focal_Length", "Focal_Range"):
+        if not (refactored[column].astype(str) == reference.loc[refactored.index, column].astype(str)).all():
+            msg = f"Column '{column}' differs from the row-by-row implementation"
+            raise AssertionError(msg)
+
+    print(f"Rows: {args.rows}")
+    print(f"Row-by-row dates and focal lengths: {rowwise_time:.3f} s")
+    print(f"Vectorized full refactor: {vectorized_time:.3f} s")
+    print(f"Speedup: {rowwise_time / vectorized_time:.1f}x, results identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of the memory footprint of the EXIF table, comparing the `object` dtype frame built
+from metadata dictionaries with the same frame typed by `photocrawl.schema.apply_schema`, and
+after `PhotoCrawler.refactor_exif_data`.
+
+Usage:
+    python benchmarks/bench_schema.py --rows 1000000
+"""
+
+import argparse
+import pathlib
+import time
+
+import pandas as pd
+from bench_refactor import make_raw_frame
+from loguru import logger
+
+from photocrawl import PhotoCrawler
+from photocrawl.schema import apply_schema, bytes_per_row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="Number of rows of the synthetic frame.")
+    args = parser.parse_args()
+    logger.remove()
+
+    # As built by pd.DataFrame from the backends' dictionaries: Python strings and numbers
+    untyped = make_raw_frame(args.rows).astype(object)
+
+    start = time.perf_counter()
+    typed = apply_schema(untyped)
+    typing_time = time.perf_counter() - start
+
+    crawler = PhotoCrawler(pathlib.Path())
+    refactored_untyped = crawler.refactor_exif_data(untyped)
+    refactored_typed = crawler.refactor_exif_data(typed)
+    pd.testing.assert_frame_equal(refactored_untyped, refactored_typed)
+
+    print(f"Rows: {args.rows}")
+    print(f"Untyped frame: {bytes_per_row(untyped):.0f} bytes per row")
+    print(f"Typed frame: {bytes_per_row(typed):.0f} bytes per row, typed in {typing_time:.3f} s")
+    print(f"Refactored frame: {bytes_per_row(refactored_typed):.0f} bytes per row")
+    print(f"Reduction: {bytes_per_row(untyped) / bytes_per_row(typed):.1f}x, refactored results identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Regression check that metadata extraction streams results, on a synthetic photo library, see
+`synthetic_library.py`. It fails if the native backend only yields results once it has read all
+of its input files, or if `PhotoCrawler.process_files` only gets its first result once all files
+walked were handed to the backend. Either would hold every result in memory before the rest of
+the pipeline gets any of them. It also fails if a crawl interrupted partway leaves nothing in its
+checkpoint, or if resuming it extracts the checkpointed files again.
+
+Usage:
+    python benchmarks/bench_streaming.py --files 400
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Optional
+
+from loguru import logger
+from synthetic_library import generate_library
+
+from photocrawl import PhotoCrawler
+from photocrawl.backends import MetadataBackend, make_backend
+from photocrawl.checkpoint import Checkpoint
+
+
+class CountingBackend(MetadataBackend):
+    """
+    A backend recording the files it was given, and how many when it yields its first result. It
+    can raise `KeyboardInterrupt` once it was given some files, as if the crawl was interrupted
+    while these are being read.
+    """
+
+    __slots__ = {
+        "backend": "MetadataBackend doing the extraction",
+        "given": "list of the paths of the files given to the backend so far",
+        "consumed_at_first_result": "integer, number of files given to the backend at its first result",
+        "interrupt_after": "integer, number of files given after which to interrupt, None to not interrupt",
+    }
+
+    name: str = "counting"
+
+    def __init__(self, backend: MetadataBackend, interrupt_after: Optional[int] = None):
+        self.backend: MetadataBackend = backend
+        self.given: list[str] = []
+        self.consumed_at_first_result: int = 0
+        self.interrupt_after: Optional[int] = interrupt_after
+
+    @property
+    def consumed(self) -> int:
+        return len(self.given)
+
+    def _counted(self, photo_files: Iterable[str]) -> Iterator[str]:
+        for photo_file in photo_files:
+            if self.consumed == self.interrupt_after:
+                raise KeyboardInterrupt
+            self.given.append(photo_file)
+            yield photo_file
+
+    def extract(self, photo_files: Iterable[str], features: Sequence[str]) -> Iterator[tuple[str, dict]]:
+        for index, result in enumerate(self.backend.extract(self._counted(photo_files), features)):
+            if index == 0:
+                self.consumed_at_first_result = self.consumed
+            yield result
+
+
+def check_backend_streams(library: pathlib.Path, workers: int) -> list[str]:
+    """
+    Check that the native backend yields its first result before consuming all of its input.
+
+    Returns:
+        A list of failure messages, empty if the check passed.
+    """
+    photo_files = sorted(str(path) for path in library.rglob("DSC*"))
+    consumed = 0
+
+    def _counted() -> Iterator[str]:
+        nonlocal consumed
+        for photo_file in photo_files:
+            consumed += 1
+            yield photo_file
+
+    features = PhotoCrawler(library).interesting_features
+    results = make_backend("native", workers=workers).extract(_counted(), features)
+    next(results)
+    consumed_at_first_result = consumed
+    extracted = 1 + sum(1 for _ in results)
+    print(
+        f"Native backend: first result after reading {consumed_at_first_result} of "
+        f"{len(photo_files)} files, {extracted} results"
+    )
+    if consumed_at_first_result >= len(photo_files):
+        return [f"the native backend read all {len(photo_files)} files before yielding a result"]
+    if extracted != len(photo_files):
+        return [f"the native backend yielded {extracted} results for {len(photo_files)} files"]
+    return []
+
+
+def check_pipeline_streams(library: pathlib.Path, workers: int) -> list[str]:
+    """
+    Check that `process_files`, with the default native backend, gets its first result before all
+    walked files were handed to the backend, and that it keeps every file.
+
+    Returns:
+        A list of failure messages, empty if the check passed.
+    """
+    backend = CountingBackend(make_backend("native", workers=workers))
+    exif_data = PhotoCrawler(library, backend=backend, pair_formats=False).process_files()
+    print(
+        f"Pipeline: first result after handing {backend.consumed_at_first_result} of "
+        f"{backend.consumed} walked files to the backend, {len(exif_data)} rows"
+    )
+    if backend.consumed_at_first_result >= backend.consumed:
+        return [f"process_files got its first result after all {backend.consumed} files were walked"]
+    if len(exif_data) != backend.consumed:
+        return [f"process_files returned {len(exif_data)} rows for {backend.consumed} files"]
+    return []
+
+
+def check_resume(library: pathlib.Path, workers: int, checkpoint_file: pathlib.Path) -> list[str]:
+    """
+    Check that a crawl interrupted once three quarters of its files were given to the backend left
+    results in its checkpoint, and that resuming it only extracts the files which are not in it.
+
+    Returns:
+        A list of failure messages, empty if the check passed.
+    """
+    files = sum(1 for _ in library.rglob("DSC*"))
+    interrupted = CountingBackend(make_backend("native", workers=workers), interrupt_after=3 * files // 4)
+    with Checkpoint(checkpoint_file, batch_size=50) as checkpoint:
+        crawler = PhotoCrawler(library, backend=interrupted, checkpoint=checkpoint, pair_formats=False)
+        try:
+            crawler.process_files()
+        except KeyboardInterrupt:
+            pass
+        else:
+            return ["the crawl was not interrupted"]
+
+    resumed = CountingBackend(make_backend("native", workers=workers))
+    with Checkpoint(checkpoint_file, resume=True, batch_size=50) as checkpoint:
+        checkpointed = set(checkpoint.load())
+        crawler = PhotoCrawler(library, backend=resumed, checkpoint=checkpoint, pair_formats=False)
+        exif_data = crawler.process_files()
+    print(
+        f"Resume: {len(checkpointed)} of {files} files checkpointed when interrupted after reading "
+        f"{interrupted.interrupt_after}, {resumed.consumed} extracted on resume, {len(exif_data)} rows"
+    )
+    failures = []
+    if not checkpointed:
+        failures.append(f"the checkpoint holds no results after {interrupted.interrupt_after} files")
+    if checkpointed & set(resumed.given):
+        failures.append(f"{len(checkpointed & set(resumed.given))} checkpointed files were extracted again")
+    if len(exif_data) != files:
+        failures.append(f"the resumed crawl returned {len(exif_data)} rows for {files} files")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=400, help="Number of files of the library.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of threads reading files.")
+    parser.add_argument(
+        "--library",
+        type=pathlib.Path,
+        default=pathlib.Path(tempfile.gettempdir()) / "photocrawl_streaming_library",
+        help="Directory to generate the synthetic library in, reused by later runs.",
+    )
+    args = parser.parse_args()
+    logger.remove()
+
+    library = generate_library(args.library, args.files)
+    failures = check_backend_streams(library, args.workers) + check_pipeline_streams(library, args.workers)
+    with tempfile.TemporaryDirectory() as directory:
+        failures += check_resume(library, args.workers, pathlib.Path(directory) / "checkpoint.jsonl")
+
+    if failures:
+        print("\n".join(["FAILED:", *failures]))
+        sys.exit(1)
+    print("Extraction streams results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Generator of synthetic photo libraries for the benchmarks, written with Pillow.
+
+Libraries hold small JPEGs and TIFF-based fake RAW files carrying realistic EXIF metadata, taken
+with several cameras and lenses over several years, spread in nested directories. Fake RAWs are
+a TIFF header with IFD0 and the Exif IFD, followed by a few bytes standing for sensor data, which
+is what metadata readers look at in actual RAW files.
+
+A manifest is written at the root of a library, so that a library generated with the same
+parameters is reused instead of being generated again.
+
+Usage:
+    python benchmarks/synthetic_library.py /tmp/library --files 10000 --depth 3
+"""
+
+import argparse
+import calendar
+import itertools
+import json
+import math
+import pathlib
+import time
+
+import numpy as np
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+MANIFEST_FILE: str = ".synthetic_library.json"
+GENERATOR_VERSION: int = 1
+
+# Brand, camera model, extension of its RAW files, and lenses as (make, model, min focal, max focal)
+CAMERAS: tuple[tuple[str, str, str, tuple[tuple[str, str, float, float], ...]], ...] = (
+    (
+        "FUJIFILM",
+        "X-T4",
+        "DNG",
+        (
+            ("FUJIFILM", "XF23mmF1.4 R", 23, 23),
+            ("FUJIFILM", "XF56mmF1.2 R APD", 56, 56),
+            ("FUJIFILM", "XF10-24mmF4 R OIS", 10, 24),
+            ("FUJIFILM", "XF50-140mmF2.8 R LM OIS WR", 50, 140),
+        ),
+    ),
+    (
+        "FUJIFILM",
+        "X100F",
+        "DNG",
+        (("FUJIFILM", "XF23mmF1.4 R", 23, 23),),
+    ),
+    (
+        "NIKON CORPORATION",
+        "NIKON Z 6",
+        "NEF",
+        (
+            ("NIKON", "NIKKOR Z 24-70mm f/4 S", 24, 70),
+            ("NIKON", "NIKKOR Z 50mm f/1.8 S", 50, 50),
+        ),
+    ),
+    (
+        "SONY",
+        "ILCE-7M3",
+        "ARW",
+        (
+            ("SONY", "FE 24-105mm F4 G OSS", 24, 105),
+            ("SONY", "FE 85mm F1.8", 85, 85),
+            ("SIGMA", "35mm F1.4 DG HSM | Art 012", 35, 35),
+        ),
+    ),
+    (
+        "Canon",
+        "Canon EOS 5D Mark IV",
+        "CR2",
+        (
+            ("Canon", "EF70-200mm f/2.8L IS III USM", 70, 200),
+            ("Canon", "EF16-35mm f/4L IS USM", 16, 35),
+        ),
+    ),
+)
+F_NUMBERS: tuple[float, ...] = (1.4, 1.8, 2.0, 2.8, 4.0, 5.6, 8.0, 11.0, 16.0)
+EXPOSURE_TIMES: tuple[float, ...] = (1 / 4000, 1 / 1000, 1 / 500, 1 / 250, 1 / 125, 1 / 60, 1 / 15, 0.5, 2.0)
+ISOS: tuple[int, ...] = (100, 160, 200, 400, 800, 1600, 3200, 6400)
+EXPOSURE_COMPENSATIONS: tuple[tuple[int, int], ...] = (
+    (0, 1),
+    (1, 3),
+    (-1, 3),
+    (2, 3),
+    (-2, 3),
+    (1, 1),
+    (-1, 1),
+)
+EXPOSURE_PROGRAMS: tuple[int, ...] = (1, 2, 3, 4)  # Manual, Program AE, Aperture and Shutter priority
+FLASHES: tuple[int, ...] = (0x10, 0x10, 0x10, 0x09, 0x18)
+METERING_MODES: tuple[int, ...] = (5, 5, 2, 3)
+WHITE_BALANCES: tuple[int, ...] = (0, 0, 0, 1)
+FIRST_YEAR: int = 2014
+
+
+def make_exif(rng: np.random.Generator, years: int) -> tuple[Image.Exif, str]:
+    """
+    Draw the metadata of one shot.
+
+    Returns:
+        The EXIF of the shot, and the extension of RAW files of the camera it was taken with.
+    """
+    make, model, raw_extension, lenses = CAMERAS[rng.integers(len(CAMERAS))]
+    lens_make, lens_model, min_focal, max_focal = lenses[rng.integers(len(lenses))]
+    focal_length = float(rng.integers(min_focal, max_focal + 1))
+    seconds = calendar.timegm((FIRST_YEAR, 1, 1, 0, 0, 0)) + int(rng.integers(0, years * 365 * 86400))
+
+    exif = Image.Exif()
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x9003] = time.strftime("%Y:%m:%d %H:%M:%S", time.gmtime(seconds))
+    exif_ifd[0x9204] = IFDRational(*EXPOSURE_COMPENSATIONS[rng.integers(len(EXPOSURE_COMPENSATIONS))])
+    exif_ifd[0x8822] = int(rng.choice(EXPOSURE_PROGRAMS))
+    exif_ifd[0x829D] = IFDRational(round(float(rng.choice(F_NUMBERS)) * 10), 10)
+    exif_ifd[0x9209] = int(rng.choice(FLASHES))
+    exif_ifd[0x920A] = IFDRational(round(focal_length * 10), 10)
+    exif_ifd[0xA405] = round(focal_length * (1.5 if make in ("FUJIFILM", "NIKON CORPORATION") else 1.0))
+    exif_ifd[0x8827] = int(rng.choice(ISOS))
+    exif_ifd[0xA433] = lens_make
+    exif_ifd[0xA434] = lens_model
+    exif_ifd[0x9207] = int(rng.choice(METERING_MODES))
+    exif_ifd[0x9201] = IFDRational(round(-math.log2(float(rng.choice(EXPOSURE_TIMES))) * 1000), 1000)
+    exif_ifd[0xA403] = int(rng.choice(WHITE_BALANCES))
+    return exif, raw_extension
+
+
+def directories(root: pathlib.Path, depth: int, fanout: int) -> list[pathlib.Path]:
+    """The leaf directories of a tree of `depth` levels with `fanout` sub-directories each."""
+    if depth == 0:
+        return [root]
+    return [
+        root.joinpath(*(f"level{level}_{index}" for level, index in enumerate(indices)))
+        for indices in itertools.product(range(fanout), repeat=depth)
+    ]
+
+
+def generate_library(
+    root: pathlib.Path,
+    files: int,
+    *,
+    depth: int = 2,
+    fanout: int = 4,
+    raw_fraction: float = 0.4,
+    years: int = 8,
+    seed: int = 0,
+) -> pathlib.Path:
+    """
+    Generate a synthetic photo library, or reuse the one at `root` if it was generated with the
+    same parameters.
+
+    Args:
+        root: the directory to generate the library in.
+        files: the number of image files of the library.
+        depth: the depth of the nested directories files are spread in. Defaults to 2.
+        fanout: the number of sub-directories of each directory. Defaults to 4.
+        raw_fraction: the fraction of files which are fake RAWs rather than JPEGs. Defaults to 0.4.
+        years: the number of years over which shots are taken. Defaults to 8.
+        seed: the seed of the random draws of metadata. Defaults to 0.
+
+    Returns:
+        The root of the library.
+    """
+    parameters = {
+        "version": GENERATOR_VERSION,
+        "files": files,
+        "depth": depth,
+        "fanout": fanout,
+        "raw_fraction": raw_fraction,
+        "years": years,
+        "seed": seed,
+    }
+    manifest = root / MANIFEST_FILE
+    if manifest.is_file() and json.loads(manifest.read_text()) == parameters:
+        return root
+    if root.exists() and any(root.iterdir()):
+        msg = f"Directory '{root}' is not empty and holds no synthetic library of the same parameters"
+        raise ValueError(msg)
+
+    rng = np.random.default_rng(seed)
+    leaves = directories(root, depth, fanout)
+    for leaf in leaves:
+        leaf.mkdir(parents=True, exist_ok=True)
+    thumbnail = Image.new("RGB", (16, 16))
+    for index in range(files):
+        exif, raw_extension = make_exif(rng, years)
+        stem = leaves[index % len(leaves)] / f"DSC{index:06d}"
+        if rng.random() < raw_fraction:
+            tiff_header = exif.tobytes()[len(b"Exif\x00\x00") :]
+            sensor_data = rng.integers(0, 256, 256, dtype=np.uint8).tobytes()
+            stem.with_suffix(f".{raw_extension}").write_bytes(tiff_header + sensor_data)
+        else:
+            thumbnail.paste(tuple(int(value) for value in rng.integers(0, 256, 3)), (0, 0, 16, 16))
+            thumbnail.save(stem.with_suffix(".JPG"), format="JPEG", exif=exif)
+    manifest.write_text(json.dumps(parameters))
+    return root
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("root", type=pathlib.Path, help="Directory to generate the library in.")
+    parser.add_argument("--files", type=int, default=1000, help="Number of image files.")
+    parser.add_argument("--depth", type=int, default=2, help="Depth of the nested directories.")
+    parser.add_argument("--fanout", type=int, default=4, help="Number of sub-directories of each directory.")
+    parser.add_argument("--raw-fraction", type=float, default=0.4, help="Fraction of fake RAW files.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random metadata.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate_library(
+        args.root,
+        args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        raw_fraction=args.raw_fraction,
+        seed=args.seed,
+    )
+    print(f"Library of {args.files} files at '{args.root}', ready in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,14 @@ settings in their practice of photography.
 __url__ = "https://github.com/fsoubelet/PhotoCrawl"
 __version__ = "0.3.2"
 
+__all__ = ["PhotoCrawler"]
 
-from .photocrawl import PhotoCrawler  # noqa: TID252
 
-__all__ = ["PhotoCrawler"]
+def __getattr__(name: str):
+    # PhotoCrawler is imported on first access, as it pulls pandas in
+    if name == "PhotoCrawler":
+        from .photocrawl import PhotoCrawler  # noqa: TID252
+
+        return PhotoCrawler
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
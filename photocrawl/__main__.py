@@ -1,61 +1,726 @@
 """
 Running directly from python module.
+
+Heavy dependencies (pandas, matplotlib, seaborn, pyarrow, exiftool wrappers) are only imported
+in the commands which need them, so that `--help` and completion start fast. This is checked by
+`benchmarks/bench_importtime.py`.
 """
 
 import pathlib
-from typing import TYPE_CHECKING
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional, Union
+
+import typer
 
 if TYPE_CHECKING:
     import pandas as pd
 
-import typer
-
-from photocrawl.photocrawl import PhotoCrawler
-from photocrawl.plotting_functions import plot_insight
-from photocrawl.utils import set_logger_level, setup_output_directory
+    from photocrawl.aggregates import InsightAggregates
 
 app = typer.Typer()
 
+# ----- Options shared by several commands ----- #
+
+OUTPUT_DIR_OPTION = typer.Option(
+    "outputs", help="Location, either relative or absolute, of the output directory."
+)
+SHOW_FIGURES_OPTION = typer.Option(False, help="Whether or not to show figures when plotting insights.")
+SAVE_FIGURES_OPTION = typer.Option(False, help="Whether or not to save figures when plotting insights.")
+DPI_OPTION = typer.Option(500, help="The resolution of saved figures, for raster formats.")
+FORMAT_OPTION = typer.Option(
+    "jpg", "--format", help="The format of saved figures. Can be 'jpg', 'png', 'svg' and 'pdf'."
+)
+PANEL_OPTION = typer.Option(
+    None,
+    help="Insights panel to plot, can be given several times. Can be 'year', 'camera', 'lens', "
+    "'focal_length', 'fnumber', 'shutter_speed', 'exposure_program', 'flash', 'metering_mode', "
+    "'white_balance', 'exposure_compensation' and 'iso'. Defaults to all panels.",
+)
+RENDER_CACHE_OPTION = typer.Option(
+    True, help="Whether or not to skip saving figures whose data and plot options did not change."
+)
+LOG_LEVEL_OPTION = typer.Option(
+    "info",
+    help="The base console logging level. Can be 'debug', 'info', 'warning' and 'error'.",
+)
+FOLLOW_SYMLINKS_OPTION = typer.Option(False, help="Whether or not to crawl into symlinked directories.")
+EXCLUDE_DIR_OPTION = typer.Option(
+    None, help="Glob pattern of directory names not to crawl into. Can be given several times."
+)
+MAX_DEPTH_OPTION = typer.Option(
+    None, help="Maximum depth of sub-directories to crawl into. Defaults to no limit."
+)
+SUBTREE_OPTION = typer.Option(
+    None,
+    help="Sub-directory, relative to the images directory e.g. '2023/Iceland', to only crawl. Other parts "
+    "of the tree are not walked. Can be given several times.",
+)
+SINCE_OPTION = typer.Option(
+    None,
+    help="Only process shots captured on or after this date, given as 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD'.",
+)
+UNTIL_OPTION = typer.Option(
+    None, help="Only process shots captured on or before this date, e.g. '2023' for the end of 2023."
+)
+CAMERA_OPTION = typer.Option(
+    None,
+    help="Camera model, as in the exif data e.g. 'X-T4', of the shots to only process. Can be given "
+    "several times.",
+)
+LENS_OPTION = typer.Option(
+    None,
+    help="Lens model of the shots to only process, as in the exif data or as shown in insights. Can be "
+    "given several times.",
+)
+CACHE_OPTION = typer.Option(
+    None,
+    help="Location of an SQLite metadata cache, so that only new or modified files are processed. "
+    "Created if it does not exist.",
+)
+REBUILD_CACHE_OPTION = typer.Option(False, help="Whether or not to clear the metadata cache before crawling.")
+CACHE_STATS_OPTION = typer.Option(
+    False, help="Whether or not to report metadata cache statistics after crawling."
+)
+CHECKPOINT_OPTION = typer.Option(
+    None,
+    help="Location of a JSON lines file extracted metadata is appended to in batches during the crawl, "
+    "so that an interrupted crawl can be resumed with --resume.",
+)
+RESUME_OPTION = typer.Option(
+    False,
+    help="Whether or not to resume an interrupted crawl from its --checkpoint file, only processing "
+    "files it holds no results of.",
+)
+PAIR_OPTION = typer.Option(
+    True,
+    help="Whether or not to count files of a same shot, sharing a directory and name with different "
+    "extensions such as RAW+JPEG pairs, once, reading metadata from one of them only.",
+)
+DEDUPE_OPTION = typer.Option(
+    False,
+    help="Whether or not to leave out files with the same content as another crawled file, e.g. copies "
+    "in backup or export directories. Only files of same size, capture time and camera are compared.",
+)
+DUPLICATES_REPORT_OPTION = typer.Option(
+    None, help="Location of a JSON file to write the duplicate files left out with --dedupe to."
+)
+SAMPLE_OPTION = typer.Option(
+    None,
+    help="Only process a stratified random sample of the files, given as a fraction e.g. '0.05' or a "
+    "number of files e.g. '5000', drawn from each top-level sub-directory. Counts are scaled up to the "
+    "whole library, and plotted with their 95% confidence intervals.",
+)
+SAMPLE_SEED_OPTION = typer.Option(None, help="Seed of the random sample, to draw the same sample again.")
+SHARD_OPTION = typer.Option(
+    None,
+    help="Only process the files of a shard of the library, given as 'INDEX/COUNT' e.g. '2/4', so that "
+    "it can be crawled by several jobs or hosts. Their results are combined with the 'merge' command.",
+)
+SHARD_BY_OPTION = typer.Option(
+    "path",
+    help="How files are assigned to shards. Can be 'path', which spreads files by a hash of their path, "
+    "and 'directory', which keeps each top-level sub-directory in one shard.",
+)
+BACKEND_OPTION = typer.Option(
+    "native",
+    help="How metadata is extracted. Can be 'native', which reads JPEG and TIFF-based RAW files "
+    "in-process and falls back to exiftool for other formats, and 'exiftool'.",
+)
+ENGINE_OPTION = typer.Option(
+    "stay_open",
+    help="How exiftool is run to extract metadata. Can be 'stay_open', 'batch', 'asyncio' and 'per_file'.",
+)
+CHUNK_SIZE_OPTION = typer.Option(
+    250,
+    help="The number of files given to exiftool at once, for the 'stay_open', 'batch' and 'asyncio' engines.",
+)
+WORKERS_OPTION = typer.Option(
+    None,
+    help="The number of exiftool processes, and of threads reading files natively, extracting "
+    "metadata concurrently. Defaults to the number of CPUs.",
+)
+TIMEOUT_OPTION = typer.Option(
+    2.0,
+    help="The number of seconds an exiftool call may take per file it was given before it is killed, the "
+    "files it was given being then tried one by one. Use 0 for no limit.",
+)
+RETRIES_OPTION = typer.Option(
+    1, help="The number of times a file whose extraction fails on its own is tried again before giving up."
+)
+FAILURES_REPORT_OPTION = typer.Option(
+    None,
+    help="Location of a JSON file to write the files whose metadata could not be extracted to, with "
+    "their error and the time spent on them.",
+)
+METRICS_OPTION = typer.Option(
+    None,
+    help="Location of a JSON file to write a report of the run to, with wall and CPU times of each "
+    "stage, extraction latencies and throughput, cache hit rates and peak memory.",
+)
+PROFILE_OPTION = typer.Option(
+    None, help="Location of a file to write cProfile statistics of the run to, see 'python -m pstats'."
+)
+
+
+@contextmanager
+def _instrumented(metrics_file: Optional[str] = None, profile_file: Optional[str] = None) -> Iterator[None]:
+    """
+    Collect metrics and profile the code run in the context, if the respective files are given,
+    and write the report and statistics to them when leaving.
+    """
+    if metrics_file is None and profile_file is None:
+        yield
+        return
+
+    from loguru import logger
+
+    from photocrawl import metrics
+
+    profiler = None
+    if profile_file is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    with metrics.collect() as collected:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile_file)
+                logger.info(f"Saved profiling statistics to '{profile_file}'")
+            if metrics_file is not None:
+                collected.save(metrics_file)
+
+
+def _crawl_exif_data(
+    images: str,
+    *,
+    refactor: bool = True,
+    follow_symlinks: bool = False,
+    exclude_dir: Optional[list[str]] = None,
+    max_depth: Optional[int] = None,
+    subtree: Optional[list[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    camera: Optional[list[str]] = None,
+    lens: Optional[list[str]] = None,
+    pair: bool = True,
+    dedupe: bool = False,
+    duplicates_report: Optional[str] = None,
+    cache: Optional[str] = None,
+    rebuild_cache: bool = False,
+    cache_stats: bool = False,
+    checkpoint: Optional[str] = None,
+    resume: bool = False,
+    shard: Optional[str] = None,
+    shard_by: str = "path",
+    sample: Optional[str] = None,
+    sample_seed: Optional[int] = None,
+    backend: str = "native",
+    engine: str = "stay_open",
+    chunk_size: int = 250,
+    workers: Optional[int] = None,
+    timeout: float = 2.0,
+    retries: int = 1,
+    failures_report: Optional[str] = None,
+) -> Union["pd.DataFrame", "InsightAggregates"]:
+    """
+    Crawl the images directory and gather the exif data of its files, refactored for plotting
+    unless `refactor` is False. When sampling, the aggregates estimated from the refactored data of
+    the sample are returned instead. Arguments are those of the command line options.
+    """
+    from loguru import logger
+
+    from photocrawl.backends import make_backend
+    from photocrawl.cache import MetadataCache
+    from photocrawl.checkpoint import Checkpoint
+    from photocrawl.duplicates import DuplicateFinder
+    from photocrawl.faults import FaultTolerance
+    from photocrawl.filters import ShotFilter
+    from photocrawl.photocrawl import PhotoCrawler
+    from photocrawl.sampling import StratifiedSampler, parse_sample
+    from photocrawl.sharding import parse_shard
+
+    if resume and checkpoint is None:
+        msg = "Resuming a crawl needs the --checkpoint file it was run with"
+        raise typer.BadParameter(msg, param_hint="'--resume'")
+    if duplicates_report is not None and not dedupe:
+        msg = "Duplicate files are only looked for with --dedupe"
+        raise typer.BadParameter(msg, param_hint="'--duplicates-report'")
+    try:
+        crawl_shard = parse_shard(shard) if shard is not None else None
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'--shard'") from error
+    try:
+        sampler = StratifiedSampler(parse_sample(sample), seed=sample_seed) if sample is not None else None
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'--sample'") from error
+    try:
+        tolerance = FaultTolerance(timeout or None, retries)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'--timeout' / '--retries'") from error
+    try:
+        shot_filter = (
+            ShotFilter(since, until, camera or (), lens or (), subtree or ())
+            if any((since, until, camera, lens, subtree))
+            else None
+        )
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'--since' / '--until' / '--subtree'") from error
+
+    metadata_cache = MetadataCache(cache) if cache is not None else None
+    if metadata_cache is not None and rebuild_cache:
+        metadata_cache.clear()
+    crawl_checkpoint = Checkpoint(checkpoint, resume=resume) if checkpoint is not None else None
+
+    crawler = PhotoCrawler(
+        pathlib.Path(images),
+        backend=make_backend(backend, engine, chunk_size, workers, tolerance),
+        cache=metadata_cache,
+        checkpoint=crawl_checkpoint,
+        follow_symlinks=follow_symlinks,
+        exclude_dirs=exclude_dir or (),
+        max_depth=max_depth,
+        shard=crawl_shard,
+        shard_by=shard_by,
+        pair_formats=pair,
+        duplicate_finder=DuplicateFinder() if dedupe else None,
+        sampler=sampler,
+        shot_filter=shot_filter,
+    )
+    exif_data_df: pd.DataFrame = crawler.process_files()
+    if tolerance.failures:
+        logger.warning(f"Could not extract metadata of {len(tolerance.failures)} files, with {tolerance}")
+    if failures_report is not None:
+        tolerance.save(failures_report)
+    if duplicates_report is not None:
+        crawler.duplicate_finder.save(duplicates_report)
+    if crawl_checkpoint is not None:
+        crawl_checkpoint.close()
+    if refactor:
+        exif_data_df = crawler.refactor_exif_data(exif_data_df)
+
+    if metadata_cache is not None:
+        if cache_stats:
+            logger.info(f"Metadata cache statistics: {metadata_cache.stats()}")
+        metadata_cache.close()
+    if refactor and sampler is not None:
+        return sampler.estimate(exif_data_df)
+    return exif_data_df
+
 
 @app.command()
 def crawl(
     images: str = typer.Argument(
         None,
-        help="Location, relative or absolute, of the images directory you wish to crawl.",
+        help="Location, relative or absolute, of the images directory you wish to crawl, or of a "
+        "Parquet, Feather or Arrow file written by the 'export' command.",
     ),
-    output_dir: str = typer.Option(
-        "outputs", help="Location, either relative or absolute, of the output directory."
+    output_dir: str = OUTPUT_DIR_OPTION,
+    show_figures: bool = SHOW_FIGURES_OPTION,  # noqa: FBT001
+    save_figures: bool = SAVE_FIGURES_OPTION,  # noqa: FBT001
+    dpi: int = DPI_OPTION,
+    file_format: str = FORMAT_OPTION,
+    panel: Optional[list[str]] = PANEL_OPTION,
+    render_cache: bool = RENDER_CACHE_OPTION,  # noqa: FBT001
+    log_level: str = LOG_LEVEL_OPTION,
+    follow_symlinks: bool = FOLLOW_SYMLINKS_OPTION,  # noqa: FBT001
+    exclude_dir: Optional[list[str]] = EXCLUDE_DIR_OPTION,
+    max_depth: Optional[int] = MAX_DEPTH_OPTION,
+    subtree: Optional[list[str]] = SUBTREE_OPTION,
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    camera: Optional[list[str]] = CAMERA_OPTION,
+    lens: Optional[list[str]] = LENS_OPTION,
+    pair: bool = PAIR_OPTION,  # noqa: FBT001
+    dedupe: bool = DEDUPE_OPTION,  # noqa: FBT001
+    duplicates_report: Optional[str] = DUPLICATES_REPORT_OPTION,
+    cache: Optional[str] = CACHE_OPTION,
+    rebuild_cache: bool = REBUILD_CACHE_OPTION,  # noqa: FBT001
+    cache_stats: bool = CACHE_STATS_OPTION,  # noqa: FBT001
+    checkpoint: Optional[str] = CHECKPOINT_OPTION,
+    resume: bool = RESUME_OPTION,  # noqa: FBT001
+    shard: Optional[str] = SHARD_OPTION,
+    shard_by: str = SHARD_BY_OPTION,
+    sample: Optional[str] = SAMPLE_OPTION,
+    sample_seed: Optional[int] = SAMPLE_SEED_OPTION,
+    backend: str = BACKEND_OPTION,
+    engine: str = ENGINE_OPTION,
+    chunk_size: int = CHUNK_SIZE_OPTION,
+    workers: Optional[int] = WORKERS_OPTION,
+    timeout: float = TIMEOUT_OPTION,
+    retries: int = RETRIES_OPTION,
+    failures_report: Optional[str] = FAILURES_REPORT_OPTION,
+    metrics: Optional[str] = METRICS_OPTION,
+    profile: Optional[str] = PROFILE_OPTION,
+) -> None:
+    """
+    Crawl and ensemble of pictures to run analysis of their metadata and get insight on one's use of
+    equipment and settings in their practice of photography.
+    """
+    from loguru import logger
+
+    from photocrawl.plotting_functions import plot_insight
+    from photocrawl.storage import is_table_file, load_table
+    from photocrawl.utils import set_logger_level, setup_output_directory
+
+    set_logger_level(log_level)
+    output_directory: pathlib.Path = setup_output_directory(output_dir)
+
+    with _instrumented(metrics, profile):
+        if is_table_file(images):
+            if sample is not None:
+                msg = "Sampling only applies to crawling an images directory, not to a table file"
+                raise typer.BadParameter(msg, param_hint="'--sample'")
+            logger.info(f"Loading exif data from table file '{images}' instead of crawling")
+            exif_data: Union[pd.DataFrame, InsightAggregates] = load_table(images)
+        else:
+            exif_data = _crawl_exif_data(
+                images,
+                follow_symlinks=follow_symlinks,
+                exclude_dir=exclude_dir,
+                max_depth=max_depth,
+                subtree=subtree,
+                since=since,
+                until=until,
+                camera=camera,
+                lens=lens,
+                pair=pair,
+                dedupe=dedupe,
+                duplicates_report=duplicates_report,
+                cache=cache,
+                rebuild_cache=rebuild_cache,
+                cache_stats=cache_stats,
+                checkpoint=checkpoint,
+                resume=resume,
+                shard=shard,
+                shard_by=shard_by,
+                sample=sample,
+                sample_seed=sample_seed,
+                backend=backend,
+                engine=engine,
+                chunk_size=chunk_size,
+                workers=workers,
+                timeout=timeout,
+                retries=retries,
+                failures_report=failures_report,
+            )
+
+        plot_insight(
+            data=exif_data,
+            output_directory=output_directory,
+            showfig=show_figures,
+            savefig=save_figures,
+            dpi=dpi,
+            file_format=file_format,
+            panels=panel,
+            use_render_cache=render_cache,
+        )
+
+
+@app.command()
+def export(
+    images: str = typer.Argument(
+        ..., help="Location, relative or absolute, of the images directory you wish to crawl."
+    ),
+    table_file: str = typer.Argument(
+        ...,
+        help="Location of the table file to write. Its extension determines the format, and can be "
+        "'.parquet', '.feather' or '.arrow', or '.json' to only write the aggregated shot counts.",
+    ),
+    raw: bool = typer.Option(  # noqa: FBT001
+        False, help="Whether or not to export the raw exif data, instead of the data refactored for plotting."
+    ),
+    log_level: str = LOG_LEVEL_OPTION,
+    follow_symlinks: bool = FOLLOW_SYMLINKS_OPTION,  # noqa: FBT001
+    exclude_dir: Optional[list[str]] = EXCLUDE_DIR_OPTION,
+    max_depth: Optional[int] = MAX_DEPTH_OPTION,
+    subtree: Optional[list[str]] = SUBTREE_OPTION,
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    camera: Optional[list[str]] = CAMERA_OPTION,
+    lens: Optional[list[str]] = LENS_OPTION,
+    pair: bool = PAIR_OPTION,  # noqa: FBT001
+    dedupe: bool = DEDUPE_OPTION,  # noqa: FBT001
+    duplicates_report: Optional[str] = DUPLICATES_REPORT_OPTION,
+    cache: Optional[str] = CACHE_OPTION,
+    rebuild_cache: bool = REBUILD_CACHE_OPTION,  # noqa: FBT001
+    cache_stats: bool = CACHE_STATS_OPTION,  # noqa: FBT001
+    checkpoint: Optional[str] = CHECKPOINT_OPTION,
+    resume: bool = RESUME_OPTION,  # noqa: FBT001
+    shard: Optional[str] = SHARD_OPTION,
+    shard_by: str = SHARD_BY_OPTION,
+    backend: str = BACKEND_OPTION,
+    engine: str = ENGINE_OPTION,
+    chunk_size: int = CHUNK_SIZE_OPTION,
+    workers: Optional[int] = WORKERS_OPTION,
+    timeout: float = TIMEOUT_OPTION,
+    retries: int = RETRIES_OPTION,
+    failures_report: Optional[str] = FAILURES_REPORT_OPTION,
+    metrics: Optional[str] = METRICS_OPTION,
+    profile: Optional[str] = PROFILE_OPTION,
+) -> None:
+    """
+    Crawl and ensemble of pictures and write their exif data to a columnar table file, which can
+    later be given to the 'load' or 'crawl' commands instead of crawling again. Files written for
+    shards of a library are combined with the 'merge' command.
+    """
+    from photocrawl.sharding import is_aggregates_file, write_partial
+    from photocrawl.utils import set_logger_level
+
+    set_logger_level(log_level)
+    if raw and is_aggregates_file(table_file):
+        msg = "Aggregated shot counts are computed from refactored data, export a table to keep raw data"
+        raise typer.BadParameter(msg, param_hint="'--raw'")
+    with _instrumented(metrics, profile):
+        exif_data_df: pd.DataFrame = _crawl_exif_data(
+            images,
+            refactor=not raw,
+            follow_symlinks=follow_symlinks,
+            exclude_dir=exclude_dir,
+            max_depth=max_depth,
+            subtree=subtree,
+            since=since,
+            until=until,
+            camera=camera,
+            lens=lens,
+            pair=pair,
+            dedupe=dedupe,
+            duplicates_report=duplicates_report,
+            cache=cache,
+            rebuild_cache=rebuild_cache,
+            cache_stats=cache_stats,
+            checkpoint=checkpoint,
+            resume=resume,
+            shard=shard,
+            shard_by=shard_by,
+            backend=backend,
+            engine=engine,
+            chunk_size=chunk_size,
+            workers=workers,
+            timeout=timeout,
+            retries=retries,
+            failures_report=failures_report,
+        )
+        write_partial(exif_data_df, table_file)
+
+
+@app.command()
+def load(
+    table_file: str = typer.Argument(
+        ..., help="Location of a Parquet, Feather or Arrow file written by the 'export' command."
     ),
-    show_figures: bool = typer.Option(  # noqa: FBT001
-        False, help="Whether or not to show figures when plotting insights."
+    column: Optional[list[str]] = typer.Option(
+        None,
+        help="Column to load, can be given several times. Plotting insights needs all columns, so when "
+        "given the loaded data is only printed. Defaults to all columns.",
     ),
-    save_figures: bool = typer.Option(  # noqa: FBT001
-        False, help="Whether or not to save figures when plotting insights."
+    year: Optional[list[int]] = typer.Option(
+        None, help="Only load shots taken this year, can be given several times. Defaults to all years."
     ),
-    log_level: str = typer.Option(
-        "info",
-        help="The base console logging level. Can be 'debug', 'info', 'warning' and 'error'.",
+    memory_map: bool = typer.Option(  # noqa: FBT001
+        False, help="Whether or not to memory-map the table file instead of reading it into memory."
     ),
+    output_dir: str = OUTPUT_DIR_OPTION,
+    show_figures: bool = SHOW_FIGURES_OPTION,  # noqa: FBT001
+    save_figures: bool = SAVE_FIGURES_OPTION,  # noqa: FBT001
+    dpi: int = DPI_OPTION,
+    file_format: str = FORMAT_OPTION,
+    panel: Optional[list[str]] = PANEL_OPTION,
+    render_cache: bool = RENDER_CACHE_OPTION,  # noqa: FBT001
+    log_level: str = LOG_LEVEL_OPTION,
+    metrics: Optional[str] = METRICS_OPTION,
+    profile: Optional[str] = PROFILE_OPTION,
 ) -> None:
     """
-    Crawl and ensemble of pictures to run analysis of their metadata and get insight on one's use of
-    equipment and settings in their practice of photography.
+    Load exif data from a table file written by the 'export' command, and plot insights from it.
     """
+    from photocrawl.plotting_functions import plot_insight
+    from photocrawl.storage import load_table
+    from photocrawl.utils import set_logger_level, setup_output_directory
+
     set_logger_level(log_level)
+    output_directory: pathlib.Path = setup_output_directory(output_dir)
+    with _instrumented(metrics, profile):
+        exif_data_df: pd.DataFrame = load_table(table_file, columns=column, years=year, memory_map=memory_map)
+        if column:
+            typer.echo(exif_data_df.to_string())
+            return
+
+        plot_insight(
+            data=exif_data_df,
+            output_directory=output_directory,
+            showfig=show_figures,
+            savefig=save_figures,
+            dpi=dpi,
+            file_format=file_format,
+            panels=panel,
+            use_render_cache=render_cache,
+        )
+
 
+@app.command()
+def merge(
+    partials: list[str] = typer.Argument(
+        ...,
+        help="Locations of the files written by the 'export' command for each shard, either all table "
+        "files of refactored data or all '.json' aggregates.",
+    ),
+    output: Optional[str] = typer.Option(
+        None, help="Location of a file to write the merged table or aggregates to, with the same extension."
+    ),
+    output_dir: str = OUTPUT_DIR_OPTION,
+    show_figures: bool = SHOW_FIGURES_OPTION,  # noqa: FBT001
+    save_figures: bool = SAVE_FIGURES_OPTION,  # noqa: FBT001
+    dpi: int = DPI_OPTION,
+    file_format: str = FORMAT_OPTION,
+    panel: Optional[list[str]] = PANEL_OPTION,
+    render_cache: bool = RENDER_CACHE_OPTION,  # noqa: FBT001
+    log_level: str = LOG_LEVEL_OPTION,
+) -> None:
+    """
+    Combine the partial results of a library crawled in shards, see the --shard option of the
+    'export' command, and plot insights from the whole library.
+    """
+    from photocrawl.plotting_functions import plot_insight
+    from photocrawl.sharding import is_aggregates_file, merge_partials
+    from photocrawl.storage import export_table
+    from photocrawl.utils import set_logger_level, setup_output_directory
+
+    set_logger_level(log_level)
     output_directory: pathlib.Path = setup_output_directory(output_dir)
-    files_location = pathlib.Path(images)
+    try:
+        merged = merge_partials(partials)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'PARTIALS...'") from error
 
-    crawler = PhotoCrawler(files_location)
-    exif_data_df: pd.DataFrame = crawler.process_files()
-    exif_data_df = crawler.refactor_exif_data(exif_data_df)
+    if output is not None:
+        if is_aggregates_file(output) != is_aggregates_file(partials[0]):
+            msg = "Merged tables should be written to a table file, and merged aggregates to a '.json' file"
+            raise typer.BadParameter(msg, param_hint="'--output'")
+        if is_aggregates_file(output):
+            merged.save(output)
+        else:
+            export_table(merged, output)
 
     plot_insight(
-        data=exif_data_df,
+        data=merged,
         output_directory=output_directory,
         showfig=show_figures,
         savefig=save_figures,
+        dpi=dpi,
+        file_format=file_format,
+        panels=panel,
+        use_render_cache=render_cache,
+    )
+
+
+@app.command()
+def cache(
+    cache_file: str = typer.Argument(..., help="Location of the SQLite metadata cache to inspect."),
+    clear: bool = typer.Option(  # noqa: FBT001
+        False, help="Whether or not to remove all entries from the cache."
+    ),
+    prune: Optional[str] = typer.Option(
+        None, help="Directory under which to remove entries of files which do not exist anymore."
+    ),
+    log_level: str = LOG_LEVEL_OPTION,
+) -> None:
+    """
+    Report statistics of a metadata cache, and optionally prune or clear it, without crawling.
+    """
+    from loguru import logger
+
+    from photocrawl.cache import MetadataCache
+    from photocrawl.utils import set_logger_level
+
+    set_logger_level(log_level)
+    if not pathlib.Path(cache_file).is_file():
+        logger.error(f"No metadata cache at '{cache_file}'")
+        raise typer.Exit(code=1)
+
+    with MetadataCache(cache_file) as metadata_cache:
+        if clear:
+            metadata_cache.clear()
+        elif prune is not None:
+            metadata_cache.prune(prune)
+        logger.info(f"Metadata cache statistics: {metadata_cache.stats()}")
+
+
+@app.command()
+def watch(
+    images: str = typer.Argument(
+        ..., help="Location, relative or absolute, of the images directory you wish to watch."
+    ),
+    output_dir: str = OUTPUT_DIR_OPTION,
+    debounce: float = typer.Option(
+        5.0, help="The number of seconds without changes to wait for before updating insights."
+    ),
+    polling: bool = typer.Option(  # noqa: FBT001
+        False, help="Whether or not to scan the library periodically, instead of using inotify on Linux."
+    ),
+    poll_interval: float = typer.Option(2.0, help="The number of seconds between two scans, when polling."),
+    dpi: int = DPI_OPTION,
+    file_format: str = FORMAT_OPTION,
+    panel: Optional[list[str]] = PANEL_OPTION,
+    log_level: str = LOG_LEVEL_OPTION,
+    follow_symlinks: bool = FOLLOW_SYMLINKS_OPTION,  # noqa: FBT001
+    exclude_dir: Optional[list[str]] = EXCLUDE_DIR_OPTION,
+    max_depth: Optional[int] = MAX_DEPTH_OPTION,
+    pair: bool = PAIR_OPTION,  # noqa: FBT001
+    cache: Optional[str] = CACHE_OPTION,
+    backend: str = BACKEND_OPTION,
+    engine: str = ENGINE_OPTION,
+    chunk_size: int = CHUNK_SIZE_OPTION,
+    workers: Optional[int] = WORKERS_OPTION,
+    timeout: float = TIMEOUT_OPTION,
+    retries: int = RETRIES_OPTION,
+) -> None:
+    """
+    Watch an ensemble of pictures, and keep insights figures up to date as files are added,
+    modified or removed. Only changed files are processed. Stop with Ctrl+C.
+    """
+    from photocrawl.backends import make_backend
+    from photocrawl.cache import MetadataCache
+    from photocrawl.faults import FaultTolerance
+    from photocrawl.photocrawl import PhotoCrawler
+    from photocrawl.utils import set_logger_level, setup_output_directory
+    from photocrawl.watch import watch as watch_library
+
+    set_logger_level(log_level)
+    try:
+        tolerance = FaultTolerance(timeout or None, retries)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="'--timeout' / '--retries'") from error
+    output_directory: pathlib.Path = setup_output_directory(output_dir)
+    metadata_cache = MetadataCache(cache) if cache is not None else None
+    crawler = PhotoCrawler(
+        pathlib.Path(images),
+        backend=make_backend(backend, engine, chunk_size, workers, tolerance),
+        cache=metadata_cache,
+        follow_symlinks=follow_symlinks,
+        exclude_dirs=exclude_dir or (),
+        max_depth=max_depth,
+        pair_formats=pair,
     )
+    try:
+        watch_library(
+            crawler,
+            output_directory,
+            debounce=debounce,
+            polling=polling,
+            poll_interval=poll_interval,
+            dpi=dpi,
+            file_format=file_format,
+            panels=panel,
+        )
+    finally:
+        if metadata_cache is not None:
+            metadata_cache.close()
 
 
 if __name__ == "__main__":
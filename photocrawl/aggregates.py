@@ -0,0 +1,373 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Precomputed aggregates of the refactored EXIF table, from which insights are plotted.
+
+Every count table and crosstab needed by the plotting functions is computed up front, factorizing
+each column of the table once. Plotting then draws bars from these small tables, so that its cost
+does not scale with the number of shots. Aggregates can be merged and saved to disk, to be reused
+without the table. Aggregates estimated from a sample of the shots carry the margins of error of
+their counts.
+"""
+
+import hashlib
+import json
+import math
+import pathlib
+from collections.abc import Iterable
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from photocrawl import metrics
+from photocrawl.utils import timeit
+
+COUNT_COLUMN: str = "Shots"
+MARGIN_COLUMN: str = "Margin"
+CONFIDENCE_Z: float = 1.96  # of 95% confidence intervals
+
+# Columns of the refactored table counted for the plotting functions, the first column of a
+# crosstab is plotted along an axis and the second one as colors
+COUNT_TABLES: tuple[tuple[str, ...], ...] = (
+    ("Year", "Brand"),
+    ("Camera", "Brand"),
+    ("Lens", "Brand"),
+    ("Focal_Range", "Lens"),
+    ("F_Number",),
+    ("Shutter_Speed",),
+    ("Exposure_Program",),
+    ("Flash",),
+    ("Metering_Mode",),
+    ("White_Balance",),
+    ("Exposure_Compensation",),
+    ("ISO",),
+)
+
+
+class InsightAggregates:
+    """
+    Class to handle the count tables and crosstabs of shots plotted as insights.
+    """
+
+    __slots__ = {
+        "tables": "dictionary of column names to a pandas Series of the number of shots per value",
+        "margins": "dictionary of column names to a pandas Series of the margins of error of counts",
+    }
+
+    def __init__(
+        self,
+        tables: dict[tuple[str, ...], pd.Series],
+        margins: Optional[dict[tuple[str, ...], pd.Series]] = None,
+    ):
+        """
+        Args:
+            tables: the number of shots per value of one column, or per combination of values of
+                several columns, keyed by the column names. Use `from_data`, `from_sample` or
+                `load` to create aggregates.
+            margins: for estimated counts, the half-width of the 95% confidence interval of each
+                count of `tables`, with the same keys and indices. Defaults to None, for exact
+                counts.
+        """
+        self.tables: dict[tuple[str, ...], pd.Series] = tables
+        self.margins: Optional[dict[tuple[str, ...], pd.Series]] = margins
+
+    @classmethod
+    def from_data(cls, data: pd.DataFrame) -> "InsightAggregates":
+        """
+        Aggregate a refactored EXIF table into the tables of `COUNT_TABLES`. Each column is
+        factorized once, and shots are counted from the integer codes. Tables of columns missing
+        from the data are left out, and shots with a missing value are not counted.
+
+        Args:
+            data: the pandas DataFrame with your exif data, as returned by
+                `PhotoCrawler.refactor_exif_data`.
+
+        Returns:
+            An `InsightAggregates` object.
+        """
+        columns: set[str] = {column for table in COUNT_TABLES for column in table if column in data.columns}
+        tables: dict[tuple[str, ...], pd.Series] = {}
+
+        with metrics.stage("aggregate"), timeit(
+            lambda spanned: logger.debug(f"Aggregated {len(data)} shots in {spanned:.4f} seconds")
+        ):
+            factorized: dict[str, tuple[np.ndarray, pd.Index]] = {
+                column: _factorize(data[column]) for column in columns
+            }
+            for table in COUNT_TABLES:
+                if not columns.issuperset(table):
+                    continue
+                codes = [factorized[column][0] for column in table]
+                uniques = [factorized[column][1] for column in table]
+                shape = tuple(len(values) for values in uniques)
+                counted = np.logical_and.reduce([column_codes >= 0 for column_codes in codes])
+                flat_codes = np.ravel_multi_index([column_codes[counted] for column_codes in codes], shape)
+                counts = np.bincount(flat_codes, minlength=math.prod(shape))
+                index = pd.MultiIndex.from_product(uniques, names=table)
+                tables[table] = pd.Series(counts, index=index, name=COUNT_COLUMN)[counts > 0]
+        return cls(tables)
+
+    @classmethod
+    def from_sample(
+        cls,
+        data: pd.DataFrame,
+        stratum_column: str,
+        population: dict[str, int],
+        sampled: dict[str, int],
+    ) -> "InsightAggregates":
+        """
+        Estimate the aggregates of a library from the refactored EXIF table of a stratified random
+        sample of its shots. In each stratum, counts of the sample are scaled by the ratio of the
+        stratum's size to its sample size, and their variance is that of the estimated total of a
+        simple random sample without replacement. Estimated counts are rounded.
+
+        Args:
+            data: the pandas DataFrame with the exif data of the sampled shots, as returned by
+                `PhotoCrawler.refactor_exif_data`.
+            stratum_column: the column of `data` with the stratum of each shot.
+            population: the number of shots of each stratum.
+            sampled: the number of sampled shots of each stratum, including those with missing
+                data which were dropped from `data`.
+
+        Returns:
+            An `InsightAggregates` object, with margins of error.
+        """
+        estimates: dict[tuple[str, ...], list[pd.Series]] = {}
+        variances: dict[tuple[str, ...], list[pd.Series]] = {}
+        strata = data[stratum_column].astype(str)
+        for stratum, size in sampled.items():
+            stratum_population = population[stratum]
+            proportions = {
+                table: shots / size for table, shots in cls.from_data(data[strata == stratum]).tables.items()
+            }
+            correction = (1 - size / stratum_population) / max(size - 1, 1)  # finite population
+            for table, proportion in proportions.items():
+                estimates.setdefault(table, []).append(proportion * stratum_population)
+                variances.setdefault(table, []).append(
+                    stratum_population**2 * correction * proportion * (1 - proportion)
+                )
+
+        tables: dict[tuple[str, ...], pd.Series] = {}
+        margins: dict[tuple[str, ...], pd.Series] = {}
+        for table, table_estimates in estimates.items():
+            estimated = _sum_series(table_estimates).round()
+            counted = estimated > 0
+            tables[table] = estimated[counted].astype("int64").rename(COUNT_COLUMN)
+            margin = CONFIDENCE_Z * _sum_series(variances[table]) ** 0.5
+            margins[table] = margin[counted].rename(MARGIN_COLUMN)
+        return cls(tables, margins)
+
+    @property
+    def total(self) -> int:
+        """The total number of aggregated shots."""
+        return int(next(iter(self.tables.values())).sum()) if self.tables else 0
+
+    def _table_with(self, columns: tuple[str, ...]) -> tuple[str, ...]:
+        for table in self.tables:
+            if table[: len(columns)] == columns:
+                return table
+        msg = f"No aggregated table of columns {list(columns)}, should be in {list(self.tables)}"
+        raise KeyError(msg)
+
+    def counts(self, column: str, *, by_count: bool = True) -> pd.DataFrame:
+        """
+        The number of shots for each value of a column.
+
+        Args:
+            column: the aggregated column to count shots of.
+            by_count: if set to True, values are sorted by decreasing number of shots, otherwise by
+                value. Defaults to True.
+
+        Returns:
+            A long-form `pandas.DataFrame` with the column's values and the number of shots, and
+            their margins of error for estimated counts. Margins of counts summed over the values
+            of other columns are combined as if independent, which overstates them.
+        """
+        table = self._table_with((column,))
+        counts = self.tables[table].groupby(level=column).sum()
+        counts = counts.sort_values(ascending=False, kind="stable") if by_count else counts.sort_index()
+        if self.margins is None:
+            return counts.reset_index()
+        margins = (self.margins[table] ** 2).groupby(level=column).sum() ** 0.5
+        return pd.concat([counts, margins.reindex(counts.index)], axis="columns").reset_index()
+
+    def crosstab(self, column: str, hue: str) -> pd.DataFrame:
+        """
+        The number of shots for each observed combination of values of two columns, for instance
+        cameras and brands.
+
+        Args:
+            column: the column plotted along an axis.
+            hue: the column plotted as colors.
+
+        Returns:
+            A long-form `pandas.DataFrame` with values of both columns and the number of shots, and
+            their margins of error for estimated counts.
+        """
+        table = self._table_with((column, hue))
+        if self.margins is None:
+            return self.tables[table].reset_index()
+        return pd.concat([self.tables[table], self.margins[table]], axis="columns").reset_index()
+
+    def order(self, column: str, *, by_count: bool = True) -> list:
+        """
+        The values of a column, in the order they should be plotted, see `counts`.
+
+        Args:
+            column: the aggregated column.
+            by_count: if set to True, values are sorted by decreasing number of shots, otherwise by
+                value. Defaults to True.
+
+        Returns:
+            A list of the column's values.
+        """
+        return self.counts(column, by_count=by_count)[column].tolist()
+
+    def merge(self, other: "InsightAggregates") -> "InsightAggregates":
+        """
+        Combine these aggregates with others, e.g. of another library or a part of it.
+
+        Args:
+            other: the `InsightAggregates` to add, with the same tables.
+
+        Returns:
+            A new `InsightAggregates` object, with the shots of both. If either is estimated, the
+            margins of error of both are combined as those of independent estimates.
+        """
+        if set(self.tables) != set(other.tables):
+            msg = f"Cannot merge aggregates of tables {list(other.tables)} into {list(self.tables)}"
+            raise ValueError(msg)
+        tables = {
+            table: shots.add(other.tables[table], fill_value=0).astype("int64").rename(COUNT_COLUMN)
+            for table, shots in self.tables.items()
+        }
+        if self.margins is None and other.margins is None:
+            return InsightAggregates(tables)
+        margins = {
+            table: (self._variances(table).add(other._variances(table), fill_value=0) ** 0.5)
+            .reindex(shots.index, fill_value=0)
+            .rename(MARGIN_COLUMN)
+            for table, shots in tables.items()
+        }
+        return InsightAggregates(tables, margins)
+
+    def _variances(self, table: tuple[str, ...]) -> pd.Series:
+        """Squared margins of the counts of a table, zero for exact counts."""
+        if self.margins is None:
+            return pd.Series(0.0, index=self.tables[table].index)
+        return self.margins[table] ** 2
+
+    def subtract(self, other: "InsightAggregates") -> "InsightAggregates":
+        """
+        Remove the shots of other aggregates from these, e.g. of files deleted from the library.
+
+        Args:
+            other: the `InsightAggregates` to remove, with the same tables and counted from shots
+                these aggregates include.
+
+        Returns:
+            A new `InsightAggregates` object, without the shots of `other`.
+        """
+        if set(self.tables) != set(other.tables):
+            msg = f"Cannot subtract aggregates of tables {list(other.tables)} from {list(self.tables)}"
+            raise ValueError(msg)
+        if self.margins is not None or other.margins is not None:
+            msg = "Cannot subtract estimated aggregates, shots of a sample are not known individually"
+            raise ValueError(msg)
+        tables: dict[tuple[str, ...], pd.Series] = {}
+        for table, shots in self.tables.items():
+            remaining = shots.sub(other.tables[table], fill_value=0).astype("int64").rename(COUNT_COLUMN)
+            tables[table] = remaining[remaining > 0]
+        return InsightAggregates(tables)
+
+    def fingerprint(self, tables: Optional[Iterable[tuple[str, ...]]] = None) -> str:
+        """
+        A hash of the content of aggregated tables, which does not depend on the order in which
+        shots were counted.
+
+        Args:
+            tables: the tables to hash, keys of `tables`. Defaults to all tables.
+
+        Returns:
+            The hexadecimal SHA-256 digest of the tables, and of their margins of error if any.
+        """
+        digest = hashlib.sha256()
+        for table in sorted(self.tables) if tables is None else tables:
+            content = self._frame(table).sort_index().reset_index().to_dict(orient="split", index=False)
+            digest.update(json.dumps(content).encode())
+        return digest.hexdigest()
+
+    def _frame(self, table: tuple[str, ...]) -> pd.DataFrame:
+        """The counts of a table, and their margins of error if any, indexed by the table's values."""
+        if self.margins is None:
+            return self.tables[table].to_frame()
+        return pd.concat([self.tables[table], self.margins[table]], axis="columns")
+
+    def save(self, path: Union[str, pathlib.Path]) -> pathlib.Path:
+        """
+        Write the aggregates to a JSON file.
+
+        Args:
+            path: the location of the file to write.
+
+        Returns:
+            A `pathlib.Path` object of the written file.
+        """
+        path = pathlib.Path(path)
+        content = [
+            self._frame(table).reset_index().to_dict(orient="split", index=False) for table in self.tables
+        ]
+        path.write_text(json.dumps(content))
+        logger.debug(f"Saved aggregates of {self.total} shots to '{path}'")
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, pathlib.Path]) -> "InsightAggregates":
+        """
+        Read aggregates from a JSON file written by `save`.
+
+        Args:
+            path: the location of the file to read.
+
+        Returns:
+            An `InsightAggregates` object.
+        """
+        tables: dict[tuple[str, ...], pd.Series] = {}
+        margins: dict[tuple[str, ...], pd.Series] = {}
+        for content in json.loads(pathlib.Path(path).read_text()):
+            table = tuple(content["columns"][: -2 if MARGIN_COLUMN in content["columns"] else -1])
+            frame = pd.DataFrame(content["data"], columns=content["columns"])
+            index = pd.MultiIndex.from_frame(frame[list(table)])
+            tables[table] = pd.Series(frame[COUNT_COLUMN].to_numpy(), index=index, name=COUNT_COLUMN)
+            if MARGIN_COLUMN in frame.columns:
+                margins[table] = pd.Series(
+                    frame[MARGIN_COLUMN].to_numpy(dtype="float64"), index=index, name=MARGIN_COLUMN
+                )
+        return cls(tables, margins or None)
+
+    def __repr__(self) -> str:
+        shots = f"{self.total} estimated shots" if self.margins is not None else f"{self.total} shots"
+        return f"InsightAggregates({shots}, tables of {[list(table) for table in self.tables]})"
+
+
+def _factorize(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Integer codes of the values, -1 for missing ones, and the unique values as plain labels."""
+    if pd.api.types.is_float_dtype(values):
+        # float32 values are rounded so that labels read e.g. '2.8' and not '2.799999952316284'
+        values = values.astype("float64").round(4)
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques)
+    if isinstance(uniques, pd.CategoricalIndex):
+        uniques = uniques.astype(uniques.categories.dtype)
+    return codes, uniques
+
+
+def _sum_series(series: list[pd.Series]) -> pd.Series:
+    """Sum of Series with different indices, values missing from some of them counting as zero."""
+    total = series[0]
+    for other in series[1:]:
+        total = total.add(other, fill_value=0)
+    return total
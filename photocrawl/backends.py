@@ -0,0 +1,469 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Pluggable backends to extract the EXIF metadata of crawled files.
+"""
+
+import atexit
+import contextlib
+import itertools
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import Pool as ProcessPool
+from typing import Optional
+
+from loguru import logger
+
+from photocrawl import metrics
+from photocrawl.exiftool import (
+    ExifToolPool,
+    ExifToolTimeout,
+    get_exif,
+    imap_async,
+    run_batch,
+    select_features,
+    tag_arguments,
+)
+from photocrawl.faults import FaultTolerance
+from photocrawl.native import NATIVE_FORMATS, NativeReaderError, read_exif, supports
+from photocrawl.utils import adaptive_chunksize, bounded_imap_unordered, chunked
+
+METADATA_BACKENDS: tuple[str, ...] = ("native", "exiftool")
+EXTRACTION_ENGINES: tuple[str, ...] = ("stay_open", "batch", "asyncio", "per_file")
+DEFAULT_CHUNK_SIZE: int = 250
+
+# Features extracted by the 'per_file' engine's worker processes, set once by the pool initializer
+_worker_features: tuple[str, ...] = ()
+# The process pool of the 'per_file' engine, reused across calls, the settings it was started with,
+# and its worker processes as started
+_shared_pool: Optional[tuple[tuple[int, tuple[str, ...]], ProcessPool, list]] = None
+
+
+def _init_exif_worker(features: tuple[str, ...]) -> None:
+    """
+    Initializer of the 'per_file' engine's worker processes, receiving the features once. Where
+    possible, each worker leads its own process group, so that the exiftool processes it starts
+    can be stopped with a signal to the group, which the worker itself ignores, see
+    `close_shared_process_pool`.
+
+    Being out of the terminal's process group, workers and their exiftool processes do not get the
+    SIGINT of a Ctrl+C. The main process gets it and stops the crawl, and the pool and the exiftool
+    processes are then stopped when the main process exits.
+    """
+    global _worker_features  # noqa: PLW0603
+    _worker_features = features
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+        # A handler, unlike an ignored signal, is reset to the default for the exiftool processes
+        signal.signal(signal.SIGUSR1, lambda *_: None)
+
+
+def _exif_worker(photo_files: list[str]) -> list[dict[str, str]]:
+    """Task of the 'per_file' engine, only the paths of a chunk of files are sent to the worker process."""
+    return [get_exif(photo_file, _worker_features) for photo_file in photo_files]
+
+
+def shared_process_pool(workers: int, features: Sequence[str]) -> ProcessPool:
+    """
+    The process pool of the 'per_file' exiftool engine, started on first use and reused by later
+    calls with the same settings, so that worker processes are not started again for each crawl.
+
+    Args:
+        workers: the number of worker processes.
+        features: the names of the EXIF tags the workers extract.
+
+    Returns:
+        The `multiprocessing.pool.Pool` object.
+    """
+    global _shared_pool  # noqa: PLW0603
+    settings = (workers, tuple(features))
+    if _shared_pool is not None and _shared_pool[0] == settings:
+        return _shared_pool[1]
+    close_shared_process_pool()
+    logger.debug(f"Starting a pool of {workers} exiftool worker processes")
+    pool = Pool(workers, initializer=_init_exif_worker, initargs=(settings[1],))
+    _shared_pool = (settings, pool, list(pool._pool))  # noqa: SLF001, workers as started
+    return pool
+
+
+@atexit.register
+def close_shared_process_pool() -> None:
+    """
+    Stop the worker processes of the shared process pool, if it was started, and the exiftool
+    processes they started, which would otherwise be left running if they hang.
+
+    The exiftool processes are stopped first, with a SIGUSR1 to the process group of each worker
+    the pool was started with and which was not reaped yet, so that its process ID cannot have been
+    reused. The workers ignore it, as killing an idle worker could leave the pool's task queue
+    locked, and are then terminated by the pool.
+    """
+    global _shared_pool  # noqa: PLW0603
+    if _shared_pool is not None:
+        _, pool, worker_processes = _shared_pool
+        if hasattr(os, "killpg"):
+            for process in worker_processes:  # the process groups they lead, see `_init_exif_worker`
+                if process.exitcode is None:
+                    with contextlib.suppress(OSError):
+                        os.killpg(process.pid, signal.SIGUSR1)
+        pool.terminate()
+        pool.join()
+        _shared_pool = None
+
+
+class MetadataBackend:
+    """
+    Base class for metadata extraction backends. Subclasses implement `extract`.
+    """
+
+    __slots__ = ()
+
+    name: str = "base"
+
+    def extract(self, photo_files: Iterable[str], features: Sequence[str]) -> Iterator[tuple[str, dict]]:
+        """
+        Lazily extract the provided features from the EXIF of the provided files.
+
+        Args:
+            photo_files: an iterable of paths to the files to get metadata of.
+            features: the names of the EXIF tags to extract.
+
+        Returns:
+            An iterator of tuples with each file's path and a dictionary with its exif fields and
+            values, in the order files are processed. The dictionary is empty for files whose
+            metadata could not be read.
+        """
+        raise NotImplementedError
+
+
+class ExifToolBackend(MetadataBackend):
+    """
+    Backend extracting metadata by running ExifTool.
+    """
+
+    __slots__ = {
+        "engine": "string, how exiftool is run, one of EXTRACTION_ENGINES",
+        "chunk_size": "integer, number of files given to exiftool at once",
+        "workers": "integer, number of exiftool processes, or threads driving them, run concurrently",
+        "tolerance": "FaultTolerance giving the timeout of exiftool calls, and recording failed files",
+    }
+
+    name: str = "exiftool"
+
+    def __init__(
+        self,
+        engine: str = "stay_open",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: Optional[int] = None,
+        tolerance: Optional[FaultTolerance] = None,
+    ):
+        """
+        Args:
+            engine: how exiftool is run. With 'stay_open', chunks of files are fed to a pool of
+                long-lived exiftool processes, one per worker. With 'batch', each chunk of files
+                is given to a one-off exiftool call, from a pool of threads. With 'asyncio', the
+                one-off calls are asyncio subprocesses awaited from a single thread, which scales
+                to many concurrent calls, e.g. on slow network storage. With 'per_file', a new
+                exiftool process is started for each file. Defaults to 'stay_open'.
+            chunk_size: the number of files given to exiftool at once, for the 'stay_open',
+                'batch' and 'asyncio' engines. Defaults to 250.
+            workers: the number of exiftool processes run concurrently. Defaults to the number
+                of CPUs.
+            tolerance: the `FaultTolerance` giving the timeout of exiftool calls per file they are
+                given, and the number of retries of files of failed calls, see `photocrawl.faults`.
+                Defaults to a `FaultTolerance` with default settings.
+        """
+        if engine not in EXTRACTION_ENGINES:
+            msg = f"Invalid extraction engine '{engine}', should be one of {EXTRACTION_ENGINES}"
+            raise ValueError(msg)
+        self.engine: str = engine
+        self.chunk_size: int = chunk_size
+        self.workers: int = workers or cpu_count()
+        self.tolerance: FaultTolerance = tolerance if tolerance is not None else FaultTolerance()
+
+    def extract(self, photo_files: Iterable[str], features: Sequence[str]) -> Iterator[tuple[str, dict]]:
+        logger.debug(f"Extracting metadata with the '{self.engine}' exiftool engine")
+
+        if self.engine == "per_file":
+            yield from self._supervised_per_file(photo_files, features)
+            return
+
+        arguments: list[str] = tag_arguments(features)
+        if self.engine == "batch":
+
+            def _run_batch(chunk: list[str]) -> list[tuple[str, dict]]:
+                return run_batch(chunk, arguments, timeout=self.tolerance.call_timeout(chunk))
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                for results in bounded_imap_unordered(
+                    executor,
+                    partial(self.tolerance.run, _run_batch),
+                    chunked(photo_files, self.chunk_size),
+                    window=2 * self.workers,
+                ):
+                    for photo_file, metadata in results:
+                        yield photo_file, select_features(metadata, features)
+            return
+
+        if self.engine == "asyncio":
+            for photo_file, metadata in imap_async(
+                photo_files, self.chunk_size, arguments, self.workers, tolerance=self.tolerance
+            ):
+                yield photo_file, select_features(metadata, features)
+            return
+
+        with ExifToolPool(self.workers) as exiftool_pool:
+            for photo_file, metadata in exiftool_pool.imap_unordered(
+                photo_files, self.chunk_size, arguments, self.tolerance
+            ):
+                yield photo_file, select_features(metadata, features)
+
+    def _supervised_per_file(
+        self, photo_files: Iterable[str], features: Sequence[str]
+    ) -> Iterator[tuple[str, dict]]:
+        """
+        Extract files in the shared process pool, in chunks sized to give each worker process about
+        four of them, see `adaptive_chunksize`, with one pending chunk per worker so that the time
+        spent on each chunk is known. A chunk whose task raises or exceeds its timeout has its files
+        tried one by one, and a file failing on its own is tried again, up to the tolerance's number
+        of retries. A task exceeding its timeout is deemed to hang its worker process, which cannot
+        be killed alone: the pool is replaced by a new one, to which the other pending chunks are
+        given again.
+        """
+        files: Iterator[str] = iter(photo_files)
+        # Chunks are sized for the whole input if it fits in the look-ahead, else they are of maximum size
+        max_chunksize: int = 64
+        lookahead: list[str] = list(itertools.islice(files, 4 * self.workers * max_chunksize))
+        chunks: Iterator[list[str]] = chunked(
+            itertools.chain(lookahead, files), adaptive_chunksize(len(lookahead), self.workers, max_chunksize)
+        )
+        retried: deque = deque()  # chunks given again after a pool was replaced, files of failed chunks
+        done: queue.SimpleQueue = queue.SimpleQueue()
+        started: dict[int, tuple[list[str], float]] = {}  # chunk and start time of the pending tasks
+        failed_attempts: dict[str, tuple[int, float]] = {}  # number of attempts and time spent on them
+        tasks: Iterator[int] = itertools.count()
+        generation: int = 0  # results of a replaced pool are ignored
+        pool = shared_process_pool(self.workers, features)
+
+        def _submit() -> None:
+            while len(started) < self.workers:
+                chunk = retried.popleft() if retried else next(chunks, None)
+                if chunk is None:
+                    return
+                task = next(tasks)
+                started[task] = (chunk, time.perf_counter())
+                pool.apply_async(
+                    _exif_worker,
+                    (chunk,),
+                    callback=partial(_on_result, generation, task),
+                    error_callback=partial(_on_error, generation, task),
+                )
+
+        def _on_result(task_generation: int, task: int, results: list[dict]) -> None:
+            done.put((task_generation, task, results, None, time.perf_counter()))
+
+        def _on_error(task_generation: int, task: int, error: BaseException) -> None:
+            done.put((task_generation, task, None, error, time.perf_counter()))
+
+        def _deadline(task: int) -> float:
+            chunk, start = started[task]
+            return start + self.tolerance.call_timeout(chunk)
+
+        _submit()
+        while started:
+            hung_task = None if self.tolerance.timeout is None else min(started, key=_deadline)
+            wait = None if hung_task is None else max(_deadline(hung_task) - time.perf_counter(), 0)
+            try:
+                task_generation, task, results, error, finished = done.get(timeout=wait)
+            except queue.Empty:
+                chunk, start = started.pop(hung_task)
+                timeout = self.tolerance.call_timeout(chunk)
+                logger.warning(
+                    f"Extraction of {len(chunk)} files hung for {timeout} seconds, replacing workers"
+                )
+                close_shared_process_pool()
+                pool = shared_process_pool(self.workers, features)
+                generation += 1
+                results = None
+                error = ExifToolTimeout(f"The worker process did not answer within {timeout} seconds")
+                retried.extend(pending_chunk for pending_chunk, _ in started.values())
+                elapsed = time.perf_counter() - start
+                started.clear()
+            else:
+                if task_generation != generation:
+                    continue
+                chunk, start = started.pop(task)
+                elapsed = finished - start  # as results may wait to be consumed
+
+            if error is not None and len(chunk) > 1:
+                self.tolerance.isolating(chunk, error)
+                retried.extend([photo_file] for photo_file in chunk)
+            elif error is not None:
+                attempts, spent = failed_attempts.pop(chunk[0], (0, 0.0))
+                attempts, spent = attempts + 1, spent + elapsed
+                if attempts <= self.tolerance.retries:
+                    failed_attempts[chunk[0]] = (attempts, spent)
+                    retried.append(chunk)
+            _submit()  # before yielding, so that workers are kept busy while results are consumed
+            if error is None:
+                metrics.record_latency("extraction", elapsed, len(chunk))
+                yield from zip(chunk, results)
+            elif len(chunk) == 1 and chunk[0] not in failed_attempts:
+                yield self.tolerance.failed(chunk[0], error, spent, attempts)
+
+
+class NativeBackend(MetadataBackend):
+    """
+    Backend reading metadata in-process for JPEG and TIFF-based RAW files, see `photocrawl.native`.
+    Files of other formats, or which cannot be read natively, are handed to a fallback backend.
+    """
+
+    __slots__ = {
+        "fallback": "MetadataBackend used for files the native reader cannot handle",
+        "threads": "integer, number of threads reading files concurrently",
+    }
+
+    name: str = "native"
+
+    def __init__(self, fallback: Optional[MetadataBackend] = None, threads: Optional[int] = None):
+        """
+        Args:
+            fallback: the backend to use for files which cannot be read natively. Defaults to an
+                `ExifToolBackend` with default settings.
+            threads: the number of threads reading files concurrently, which helps on slow
+                storage. Defaults to the number of CPUs.
+        """
+        self.fallback: MetadataBackend = fallback if fallback is not None else ExifToolBackend()
+        self.threads: int = threads or cpu_count()
+
+    @staticmethod
+    def _read(photo_file: str, features: Sequence[str]) -> tuple[str, Optional[dict]]:
+        if photo_file.rpartition(".")[2].upper() not in NATIVE_FORMATS:
+            return photo_file, None
+        start = time.perf_counter()
+        try:
+            metadata = read_exif(photo_file, features)
+        except NativeReaderError as error:
+            logger.trace(f"Could not natively read {photo_file}: {error}")
+            return photo_file, None
+        except Exception as error:  # an unexpected file layout should not stop the other threads
+            logger.debug(f"Unexpected error natively reading {photo_file}, falling back: {error!r}")
+            return photo_file, None
+        metrics.record_latency("extraction", time.perf_counter() - start)
+        return photo_file, metadata
+
+    def extract(self, photo_files: Iterable[str], features: Sequence[str]) -> Iterator[tuple[str, dict]]:
+        """
+        Lazily extract the provided features, yielding each natively read file as soon as it is
+        read. Files which cannot be read natively are handed to the fallback backend as they are
+        found, which runs in a background thread started for the first of them, and its results
+        are yielded as they arrive, in between natively read files.
+
+        Args:
+            photo_files: an iterable of paths to the files to get metadata of.
+            features: the names of the EXIF tags to extract.
+
+        Returns:
+            An iterator of tuples with each file's path and a dictionary with its exif fields and
+            values, in the order files are processed.
+        """
+        if not supports(features):
+            logger.debug("Some features cannot be read natively, using fallback backend for all files")
+            yield from self.fallback.extract(photo_files, features)
+            return
+
+        logger.debug(f"Extracting metadata natively, falling back to the '{self.fallback.name}' backend")
+        fallback_files: queue.SimpleQueue = queue.SimpleQueue()  # ended by None
+        fallback_results: queue.SimpleQueue = queue.SimpleQueue()
+        stop = threading.Event()
+        fallback_thread: Optional[threading.Thread] = None
+
+        def _queued_files() -> Iterator[str]:
+            while not stop.is_set() and (photo_file := fallback_files.get()) is not None:
+                yield photo_file
+
+        def _run_fallback() -> None:
+            try:
+                for result in self.fallback.extract(_queued_files(), features):
+                    fallback_results.put(("result", result))
+            except Exception as error:  # noqa: BLE001
+                fallback_results.put(("error", error))  # raised again from the consuming thread
+            else:
+                fallback_results.put(("done", None))
+
+        def _fallen_back(*, wait: bool) -> Iterator[tuple[str, dict]]:
+            while True:
+                try:
+                    kind, value = fallback_results.get(block=wait)
+                except queue.Empty:
+                    return
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+
+        try:
+            with ThreadPoolExecutor(self.threads, thread_name_prefix="native") as executor:
+                for photo_file, metadata in bounded_imap_unordered(
+                    executor, partial(self._read, features=features), photo_files, window=4 * self.threads
+                ):
+                    if metadata is not None:
+                        yield photo_file, metadata
+                    else:
+                        if fallback_thread is None:  # the fallback is only started if needed
+                            fallback_thread = threading.Thread(target=_run_fallback, name="fallback")
+                            fallback_thread.start()
+                        fallback_files.put(photo_file)
+                    if fallback_thread is not None:
+                        yield from _fallen_back(wait=False)
+            if fallback_thread is not None:
+                fallback_files.put(None)
+                yield from _fallen_back(wait=True)
+        finally:  # if stopped early, files already given to the fallback are let to finish
+            if fallback_thread is not None:
+                stop.set()
+                fallback_files.put(None)
+                fallback_thread.join()
+
+
+def make_backend(
+    name: str = "native",
+    engine: str = "stay_open",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    tolerance: Optional[FaultTolerance] = None,
+) -> MetadataBackend:
+    """
+    Create a metadata backend from its name and the settings of the underlying exiftool backend.
+
+    Args:
+        name: the backend to create, one of METADATA_BACKENDS. The 'native' backend falls back
+            on exiftool for files it cannot read. Defaults to 'native'.
+        engine: how exiftool is run, see `ExifToolBackend`. Defaults to 'stay_open'.
+        chunk_size: the number of files given to exiftool at once, see `ExifToolBackend`.
+            Defaults to 250.
+        workers: the number of exiftool processes, and of threads reading files natively, run
+            concurrently. Defaults to the number of CPUs.
+        tolerance: the timeout and retries of exiftool calls, and the record of files which could
+            not be extracted, see `photocrawl.faults`. Defaults to a `FaultTolerance` with default
+            settings.
+
+    Returns:
+        The `MetadataBackend` object.
+    """
+    if name not in METADATA_BACKENDS:
+        msg = f"Invalid metadata backend '{name}', should be one of {METADATA_BACKENDS}"
+        raise ValueError(msg)
+    exiftool_backend = ExifToolBackend(
+        engine=engine, chunk_size=chunk_size, workers=workers, tolerance=tolerance
+    )
+    return NativeBackend(fallback=exiftool_backend, threads=workers) if name == "native" else exiftool_backend
@@ -0,0 +1,255 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+A persistent, on-disk cache of extracted metadata, so that files are only processed again when
+they changed since the last crawl.
+
+Entries are stored in an SQLite database in WAL mode, keyed by absolute path and validated
+against the file's size and modification time in nanoseconds. The capture date, camera and lens of
+each entry are also kept in columns of their own, an index which filters on shots are checked
+against without decoding entries, see `photocrawl.filters`.
+"""
+
+import json
+import os
+import pathlib
+import sqlite3
+from collections.abc import Iterable, Iterator
+from typing import Optional, Union
+
+from loguru import logger
+
+from photocrawl.filters import CAMERA_TAG, CAPTURE_DATE_TAG, LENS_TAG, ShotFilter
+from photocrawl.utils import chunked
+
+_QUERY_CHUNK_SIZE: int = 500
+# Columns of the metadata table indexing the fields filters are checked against, and their EXIF tags
+INDEX_COLUMNS: dict[str, str] = {"captured": CAPTURE_DATE_TAG, "camera": CAMERA_TAG, "lens": LENS_TAG}
+
+
+class MetadataCache:
+    """
+    Class to handle the SQLite database caching extracted metadata of crawled files.
+    """
+
+    __slots__ = {
+        "path": "PosixPath object to the SQLite database file",
+        "hits": "integer, number of files found valid in the cache this session",
+        "misses": "integer, number of files absent or outdated in the cache this session",
+        "pruned": "integer, number of entries of deleted files removed this session",
+        "filtered": "integer, number of files found valid in the cache but left out by a filter this session",
+        "_connection": "the sqlite3.Connection to the database",
+    }
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path: pathlib.Path = pathlib.Path(path)
+        self.hits: int = 0
+        self.misses: int = 0
+        self.pruned: int = 0
+        self.filtered: int = 0
+        logger.debug(f"Opening metadata cache at '{self.path.absolute()}'")
+        self._connection: sqlite3.Connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "metadata TEXT NOT NULL, captured TEXT, camera TEXT, lens TEXT) WITHOUT ROWID"
+        )
+        self._add_index_columns()
+        self._connection.execute("CREATE TEMP TABLE crawled (path TEXT PRIMARY KEY)")
+        self._connection.commit()
+
+    def _add_index_columns(self) -> None:
+        """Add the index columns to a cache written before they existed, filled from its entries."""
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(metadata)")}
+        if INDEX_COLUMNS.keys() <= columns:
+            return
+        logger.debug("Indexing the capture date, camera and lens of metadata cache entries")
+        with self._connection:
+            for column in INDEX_COLUMNS.keys() - columns:
+                self._connection.execute(f"ALTER TABLE metadata ADD COLUMN {column} TEXT")
+            entries = self._connection.execute("SELECT path, metadata FROM metadata").fetchall()
+            self._connection.executemany(
+                "UPDATE metadata SET captured = ?, camera = ?, lens = ? WHERE path = ?",
+                ((*_index_values(json.loads(metadata)), path) for path, metadata in entries),
+            )
+
+    def __enter__(self) -> "MetadataCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def lookup(
+        self, photo_files: Iterable[str], shot_filter: Optional[ShotFilter] = None
+    ) -> Iterator[tuple[str, Optional[dict]]]:
+        """
+        Lazily look up the provided files in the cache. An entry is only valid if the file's size
+        and modification time did not change since it was stored. Looked up files are recorded, see
+        `prune`. If a filter is given, files with a valid entry which does not match it are left
+        out, checked against the index columns by the database so that their entries are not read.
+
+        Args:
+            photo_files: an iterable of paths to the files to look up.
+            shot_filter: the `ShotFilter` files with a valid entry should match. Defaults to None,
+                to not filter files.
+
+        Returns:
+            An iterator of tuples with each file's path and its cached metadata dictionary, or
+            `None` if the file needs to be processed.
+        """
+        condition, parameters = _filter_condition(shot_filter)
+        for chunk in chunked(photo_files, _QUERY_CHUNK_SIZE):
+            absolute_paths = [os.path.abspath(photo_file) for photo_file in chunk]
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO crawled (path) VALUES (?)", ((path,) for path in absolute_paths)
+                )
+            entries = {
+                path: (size, mtime_ns, metadata)
+                for path, size, mtime_ns, metadata in self._connection.execute(
+                    f"SELECT path, size, mtime_ns, CASE WHEN {condition} THEN metadata END FROM metadata "
+                    f"WHERE path IN ({','.join('?' * len(absolute_paths))})",
+                    [*parameters, *absolute_paths],
+                )
+            }
+            for photo_file, absolute_path in zip(chunk, absolute_paths):
+                entry = entries.get(absolute_path)
+                if entry is not None and entry[:2] == _signature(absolute_path, default=(-1, -1)):
+                    self.hits += 1
+                    if entry[2] is None:  # left out by the filter
+                        self.filtered += 1
+                        continue
+                    yield photo_file, json.loads(entry[2])
+                else:
+                    self.misses += 1
+                    yield photo_file, None
+
+    def store(self, results: Iterable[tuple[str, dict]]) -> None:
+        """
+        Store extracted metadata in the cache. Empty results, for files whose metadata could not be
+        extracted, are not stored so that these files are tried again next time.
+
+        Args:
+            results: an iterable of tuples with each file's path and its metadata dictionary.
+        """
+        rows = []
+        for photo_file, metadata in results:
+            if not metadata:
+                continue
+            absolute_path = os.path.abspath(photo_file)
+            size, mtime_ns = _signature(absolute_path, default=(-1, -1))
+            if size < 0:
+                continue
+            rows.append((absolute_path, size, mtime_ns, json.dumps(metadata), *_index_values(metadata)))
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, metadata, captured, camera, lens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def prune(self, directory: Union[str, pathlib.Path]) -> int:
+        """
+        Remove the entries of files under `directory` which were not looked up since the last
+        pruning and do not exist anymore. Entries for other directories sharing the cache are left
+        untouched.
+
+        Args:
+            directory: the top-level directory which was crawled.
+
+        Returns:
+            The number of removed entries.
+        """
+        prefix = os.path.join(os.path.abspath(directory), "")
+        upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)  # all paths starting with prefix are below
+        with self._connection:
+            candidates = [
+                path
+                for (path,) in self._connection.execute(
+                    "SELECT path FROM metadata WHERE path >= ? AND path < ? "
+                    "AND path NOT IN (SELECT path FROM crawled)",
+                    (prefix, upper_bound),
+                )
+            ]
+            deleted = [(path,) for path in candidates if not os.path.exists(path)]
+            self._connection.executemany("DELETE FROM metadata WHERE path = ?", deleted)
+            self._connection.execute("DELETE FROM crawled")
+        self.pruned += len(deleted)
+        logger.debug(f"Pruned {len(deleted)} cache entries of deleted files")
+        return len(deleted)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        logger.info(f"Clearing metadata cache at '{self.path.absolute()}'")
+        with self._connection:
+            self._connection.execute("DELETE FROM metadata")
+        self._connection.execute("VACUUM")
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns statistics about the cache and its use during this session.
+
+        Returns:
+            A dictionary with the number of entries, the size in bytes of the database file, and the
+            numbers of hits, misses, pruned entries and filtered files during this session.
+        """
+        size_on_disk = sum(
+            path.stat().st_size
+            for path in (self.path, self.path.with_name(f"{self.path.name}-wal"))
+            if path.is_file()
+        )
+        return {
+            "entries": len(self),
+            "size_bytes": size_on_disk,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pruned": self.pruned,
+            "filtered": self.filtered,
+        }
+
+
+def _index_values(metadata: dict) -> tuple[Optional[str], ...]:
+    """The values of the index columns for an entry's metadata, see `INDEX_COLUMNS`."""
+    values = (metadata.get(tag) for tag in INDEX_COLUMNS.values())
+    return tuple(str(value) if value is not None else None for value in values)
+
+
+def _filter_condition(shot_filter: Optional[ShotFilter]) -> tuple[str, list[str]]:
+    """
+    The SQL condition on the index columns equivalent to `ShotFilter.matches`, and its parameters.
+    Entries missing a filtered field do not match, as their comparisons are NULL.
+    """
+    if shot_filter is None or not shot_filter.filters_metadata:
+        return "1", []
+    conditions: list[str] = []
+    parameters: list[str] = []
+    if shot_filter.since is not None:
+        conditions.append("substr(captured, 1, 10) >= ?")
+        parameters.append(shot_filter.since)
+    if shot_filter.until is not None:
+        conditions.append("substr(captured, 1, 10) <= ?")
+        parameters.append(shot_filter.until)
+    for column, values in (("camera", shot_filter.cameras), ("lens", shot_filter.lenses)):
+        if values:
+            conditions.append(f"lower({column}) IN ({','.join('?' * len(values))})")
+            parameters.extend(sorted(values))
+    return " AND ".join(conditions), parameters
+
+
+def _signature(path: str, default: tuple[int, int]) -> tuple[int, int]:
+    """The size and modification time in nanoseconds of the file at `path`, or `default`."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return default
+    return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,117 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+An on-disk checkpoint of the metadata extracted during a crawl, so that an interrupted crawl of
+a large library can be resumed instead of starting over.
+
+Results are appended to a JSON lines file, one `[path, metadata]` array per line, in batches.
+A line cut short by an interruption is dropped when the checkpoint is resumed.
+"""
+
+import json
+import os
+import pathlib
+from typing import Optional, TextIO, Union
+
+from loguru import logger
+
+CHECKPOINT_BATCH_SIZE: int = 1000
+
+
+class Checkpoint:
+    """
+    Class to handle the JSON lines file of metadata extracted during a crawl.
+    """
+
+    __slots__ = {
+        "path": "PosixPath object to the JSON lines file",
+        "batch_size": "integer, number of results written to the file at once",
+        "_pending": "list of the lines of results not yet written to the file",
+        "_file": "the file object the results are appended to, opened on first write",
+    }
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        *,
+        resume: bool = False,
+        batch_size: int = CHECKPOINT_BATCH_SIZE,
+    ):
+        """
+        Args:
+            path: the location of the checkpoint file. Created if it does not exist.
+            resume: if set to True, results of an existing checkpoint file are kept, see `load`.
+                Otherwise, the file is emptied. Defaults to False.
+            batch_size: the number of results written to the file at once. Defaults to 1000.
+        """
+        self.path: pathlib.Path = pathlib.Path(path)
+        self.batch_size: int = batch_size
+        self._pending: list[str] = []
+        self._file: Optional[TextIO] = None
+        if not resume or not self.path.is_file():
+            self.path.write_text("")
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def load(self) -> dict[str, dict]:
+        """
+        Read the results written to the checkpoint file, and truncate the file after its last
+        complete line.
+
+        Returns:
+            A dictionary of the checkpointed files' paths to their metadata dictionary.
+        """
+        results: dict[str, dict] = {}
+        valid_size: int = 0
+        with self.path.open("rb") as file:
+            for line in file:
+                try:
+                    photo_file, metadata = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Dropping results after an incomplete line of checkpoint '{self.path}'")
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                results[photo_file] = metadata
+                valid_size += len(line)
+        if valid_size < self.path.stat().st_size:
+            os.truncate(self.path, valid_size)
+        if results:
+            logger.info(f"Resuming from checkpoint '{self.path}' with {len(results)} processed files")
+        return results
+
+    def append(self, photo_file: str, metadata: dict) -> None:
+        """
+        Add the metadata of a file to the checkpoint. Results are written once `batch_size` of
+        them are pending, see `flush`.
+
+        Args:
+            photo_file: the path to the file.
+            metadata: the dictionary with the file's exif fields and values.
+        """
+        self._pending.append(json.dumps([photo_file, metadata]))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending results to the checkpoint file, and make sure they reach the disk."""
+        if not self._pending:
+            return
+        if self._file is None:
+            self._file = self.path.open("a")
+        self._file.write("\n".join(self._pending) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending.clear()
+
+    def close(self) -> None:
+        """Write the pending results and close the checkpoint file."""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
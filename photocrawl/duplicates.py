@@ -0,0 +1,155 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Detection of files with the same content, such as photos copied in several backup or export
+directories, so that they are counted once.
+
+Files are first bucketed by size, capture time and camera, which is cheap as their metadata is
+extracted anyway. Only files colliding in a bucket are read: a hash of their first and last blocks
+tells most of them apart, and their whole content is only hashed if these match.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+from typing import Optional, Union
+
+from loguru import logger
+
+HASH_BLOCK_SIZE: int = 64 * 1024
+
+BucketKey = tuple[int, Optional[str], Optional[str]]  # size, capture time and camera of a file
+
+
+class DuplicateFinder:
+    """
+    Class to handle the detection of files whose content is that of a previously seen file.
+    """
+
+    __slots__ = {
+        "duplicates": "dictionary of the paths of duplicate files to the path of the file kept",
+        "partial_hashes": "integer, number of hashes of the first and last blocks of files",
+        "full_hashes": "integer, number of hashes of the whole content of files",
+        "_buckets": "dictionary of the bucket key of seen files to their paths",
+        "_hashes": "dictionary of the paths of hashed files to their partial and full hashes",
+    }
+
+    def __init__(self):
+        self.duplicates: dict[str, str] = {}
+        self.partial_hashes: int = 0
+        self.full_hashes: int = 0
+        self._buckets: dict[BucketKey, list[str]] = {}
+        self._hashes: dict[str, list[Optional[bytes]]] = {}
+
+    def is_duplicate(self, photo_file: str, metadata: dict) -> bool:
+        """
+        Whether the file has the same content as a file previously given to this method, in which
+        case it is recorded in `duplicates`. The first file of a content is never a duplicate.
+
+        Args:
+            photo_file: the path to the file.
+            metadata: the dictionary with the file's exif fields and values.
+
+        Returns:
+            A boolean.
+        """
+        try:
+            size = os.stat(photo_file).st_size
+        except OSError as error:
+            logger.debug(f"Could not check '{photo_file}' for duplicates: {error}")
+            return False
+        key: BucketKey = (size, metadata.get("DateTimeOriginal"), metadata.get("Model"))
+        candidates = self._buckets.get(key)
+        if candidates is None:
+            self._buckets[key] = [photo_file]
+            return False
+
+        for candidate in candidates:
+            try:
+                same_content = self._same_content(candidate, photo_file, size)
+            except OSError as error:
+                logger.debug(f"Could not compare '{photo_file}' to '{candidate}': {error}")
+                continue
+            if same_content:
+                logger.debug(f"Skipping '{photo_file}', a duplicate of '{candidate}'")
+                self.duplicates[photo_file] = candidate
+                return True
+        candidates.append(photo_file)
+        return False
+
+    def _same_content(self, first: str, second: str, size: int) -> bool:
+        if self._hash(first, size, full=False) != self._hash(second, size, full=False):
+            return False
+        if size <= 2 * HASH_BLOCK_SIZE:  # the first and last blocks are the whole content
+            return True
+        return self._hash(first, size, full=True) == self._hash(second, size, full=True)
+
+    def _hash(self, photo_file: str, size: int, *, full: bool) -> bytes:
+        hashes = self._hashes.setdefault(photo_file, [None, None])
+        if hashes[full] is None:
+            hashes[full] = full_hash(photo_file) if full else partial_hash(photo_file, size)
+            if full:
+                self.full_hashes += 1
+            else:
+                self.partial_hashes += 1
+        return hashes[full]
+
+    def save(self, path: Union[str, pathlib.Path]) -> pathlib.Path:
+        """
+        Write the duplicates found to a JSON file, as a dictionary of the paths of duplicate files
+        to the path of the file kept.
+
+        Args:
+            path: the location of the file to write.
+
+        Returns:
+            A `pathlib.Path` object of the written file.
+        """
+        path = pathlib.Path(path)
+        path.write_text(json.dumps(self.duplicates, indent=2))
+        logger.info(f"Saved the report of {len(self.duplicates)} duplicate files to '{path}'")
+        return path
+
+    def __repr__(self) -> str:
+        return (
+            f"DuplicateFinder({len(self.duplicates)} duplicates, {self.partial_hashes} partial and "
+            f"{self.full_hashes} full hashes)"
+        )
+
+
+def partial_hash(photo_file: str, size: int) -> bytes:
+    """
+    Hash the first and last `HASH_BLOCK_SIZE` bytes of a file, or its whole content if it is
+    smaller than two blocks.
+
+    Args:
+        photo_file: the path to the file.
+        size: the size of the file in bytes.
+
+    Returns:
+        The BLAKE2b digest of the blocks.
+    """
+    digest = hashlib.blake2b()
+    with open(photo_file, "rb") as file:
+        digest.update(file.read(HASH_BLOCK_SIZE))
+        if size > 2 * HASH_BLOCK_SIZE:
+            file.seek(-HASH_BLOCK_SIZE, os.SEEK_END)
+        digest.update(file.read(HASH_BLOCK_SIZE))
+    return digest.digest()
+
+
+def full_hash(photo_file: str) -> bytes:
+    """
+    Hash the whole content of a file, memory-mapped so that it is not copied into Python objects.
+
+    Args:
+        photo_file: the path to the file, which should not be empty.
+
+    Returns:
+        The BLAKE2b digest of the content.
+    """
+    with open(photo_file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        return hashlib.blake2b(content).digest()
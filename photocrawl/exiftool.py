@@ -0,0 +1,581 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Drivers for ExifTool, to avoid starting a new Perl interpreter for every single file.
+
+Metadata is extracted for chunks of files at once, asking only for the wanted tags. Chunks are
+either given to a one-off exiftool call, or to long-lived ExifTool processes run with the
+`-stay_open True -@ -` arguments, which read their arguments from stdin and answer with JSON
+output followed by a `{readyN}` line once a command is executed. One-off calls can also be
+driven by an asyncio event loop, which runs many exiftool processes at once from a single thread.
+Each call can be given a timeout, after which the exiftool process is killed, see `photocrawl.faults`.
+The duration of each successful call is recorded as the extraction latency of its files, see
+`photocrawl.metrics.record_latency`.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import select
+import subprocess
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+
+from loguru import logger
+
+from photocrawl import metrics
+from photocrawl.utils import bounded_imap_unordered, chunked
+
+if TYPE_CHECKING:
+    from photocrawl.faults import FaultTolerance
+
+EXIFTOOL_EXECUTABLE: str = "exiftool"
+EXIFTOOL_COMMON_ARGS: tuple[str, ...] = ("-G", "-j")
+EXIF_GROUP: str = "EXIF"
+FAST_READ_ARGS: tuple[str, ...] = ("-fast2",)
+EXIFTOOL_EXIT_CODES: tuple[int, ...] = (0, 1)  # 1 when some files could not be read, others still are
+
+
+class ExifToolError(RuntimeError):
+    """Raised when an ExifTool process is not running or exits unexpectedly."""
+
+
+class ExifToolNotFoundError(ExifToolError):
+    """Raised when the exiftool executable could not be found."""
+
+
+class ExifToolTimeout(ExifToolError):
+    """Raised when an exiftool call exceeds its timeout, in which case its process is killed."""
+
+
+def select_features(metadata: dict, features: Iterable[str]) -> dict[str, str]:
+    """
+    Keep only the wanted tags of the EXIF group from the JSON output of `exiftool -G -j`, and
+    strip the group prefix from their names.
+
+    Args:
+        metadata: the dictionary of one file's metadata, as output by exiftool.
+        features: the names of the EXIF tags to keep.
+
+    Returns:
+        A dictionary with the exif fields and value for the specific file.
+    """
+    result: dict[str, str] = {}
+    for key, value in metadata.items():
+        group, _, tag = key.partition(":")
+        if group == EXIF_GROUP and tag in features:
+            result[tag] = value
+    return result
+
+
+def get_exif(photo_file: str, features: Iterable[str]) -> dict[str, str]:
+    """
+    Returns a dictionary with the provided features from image EXIF, starting a new exiftool
+    process for this single file.
+
+    Args:
+        photo_file: the path to the file location.
+        features: the names of the EXIF tags to keep.
+
+    Returns:
+        A dictionary with the exif fields and value for the specific file.
+    """
+    import pyexifinfo as pyexif  # only needed by the 'per_file' engine, not imported on every crawl
+
+    logger.trace(f"Extracting exif for file {photo_file}")
+    return select_features(pyexif.get_json(photo_file)[0], features)
+
+
+def tag_arguments(features: Iterable[str]) -> list[str]:
+    """
+    Build the exiftool arguments to only extract the provided tags of the EXIF group. The `-fast2`
+    option is given too, as none of these tags lives in maker notes or file trailers.
+
+    Args:
+        features: the names of the EXIF tags to extract.
+
+    Returns:
+        A list of arguments to give to exiftool, such as `['-fast2', '-EXIF:FNumber', ...]`.
+    """
+    return [*FAST_READ_ARGS, *(f"-{EXIF_GROUP}:{tag}" for tag in features)]
+
+
+def map_to_files(files: Sequence[str], results: Iterable[dict]) -> list[tuple[str, dict]]:
+    """
+    Map the JSON output of exiftool for several files back to their source paths, through the
+    `SourceFile` field of each result.
+
+    Args:
+        files: the paths of the files given to exiftool.
+        results: the dictionaries parsed from the output of exiftool.
+
+    Returns:
+        A list of tuples with each file's path and its metadata dictionary, in the order of
+        `files`. The dictionary is empty for files exiftool could not read.
+    """
+    by_source = {os.path.normpath(result.get("SourceFile", "")): result for result in results}
+    mapped = [(photo_file, by_source.get(os.path.normpath(photo_file), {})) for photo_file in files]
+    for photo_file, metadata in mapped:
+        if not metadata:
+            logger.debug(f"Could not get metadata of file {photo_file}")
+    return mapped
+
+
+def run_batch(
+    files: Sequence[str],
+    arguments: Sequence[str] = (),
+    executable: str = EXIFTOOL_EXECUTABLE,
+    timeout: Optional[float] = None,
+) -> list[tuple[str, dict]]:
+    """
+    Get the metadata of several files with a single, one-off exiftool call. Arguments and paths
+    are given through stdin, so the size of the chunk is not bound by command line limits.
+
+    Args:
+        files: the paths to the files to get metadata of.
+        arguments: additional arguments to give to exiftool, see `tag_arguments`.
+        executable: the exiftool executable to run.
+        timeout: the number of seconds after which exiftool is killed. Defaults to no limit.
+
+    Returns:
+        A list of tuples with each file's path and its metadata dictionary, in the order of
+        `files`. The dictionary is empty for files exiftool could not read.
+
+    Raises:
+        ExifToolNotFoundError: if the executable could not be found.
+        ExifToolTimeout: if exiftool did not finish in time.
+        ExifToolError: if exiftool crashed.
+    """
+    logger.trace(f"Running exiftool on a batch of {len(files)} files")
+    argfile = "\n".join((*EXIFTOOL_COMMON_ARGS, *arguments, *files, ""))
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(
+            [executable, "-@", "-"],
+            input=argfile.encode(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=False,
+            timeout=timeout,
+        )
+    except FileNotFoundError as error:
+        msg = f"Could not find the '{executable}' executable, is ExifTool in your PATH?"
+        raise ExifToolNotFoundError(msg) from error
+    except subprocess.TimeoutExpired as error:
+        msg = f"Exiftool did not finish within {timeout} seconds on a batch of {len(files)} files"
+        raise ExifToolTimeout(msg) from error
+    _check_exit_code(process.returncode, len(files))
+    metrics.record_latency("extraction", time.perf_counter() - start, len(files))
+    return map_to_files(files, json.loads(process.stdout) if process.stdout.strip() else [])
+
+
+async def run_batch_async(
+    files: Sequence[str],
+    arguments: Sequence[str] = (),
+    executable: str = EXIFTOOL_EXECUTABLE,
+    timeout: Optional[float] = None,
+) -> list[tuple[str, dict]]:
+    """
+    Same as `run_batch`, running exiftool as an asyncio subprocess. The process is killed if the
+    task is cancelled.
+
+    Args:
+        files: the paths to the files to get metadata of.
+        arguments: additional arguments to give to exiftool, see `tag_arguments`.
+        executable: the exiftool executable to run.
+        timeout: the number of seconds after which exiftool is killed. Defaults to no limit.
+
+    Returns:
+        A list of tuples with each file's path and its metadata dictionary, in the order of
+        `files`. The dictionary is empty for files exiftool could not read.
+
+    Raises:
+        ExifToolNotFoundError: if the executable could not be found.
+        ExifToolTimeout: if exiftool did not finish in time.
+        ExifToolError: if exiftool crashed.
+    """
+    logger.trace(f"Running exiftool asynchronously on a batch of {len(files)} files")
+    argfile = "\n".join((*EXIFTOOL_COMMON_ARGS, *arguments, *files, ""))
+    start = time.perf_counter()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            executable,
+            "-@",
+            "-",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError as error:
+        msg = f"Could not find the '{executable}' executable, is ExifTool in your PATH?"
+        raise ExifToolNotFoundError(msg) from error
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(argfile.encode()), timeout)
+    except asyncio.TimeoutError as error:
+        process.kill()
+        await process.wait()
+        msg = f"Exiftool did not finish within {timeout} seconds on a batch of {len(files)} files"
+        raise ExifToolTimeout(msg) from error
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    _check_exit_code(process.returncode, len(files))
+    metrics.record_latency("extraction", time.perf_counter() - start, len(files))
+    return map_to_files(files, json.loads(output) if output.strip() else [])
+
+
+def _check_exit_code(returncode: int, files: int) -> None:
+    """Raise if a one-off exiftool call crashed, in which case files after the crash were not read."""
+    if returncode not in EXIFTOOL_EXIT_CODES:
+        msg = f"Exiftool exited with code {returncode} on a batch of {files} files"
+        raise ExifToolError(msg)
+
+
+async def _imap_async(
+    files: Iterable[str],
+    chunk_size: int,
+    arguments: Sequence[str],
+    concurrency: int,
+    executable: str,
+    tolerance: Optional["FaultTolerance"],
+):
+    """Asynchronously yield the results of chunks of files, see `imap_async`."""
+    semaphore = asyncio.Semaphore(concurrency)
+    stopped = asyncio.Event()
+
+    async def _extract(chunk: list[str]) -> list[tuple[str, dict]]:
+        async with semaphore:
+            if stopped.is_set():
+                return []
+            if tolerance is None:
+                return await run_batch_async(chunk, arguments, executable)
+            return await tolerance.run_async(
+                lambda files: run_batch_async(files, arguments, executable, tolerance.call_timeout(files)),
+                chunk,
+            )
+
+    pending: set[asyncio.Future] = set()
+    try:
+        for chunk in chunked(files, chunk_size):
+            pending.add(asyncio.ensure_future(_extract(chunk)))
+            if len(pending) >= 2 * concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Running exiftool calls are let to finish, while those still waiting are not started
+        stopped.set()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def imap_async(
+    files: Iterable[str],
+    chunk_size: int = 1,
+    arguments: Sequence[str] = (),
+    concurrency: int = 1,
+    executable: str = EXIFTOOL_EXECUTABLE,
+    tolerance: Optional["FaultTolerance"] = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Lazily get the metadata of the provided files, in the order they are processed. Each chunk of
+    `chunk_size` files is given to a one-off exiftool call, and at most `concurrency` calls run at
+    once as subprocesses of an asyncio event loop, which waits on all of them from this thread.
+
+    Args:
+        files: an iterable of paths to the files to get metadata of.
+        chunk_size: the number of files given to each exiftool call. Defaults to 1.
+        arguments: additional arguments to give to exiftool, see `tag_arguments`.
+        concurrency: the maximum number of exiftool processes running at once. Defaults to 1.
+        executable: the exiftool executable to run.
+        tolerance: the `FaultTolerance` giving the timeout of each exiftool call, and isolating
+            the files of failed calls. Defaults to None, for no limit and no isolation.
+
+    Returns:
+        An iterator of tuples with each file's path and its metadata dictionary, which is empty
+        if exiftool could not read the file.
+    """
+    loop = asyncio.new_event_loop()
+    chunk_results = _imap_async(files, chunk_size, arguments, concurrency, executable, tolerance)
+    try:
+        while True:
+            try:
+                results = loop.run_until_complete(chunk_results.__anext__())
+            except StopAsyncIteration:
+                return
+            yield from results
+    finally:
+        loop.run_until_complete(chunk_results.aclose())
+        loop.close()
+
+
+class ExifToolProcess:
+    """
+    Class to handle a single ExifTool process running in `-stay_open` mode.
+    """
+
+    __slots__ = {
+        "executable": "string, the exiftool executable to run",
+        "common_args": "tuple of arguments given to exiftool for every executed command",
+        "_process": "the subprocess.Popen object of the running exiftool process",
+        "_counter": "integer, number of commands sent to the process so far",
+    }
+
+    def __init__(
+        self, executable: str = EXIFTOOL_EXECUTABLE, common_args: Sequence[str] = EXIFTOOL_COMMON_ARGS
+    ):
+        self.executable: str = executable
+        self.common_args: tuple[str, ...] = tuple(common_args)
+        self._process: Optional[subprocess.Popen] = None
+        self._counter: int = 0
+
+    def __enter__(self) -> "ExifToolProcess":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.terminate()
+
+    @property
+    def running(self) -> bool:
+        """Whether the underlying exiftool process is alive."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """
+        Start the exiftool process, if it is not already running.
+
+        Raises:
+            ExifToolNotFoundError: if the executable could not be found.
+        """
+        if self.running:
+            return
+        logger.trace(f"Starting '{self.executable}' in stay_open mode")
+        try:
+            self._process = subprocess.Popen(
+                [self.executable, "-stay_open", "True", "-@", "-", "-common_args", *self.common_args],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError as error:
+            msg = f"Could not find the '{self.executable}' executable, is ExifTool in your PATH?"
+            raise ExifToolNotFoundError(msg) from error
+
+    def terminate(self, timeout: float = 5) -> None:
+        """
+        Ask the exiftool process to exit cleanly, and kill it if it does not do so in time.
+
+        Args:
+            timeout: the number of seconds to wait for the process to exit. Defaults to 5.
+        """
+        if self._process is None:
+            return
+        logger.trace(f"Terminating exiftool process {self._process.pid}")
+        try:
+            if self.running:
+                self._process.stdin.write(b"-stay_open\nFalse\n")
+                self._process.stdin.flush()
+            self._process.stdin.close()
+            self._process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        finally:
+            self._process.stdout.close()
+            self._process = None
+
+    def restart(self) -> None:
+        """Terminate the exiftool process, whatever its state, and start a new one."""
+        self.terminate()
+        self.start()
+
+    def execute(self, *arguments: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Send a command to the exiftool process and wait for its complete output.
+
+        Args:
+            arguments: the arguments for this command, in addition to the common ones.
+            timeout: the number of seconds to wait for the output, after which the process is
+                killed. Defaults to no limit.
+
+        Returns:
+            The raw output of exiftool for this command, without the `{readyN}` line.
+
+        Raises:
+            ExifToolError: if the process is not running or dies before answering.
+            ExifToolTimeout: if the process did not answer in time, it is then killed.
+        """
+        if not self.running:
+            msg = "The exiftool process is not running"
+            raise ExifToolError(msg)
+
+        self._counter += 1
+        sentinel = f"{{ready{self._counter}}}".encode()
+        command = "\n".join((*arguments, f"-execute{self._counter}", ""))
+        try:
+            self._process.stdin.write(command.encode())
+            self._process.stdin.flush()
+        except OSError as error:
+            msg = "Could not send command to the exiftool process"
+            raise ExifToolError(msg) from error
+
+        output = bytearray()
+        stdout_fd: int = self._process.stdout.fileno()
+        deadline: Optional[float] = time.monotonic() + timeout if timeout is not None else None
+        while not output[-len(sentinel) - 4 :].rstrip().endswith(sentinel):
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            if remaining is not None and not select.select([stdout_fd], [], [], remaining)[0]:
+                self.terminate(timeout=0)
+                msg = f"The exiftool process did not answer within {timeout} seconds"
+                raise ExifToolTimeout(msg)
+            chunk = os.read(stdout_fd, 65536)
+            if not chunk:
+                msg = "The exiftool process exited unexpectedly"
+                raise ExifToolError(msg)
+            output.extend(chunk)
+        return bytes(output.rstrip()[: -len(sentinel)])
+
+    def execute_json(self, *files: str, timeout: Optional[float] = None) -> list[dict]:
+        """
+        Get the metadata of the provided files, as parsed from the JSON output of exiftool.
+
+        Args:
+            files: the paths to the files to get metadata of.
+            timeout: the number of seconds to wait for the output, see `execute`.
+
+        Returns:
+            A list of dictionaries, one per file exiftool could read.
+        """
+        output = self.execute(*files, timeout=timeout)
+        return json.loads(output) if output.strip() else []
+
+
+class ExifToolPool:
+    """
+    Class to handle several ExifTool processes in `-stay_open` mode, each one driven from its own
+    thread, to extract metadata of many files concurrently.
+    """
+
+    __slots__ = {
+        "processes": "integer, number of exiftool processes to run",
+        "executable": "string, the exiftool executable to run",
+        "_workers": "list of all ExifToolProcess objects in the pool",
+        "_idle_workers": "queue of ExifToolProcess objects not currently executing a command",
+        "_executor": "ThreadPoolExecutor used to drive the exiftool processes",
+    }
+
+    def __init__(self, processes: int, executable: str = EXIFTOOL_EXECUTABLE):
+        self.processes: int = processes
+        self.executable: str = executable
+        self._workers: list[ExifToolProcess] = []
+        self._idle_workers: queue.Queue = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "ExifToolPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def start(self) -> None:
+        """Start all exiftool processes of the pool."""
+        logger.debug(f"Starting a pool of {self.processes} exiftool processes")
+        for _ in range(self.processes):
+            worker = ExifToolProcess(self.executable)
+            worker.start()
+            self._workers.append(worker)
+            self._idle_workers.put(worker)
+        self._executor = ThreadPoolExecutor(self.processes, thread_name_prefix="exiftool")
+
+    def shutdown(self) -> None:
+        """Wait for pending commands and cleanly terminate all exiftool processes of the pool."""
+        logger.debug("Shutting down the pool of exiftool processes")
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for worker in self._workers:
+            worker.terminate()
+        self._workers.clear()
+        self._idle_workers = queue.Queue()
+
+    def execute_json(self, files: Sequence[str], timeout: Optional[float] = None) -> list[dict]:
+        """
+        Get the metadata of the provided files from the first available exiftool process. If this
+        process died, it is restarted and the command is tried once more. If it did not answer in
+        time, it is killed and replaced by a new process.
+
+        Args:
+            files: the paths to the files to get metadata of.
+            timeout: the number of seconds to wait for the output. Defaults to no limit.
+
+        Returns:
+            A list of dictionaries, one per file exiftool could read.
+
+        Raises:
+            ExifToolTimeout: if the process did not answer in time.
+        """
+        worker: ExifToolProcess = self._idle_workers.get()
+        try:
+            try:
+                return worker.execute_json(*files, timeout=timeout)
+            except ExifToolTimeout:
+                logger.warning(f"An exiftool process hung for {timeout} seconds, replacing it")
+                worker.start()
+                raise
+            except ExifToolError:
+                logger.warning("An exiftool process died, restarting it")
+                worker.restart()
+                return worker.execute_json(*files, timeout=timeout)
+        finally:
+            self._idle_workers.put(worker)
+
+    def imap_unordered(
+        self,
+        files: Iterable[str],
+        chunk_size: int = 1,
+        arguments: Sequence[str] = (),
+        tolerance: Optional["FaultTolerance"] = None,
+    ) -> Iterator[tuple[str, dict]]:
+        """
+        Lazily get the metadata of the provided files, in the order they are processed. Files are
+        sent to the exiftool processes in chunks of `chunk_size`.
+
+        Args:
+            files: an iterable of paths to the files to get metadata of.
+            chunk_size: the number of files to send to an exiftool process at once. Defaults to 1.
+            arguments: additional arguments to give to exiftool, see `tag_arguments`.
+            tolerance: the `FaultTolerance` giving the timeout of each command, and isolating the
+                files of failed commands. Defaults to None, for no limit and no isolation.
+
+        Returns:
+            An iterator of tuples with each file's path and its metadata dictionary, which is empty
+            if exiftool could not read the file.
+        """
+        if self._executor is None:
+            msg = "The pool has not been started"
+            raise ExifToolError(msg)
+
+        def _run(chunk: list[str]) -> list[tuple[str, dict]]:
+            timeout = tolerance.call_timeout(chunk) if tolerance is not None else None
+            start = time.perf_counter()
+            results = self.execute_json([*arguments, *chunk], timeout)
+            metrics.record_latency("extraction", time.perf_counter() - start, len(chunk))
+            return map_to_files(chunk, results)
+
+        def _extract(chunk: list[str]) -> list[tuple[str, dict]]:
+            return _run(chunk) if tolerance is None else tolerance.run(_run, chunk)
+
+        for results in bounded_imap_unordered(
+            self._executor, _extract, chunked(files, chunk_size), window=2 * self.processes
+        ):
+            yield from results
@@ -0,0 +1,219 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Fault isolation of metadata extraction, so that a corrupt or huge file which makes exiftool fail
+or hang does not stop the crawl, nor hold up the files extracted along with it.
+
+Files are extracted in chunks as usual, each exiftool call being killed if it exceeds a timeout,
+a number of seconds per file times the number of files it was given. Only when a chunk fails are
+its files tried again one by one, a bounded number of times, so that the files which cannot be
+extracted are singled out. These are reported with their error and the time spent on them, and
+are given empty metadata like files exiftool could not read.
+"""
+
+import json
+import pathlib
+import threading
+import time
+from collections.abc import Awaitable, Callable, Sequence, Sized
+from typing import Any, Optional, Union
+
+from loguru import logger
+
+from photocrawl import metrics
+from photocrawl.exiftool import ExifToolNotFoundError
+
+DEFAULT_TIMEOUT: float = 2.0
+DEFAULT_RETRIES: int = 1
+
+Extraction = Callable[[list[str]], list[tuple[str, dict]]]
+AsyncExtraction = Callable[[list[str]], Awaitable[list[tuple[str, dict]]]]
+
+
+class FaultTolerance:
+    """
+    Class to handle the failures of metadata extraction, and the report of the files which could
+    not be extracted.
+    """
+
+    __slots__ = {
+        "timeout": "float, seconds an exiftool call may take per file before it is killed, None for no limit",
+        "retries": "integer, number of times a file failing on its own is tried again",
+        "failures": "list of dictionaries with the path, error, elapsed time and attempts of failed files",
+        "isolated": "integer, number of files tried on their own after their chunk failed",
+        "_lock": "threading.Lock guarding the records, as chunks are extracted from several threads",
+    }
+
+    def __init__(self, timeout: Optional[float] = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES):
+        """
+        Args:
+            timeout: the number of seconds an exiftool call may take per file it was given, before
+                it is killed, see `call_timeout`. Defaults to 2, None for no limit.
+            retries: the number of times a file failing on its own is tried again before it is
+                reported as failed. Defaults to 1.
+        """
+        if timeout is not None and timeout <= 0:
+            msg = f"Invalid timeout {timeout}, should be a positive number of seconds"
+            raise ValueError(msg)
+        if retries < 0:
+            msg = f"Invalid number of retries {retries}, should be positive or zero"
+            raise ValueError(msg)
+        self.timeout: Optional[float] = timeout
+        self.retries: int = retries
+        self.failures: list[dict[str, Any]] = []
+        self.isolated: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def call_timeout(self, photo_files: Sized) -> Optional[float]:
+        """
+        The number of seconds an exiftool call may take on the given files before it is killed,
+        which grows with their number so that a large chunk is not deemed to hang on a slow disk.
+
+        Args:
+            photo_files: the files given to the exiftool call.
+
+        Returns:
+            The timeout per file times the number of files, None for no limit.
+        """
+        return None if self.timeout is None else self.timeout * max(len(photo_files), 1)
+
+    def run(self, extract: Extraction, photo_files: Sequence[str]) -> list[tuple[str, dict]]:
+        """
+        Extract the metadata of a chunk of files, and if this fails try each file on its own.
+
+        Args:
+            extract: the function extracting the metadata of a list of files, returning tuples of
+                each file's path and metadata, and raising if the extraction failed or timed out.
+            photo_files: the paths to the files of the chunk.
+
+        Returns:
+            A list of tuples with each file's path and its metadata dictionary, which is empty for
+            files which could not be extracted.
+
+        Raises:
+            ExifToolNotFoundError: if exiftool could not be found, which no retry can help with.
+        """
+        photo_files = list(photo_files)
+        if len(photo_files) > 1:
+            try:
+                return extract(photo_files)
+            except ExifToolNotFoundError:
+                raise
+            except Exception as error:
+                self.isolating(photo_files, error)
+        return [self._run_alone(extract, photo_file) for photo_file in photo_files]
+
+    async def run_async(self, extract: AsyncExtraction, photo_files: Sequence[str]) -> list[tuple[str, dict]]:
+        """
+        Same as `run`, for a coroutine function extracting the metadata of a list of files.
+
+        Args:
+            extract: the coroutine function extracting the metadata of a list of files.
+            photo_files: the paths to the files of the chunk.
+
+        Returns:
+            A list of tuples with each file's path and its metadata dictionary, which is empty for
+            files which could not be extracted.
+
+        Raises:
+            ExifToolNotFoundError: if exiftool could not be found, which no retry can help with.
+        """
+        photo_files = list(photo_files)
+        if len(photo_files) > 1:
+            try:
+                return await extract(photo_files)
+            except ExifToolNotFoundError:
+                raise
+            except Exception as error:
+                self.isolating(photo_files, error)
+
+        results: list[tuple[str, dict]] = []
+        for photo_file in photo_files:
+            elapsed, error = 0.0, None
+            for _ in range(self.retries + 1):
+                start = time.perf_counter()
+                try:
+                    results.append((await extract([photo_file]))[0])
+                    break
+                except ExifToolNotFoundError:
+                    raise
+                except Exception as attempt_error:
+                    elapsed += time.perf_counter() - start
+                    error = attempt_error
+            else:
+                results.append(self.failed(photo_file, error, elapsed, self.retries + 1))
+        return results
+
+    def _run_alone(self, extract: Extraction, photo_file: str) -> tuple[str, dict]:
+        elapsed, error = 0.0, None
+        for _ in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                return extract([photo_file])[0]
+            except ExifToolNotFoundError:
+                raise
+            except Exception as attempt_error:
+                elapsed += time.perf_counter() - start
+                error = attempt_error
+        return self.failed(photo_file, error, elapsed, self.retries + 1)
+
+    def isolating(self, photo_files: Sequence[str], error: BaseException) -> None:
+        """
+        Record that the files of a failed chunk are tried one by one.
+
+        Args:
+            photo_files: the paths to the files of the chunk.
+            error: the exception raised by the extraction of the chunk.
+        """
+        logger.warning(f"Extraction of {len(photo_files)} files failed ({error}), trying them one by one")
+        with self._lock:
+            self.isolated += len(photo_files)
+
+    def failed(self, photo_file: str, error: Exception, elapsed: float, attempts: int) -> tuple[str, dict]:
+        """
+        Record a file whose extraction failed on every attempt.
+
+        Args:
+            photo_file: the path to the file.
+            error: the exception raised by the last attempt.
+            elapsed: the number of seconds spent on the attempts.
+            attempts: the number of attempts made.
+
+        Returns:
+            A tuple of the file's path and empty metadata, to yield in place of its results.
+        """
+        logger.warning(f"Could not extract metadata of '{photo_file}' after {attempts} attempts: {error}")
+        with self._lock:
+            self.failures.append(
+                {
+                    "path": photo_file,
+                    "error": f"{type(error).__name__}: {error}",
+                    "elapsed": round(elapsed, 3),
+                    "attempts": attempts,
+                }
+            )
+        metrics.count("failed_files")
+        return photo_file, {}
+
+    def save(self, path: Union[str, pathlib.Path]) -> pathlib.Path:
+        """
+        Write the failed files to a JSON file, as a list of dictionaries with the path of each file,
+        the error of its last attempt, the number of seconds spent on it and its number of attempts.
+
+        Args:
+            path: the location of the file to write.
+
+        Returns:
+            A `pathlib.Path` object of the written file.
+        """
+        path = pathlib.Path(path)
+        path.write_text(json.dumps(self.failures, indent=2))
+        logger.info(f"Saved the report of {len(self.failures)} failed files to '{path}'")
+        return path
+
+    def __repr__(self) -> str:
+        return (
+            f"FaultTolerance(timeout={self.timeout}, retries={self.retries}, {len(self.failures)} failures, "
+            f"{self.isolated} files isolated)"
+        )
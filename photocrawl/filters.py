@@ -0,0 +1,196 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Filters on the shots to get insights of, e.g. of 2023 with the X-T4 only, or of a single
+sub-directory, applied as early as possible in the pipeline.
+
+Sub-directory filters prune the directory walk, so that other parts of the tree are never listed.
+Filters on the capture date, camera and lens are checked against the fields of the metadata cache
+when one is used, before its entries are even decoded, and otherwise as soon as metadata is
+extracted, so that shots which do not match are never refactored nor plotted.
+"""
+
+import copy
+import datetime
+import posixpath
+from collections.abc import Iterable, Mapping
+from typing import Optional
+
+CAPTURE_DATE_TAG: str = "DateTimeOriginal"
+CAMERA_TAG: str = "Model"
+LENS_TAG: str = "LensModel"
+EXIF_DATE_FORMAT: str = "%Y:%m:%d"  # the date part of EXIF date and times, e.g. '2023:05:17'
+
+
+def parse_date(date: str, *, end: bool = False) -> str:
+    """
+    Read a date given as 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD', as the first day of the year or month,
+    or the last one if `end` is set.
+
+    Args:
+        date: the date specification.
+        end: whether the date is the end of a range, inclusive. Defaults to False.
+
+    Returns:
+        The date in the format of EXIF dates, e.g. '2023:12:31'.
+    """
+    try:
+        numbers = [int(part) for part in date.split("-")]
+        day = datetime.date(*numbers, *[1] * (3 - len(numbers)))
+    except (ValueError, TypeError):
+        msg = f"Invalid date '{date}', should be 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD'"
+        raise ValueError(msg) from None
+    if end and len(numbers) == 1:
+        day = day.replace(month=12, day=31)
+    elif end and len(numbers) == 2:
+        day = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+    return day.strftime(EXIF_DATE_FORMAT)
+
+
+class ShotFilter:
+    """
+    Class to handle the conditions shots should meet to be processed.
+    """
+
+    __slots__ = {
+        "since": "string EXIF date of the earliest capture date to keep, None for no bound",
+        "until": "string EXIF date of the latest capture date to keep, inclusive, None for no bound",
+        "cameras": "frozenset of the lowercase camera models to keep, empty to keep all",
+        "lenses": "frozenset of the lowercase lens models to keep, empty to keep all",
+        "subtrees": "tuple of directories relative to the crawled one, with '/' separators, to only crawl",
+    }
+
+    def __init__(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        cameras: Iterable[str] = (),
+        lenses: Iterable[str] = (),
+        subtrees: Iterable[str] = (),
+    ):
+        """
+        Args:
+            since: the earliest capture date of shots to keep, see `parse_date`. Defaults to None,
+                for no bound.
+            until: the latest capture date of shots to keep, inclusive, see `parse_date`, e.g.
+                '2023' for the end of 2023. Defaults to None, for no bound.
+            cameras: the camera models of shots to keep, as in their EXIF, e.g. 'X-T4', compared
+                case-insensitively. Defaults to all cameras.
+            lenses: the lens models of shots to keep, as in their EXIF, compared case-insensitively.
+                Defaults to all lenses.
+            subtrees: the directories to only crawl, relative to the crawled directory, e.g.
+                '2023/Iceland'. Defaults to the whole tree.
+        """
+        self.since: Optional[str] = parse_date(since) if since is not None else None
+        self.until: Optional[str] = parse_date(until, end=True) if until is not None else None
+        if self.since is not None and self.until is not None and self.since > self.until:
+            msg = f"Invalid date range, '{since}' is after '{until}'"
+            raise ValueError(msg)
+        self.cameras: frozenset[str] = frozenset(camera.lower() for camera in cameras)
+        self.lenses: frozenset[str] = frozenset(lens.lower() for lens in lenses)
+        self.subtrees: tuple[str, ...] = tuple(
+            posixpath.normpath(subtree.replace("\\", "/")).strip("/") for subtree in subtrees
+        )
+        if any(subtree in (".", "") or subtree.startswith("..") for subtree in self.subtrees):
+            msg = f"Invalid subtrees {list(subtrees)}, should be sub-directories of the crawled directory"
+            raise ValueError(msg)
+
+    @property
+    def filters_metadata(self) -> bool:
+        """Whether shots are filtered by their metadata, not only by their location."""
+        return self.since is not None or self.until is not None or bool(self.cameras or self.lenses)
+
+    def with_lens_aliases(self, aliases: Mapping[str, str]) -> "ShotFilter":
+        """
+        A copy of this filter also keeping the lenses whose EXIF name is an alias of a kept lens,
+        such as the names given to lenses in insights, see `PhotoCrawler.lens_tags_mapping`.
+
+        Args:
+            aliases: a dictionary of EXIF lens names to the names they are shown as.
+
+        Returns:
+            A new `ShotFilter` object.
+        """
+        aliased = copy.copy(self)
+        aliased.lenses = self.lenses | {
+            tag.lower() for tag, name in aliases.items() if name.lower() in self.lenses
+        }
+        return aliased
+
+    def matches(self, metadata: Mapping) -> bool:
+        """
+        Whether a shot meets the conditions on its capture date, camera and lens. Shots missing
+        one of the filtered fields do not.
+
+        Args:
+            metadata: the dictionary with the shot's exif fields and values.
+
+        Returns:
+            A boolean.
+        """
+        return self.matches_fields(
+            metadata.get(CAPTURE_DATE_TAG), metadata.get(CAMERA_TAG), metadata.get(LENS_TAG)
+        )
+
+    def matches_fields(self, capture_time: Optional[str], camera: Optional[str], lens: Optional[str]) -> bool:
+        """
+        Same as `matches`, from the values of the filtered fields only.
+
+        Args:
+            capture_time: the EXIF capture date and time of the shot, e.g. '2023:05:17 10:42:00'.
+            camera: the camera model of the shot.
+            lens: the lens model of the shot.
+
+        Returns:
+            A boolean.
+        """
+        if self.since is not None or self.until is not None:
+            if capture_time is None:
+                return False
+            date = str(capture_time)[:10]
+            if self.since is not None and date < self.since:
+                return False
+            if self.until is not None and date > self.until:
+                return False
+        if self.cameras and (camera is None or str(camera).lower() not in self.cameras):
+            return False
+        return not self.lenses or (lens is not None and str(lens).lower() in self.lenses)
+
+    def includes_directory(self, relative_path: str) -> bool:
+        """
+        Whether the directory walk should go into a directory, being in one of the subtrees or on
+        the way to one of them.
+
+        Args:
+            relative_path: the path to the directory relative to the crawled one, with '/' separators.
+
+        Returns:
+            A boolean.
+        """
+        if not self.subtrees:
+            return True
+        prefix = relative_path + "/"
+        return any(
+            subtree == relative_path or subtree.startswith(prefix) or relative_path.startswith(subtree + "/")
+            for subtree in self.subtrees
+        )
+
+    def includes_files_of(self, relative_path: str) -> bool:
+        """
+        Whether files of a directory should be crawled, the directory being in one of the subtrees.
+
+        Args:
+            relative_path: the path to the directory relative to the crawled one, with '/' separators,
+                '' for the crawled directory itself.
+
+        Returns:
+            A boolean.
+        """
+        return not self.subtrees or any(
+            relative_path == subtree or relative_path.startswith(subtree + "/") for subtree in self.subtrees
+        )
+
+    def __repr__(self) -> str:
+        conditions = [f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name)]
+        return f"ShotFilter({', '.join(conditions)})"
@@ -0,0 +1,228 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Structured instrumentation of a run: per-stage wall and CPU times, per-file extraction latencies
+and throughput, cache hit rates and peak memory, reported as JSON.
+
+Extraction latencies are timed by the metadata backends around each extraction call, see
+`record_latency`, while the time between results as the pipeline receives them is recorded
+separately, see `timed`.
+
+Metrics are recorded into the collector activated with `collect`. Outside of it, recording
+functions do nothing, so instrumented code costs next to nothing when metrics are not wanted.
+"""
+
+import bisect
+import json
+import pathlib
+import platform
+import sys
+import time
+from array import array
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import Optional, Union
+
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Upper bounds, in milliseconds, of the buckets of latency histograms
+LATENCY_BUCKETS_MS: tuple[float, ...] = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Metrics:
+    """
+    Class to handle the metrics recorded during a run.
+    """
+
+    __slots__ = {
+        "stages": "dictionary of stage names to their number of calls, wall and CPU times",
+        "counters": "dictionary of counter names to their integer values",
+        "latencies": "dictionary of latency names to an array of recorded values in seconds",
+        "started": "float, the epoch time at which the collection started",
+    }
+
+    def __init__(self):
+        self.stages: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, int] = {}
+        self.latencies: dict[str, array] = {}
+        self.started: float = time.time()
+
+    def add_stage(self, name: str, wall_time: float, cpu_time: float) -> None:
+        """Add the wall and CPU times, in seconds, of a run of the named stage."""
+        stage = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        stage["calls"] += 1
+        stage["wall_s"] += wall_time
+        stage["cpu_s"] += cpu_time
+
+    def report(self) -> dict:
+        """
+        Summarize the recorded metrics.
+
+        Returns:
+            A JSON-serializable dictionary with the stages times, counters, latency statistics and
+            histograms, throughput of extraction, cache hit rates and peak memory.
+        """
+        extraction_time = self.stages.get("extract", {}).get("wall_s", 0.0)
+        extracted = self.counters.get("extracted_files", 0)
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "counters": dict(self.counters),
+            "latencies": {name: _latency_summary(values) for name, values in self.latencies.items()},
+            "throughput_files_per_second": extracted / extraction_time if extraction_time else None,
+            "cache_hit_rates": {cache: self._hit_rate(cache) for cache in ("metadata", "render")},
+            "peak_rss_bytes": _peak_rss(),
+        }
+
+    def _hit_rate(self, cache: str) -> dict:
+        hits = self.counters.get(f"{cache}_cache_hits", 0)
+        misses = self.counters.get(f"{cache}_cache_misses", 0)
+        return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else None}
+
+    def save(self, path: Union[str, pathlib.Path]) -> pathlib.Path:
+        """
+        Write the report of the recorded metrics to a JSON file.
+
+        Args:
+            path: the location of the file to write.
+
+        Returns:
+            A `pathlib.Path` object of the written file.
+        """
+        path = pathlib.Path(path)
+        path.write_text(json.dumps(self.report(), indent=2))
+        logger.info(f"Saved metrics report to '{path}'")
+        return path
+
+
+_collector: Optional[Metrics] = None
+
+
+@contextmanager
+def collect() -> Iterator[Metrics]:
+    """
+    Activate a new metrics collector for the code run in the context.
+
+    Returns:
+        The `Metrics` object in which metrics are recorded.
+    """
+    global _collector  # noqa: PLW0603
+    previous, _collector = _collector, Metrics()
+    try:
+        yield _collector
+    finally:
+        _collector = previous
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Record the wall time and the CPU time of the process spent in the context, as a run of the
+    named stage. Stages running concurrently, e.g. crawling and extraction, share CPU time.
+
+    Args:
+        name: the name of the stage, e.g. 'crawl' or 'render'.
+    """
+    if _collector is None:
+        yield
+        return
+    collector = _collector
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        collector.add_stage(name, time.perf_counter() - start_wall, time.process_time() - start_cpu)
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Increment the named counter.
+
+    Args:
+        name: the name of the counter, e.g. 'metadata_cache_hits'.
+        value: the increment. Defaults to 1.
+    """
+    if _collector is not None:
+        _collector.counters[name] = _collector.counters.get(name, 0) + value
+
+
+def record_latency(name: str, seconds: float, files: int = 1) -> None:
+    """
+    Record the duration of a call processing some files in the named histogram, as the latency of
+    each of these files. The duration of a call on a chunk of files is split evenly over them.
+
+    Args:
+        name: the name of the latency, e.g. 'extraction'.
+        seconds: the duration of the call.
+        files: the number of files processed by the call. Defaults to 1.
+    """
+    if _collector is not None and files > 0:
+        _collector.latencies.setdefault(name, array("d")).extend([seconds / files] * files)
+
+
+def timed(iterable: Iterable, name: str) -> Iterator:
+    """
+    Lazily go over an iterable, recording the time between consecutive elements, as the consumer
+    receives them, in the named histogram. This is not the time taken to process each element:
+    producers yielding chunks of results at once give a few long intervals and many near zero.
+
+    Args:
+        iterable: the elements to time, e.g. results of a metadata backend.
+        name: the name of the latency, e.g. 'extraction'.
+
+    Returns:
+        An iterator of the same elements.
+    """
+    if _collector is None:
+        yield from iterable
+        return
+    latencies = _collector.latencies.setdefault(name, array("d"))
+    previous = time.perf_counter()
+    for element in iterable:
+        now = time.perf_counter()
+        latencies.append(now - previous)
+        yield element
+        previous = time.perf_counter()
+
+
+def _latency_summary(values: array) -> dict:
+    """Percentiles and histogram, in milliseconds, of recorded latencies in seconds."""
+    if not values:
+        return {"count": 0}
+    milliseconds = sorted(value * 1000 for value in values)
+
+    def _percentile(fraction: float) -> float:
+        return milliseconds[min(len(milliseconds) - 1, int(fraction * len(milliseconds)))]
+
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for value in milliseconds:
+        histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, value)] += 1
+    labels = [f"<={bound}" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+    return {
+        "count": len(milliseconds),
+        "mean_ms": sum(milliseconds) / len(milliseconds),
+        "p50_ms": _percentile(0.5),
+        "p90_ms": _percentile(0.9),
+        "p99_ms": _percentile(0.99),
+        "max_ms": milliseconds[-1],
+        "histogram_ms": dict(zip(labels, histogram)),
+    }
+
+
+def _peak_rss() -> Optional[dict[str, int]]:
+    """Peak resident set size of this process and of its waited-for children, e.g. exiftool."""
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in bytes on macOS, in KiB elsewhere
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
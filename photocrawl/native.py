@@ -0,0 +1,301 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+A pure-Python reader for the EXIF metadata of JPEG and TIFF-based RAW files.
+
+The file is memory-mapped and only the few pages holding the TIFF header, IFD0 and the Exif IFD
+are actually read. Values are formatted the way `exiftool -j` prints them, so that results can
+be used interchangeably with those of the ExifTool driven extraction.
+"""
+
+import mmap
+import re
+import struct
+from collections.abc import Iterable
+from typing import Any, Callable, Optional
+
+# Formats whose EXIF can be found through a TIFF header, either at the start of the file, in a
+# JPEG APP1 segment or, for RAF files, in the embedded JPEG preview
+NATIVE_FORMATS: frozenset[str] = frozenset(
+    {
+        "JPG",
+        "JPEG",
+        "3FR",
+        "ARW",
+        "CR2",
+        "DCR",
+        "DNG",
+        "ERF",
+        "FFF",
+        "MEF",
+        "MOS",
+        "NEF",
+        "NRW",
+        "ORF",
+        "PEF",
+        "RAF",
+        "SR2",
+    }
+)
+
+_TIFF_MAGICS: frozenset[int] = frozenset({42, 0x4F52, 0x5352})  # standard, and Olympus ORF ones
+_EXIF_IFD_POINTER: int = 0x8769
+_RAF_MAGIC: bytes = b"FUJIFILMCCD-RAW"
+_RAF_JPEG_OFFSET: int = 84
+_TYPE_FORMATS: dict[int, tuple[str, int]] = {  # TIFF field type: (struct format, size in bytes)
+    1: ("B", 1),
+    2: ("s", 1),
+    3: ("H", 2),
+    4: ("L", 4),
+    5: ("L", 8),
+    6: ("b", 1),
+    7: ("B", 1),
+    8: ("h", 2),
+    9: ("l", 4),
+    10: ("l", 8),
+    11: ("f", 4),
+    12: ("d", 8),
+}
+_JSON_NUMBER = re.compile(r"^-?(\d|[1-9]\d{1,14})(\.\d{1,16})?(e[-+]?\d{1,3})?$", re.IGNORECASE)
+
+EXPOSURE_PROGRAMS: dict[int, str] = {
+    0: "Not Defined",
+    1: "Manual",
+    2: "Program AE",
+    3: "Aperture-priority AE",
+    4: "Shutter speed priority AE",
+    5: "Creative (Slow speed)",
+    6: "Action (High speed)",
+    7: "Portrait",
+    8: "Landscape",
+    9: "Bulb",
+}
+FLASH_MODES: dict[int, str] = {
+    0x00: "No Flash",
+    0x01: "Fired",
+    0x05: "Fired, Return not detected",
+    0x07: "Fired, Return detected",
+    0x08: "On, Did not fire",
+    0x09: "On, Fired",
+    0x0D: "On, Return not detected",
+    0x0F: "On, Return detected",
+    0x10: "Off, Did not fire",
+    0x14: "Off, Did not fire, Return not detected",
+    0x18: "Auto, Did not fire",
+    0x19: "Auto, Fired",
+    0x1D: "Auto, Fired, Return not detected",
+    0x1F: "Auto, Fired, Return detected",
+    0x20: "No flash function",
+    0x30: "Off, No flash function",
+    0x41: "Fired, Red-eye reduction",
+    0x45: "Fired, Red-eye reduction, Return not detected",
+    0x47: "Fired, Red-eye reduction, Return detected",
+    0x49: "On, Red-eye reduction",
+    0x4D: "On, Red-eye reduction, Return not detected",
+    0x4F: "On, Red-eye reduction, Return detected",
+    0x50: "Off, Red-eye reduction",
+    0x58: "Auto, Did not fire, Red-eye reduction",
+    0x59: "Auto, Fired, Red-eye reduction",
+    0x5D: "Auto, Fired, Red-eye reduction, Return not detected",
+    0x5F: "Auto, Fired, Red-eye reduction, Return detected",
+}
+METERING_MODES: dict[int, str] = {
+    0: "Unknown",
+    1: "Average",
+    2: "Center-weighted average",
+    3: "Spot",
+    4: "Multi-spot",
+    5: "Multi-segment",
+    6: "Partial",
+    255: "Other",
+}
+WHITE_BALANCES: dict[int, str] = {0: "Auto", 1: "Manual"}
+
+
+class NativeReaderError(ValueError):
+    """Raised when a file's EXIF metadata cannot be read natively."""
+
+
+def _lookup(table: dict[int, str]) -> Callable[[Any], str]:
+    return lambda value: table.get(value, f"Unknown ({value})")
+
+
+def _print_fraction(value: float) -> str:
+    """Same as exiftool's `PrintFraction`, e.g. 0.3333 -> '+1/3'."""
+    value *= 1.00001
+    if not value:
+        return "0"
+    for denominator in (1, 2, 3):
+        scaled = value * denominator
+        if int(scaled) / scaled > 0.999:
+            return f"{int(scaled):+d}" if denominator == 1 else f"{int(scaled):+d}/{denominator}"
+    return f"{value:+.3g}"
+
+
+def _print_exposure_time(apex_value: float) -> str:
+    """Same as exiftool's conversions of `ShutterSpeedValue`, e.g. 7.97 -> '1/250'."""
+    seconds = 2 ** (-apex_value) if abs(apex_value) < 100 else 0
+    if 0 < seconds < 0.25001:
+        return f"1/{int(0.5 + 1 / seconds)}"
+    text = f"{seconds:.1f}"
+    return text[:-2] if text.endswith(".0") else text
+
+
+def _print_fnumber(value: float) -> str:
+    """Same as exiftool's `PrintFNumber`, e.g. 5.6 -> '5.6'."""
+    return f"{value:.2f}" if value < 1 else f"{value:.1f}"
+
+
+# EXIF tag name: (IFD holding the tag, tag ID, print conversion)
+NATIVE_TAGS: dict[str, tuple[str, int, Callable[[Any], str]]] = {
+    "Make": ("IFD0", 0x010F, str),
+    "Model": ("IFD0", 0x0110, str),
+    "DateTimeOriginal": ("ExifIFD", 0x9003, str),
+    "ExposureCompensation": ("ExifIFD", 0x9204, _print_fraction),
+    "ExposureProgram": ("ExifIFD", 0x8822, _lookup(EXPOSURE_PROGRAMS)),
+    "FNumber": ("ExifIFD", 0x829D, _print_fnumber),
+    "Flash": ("ExifIFD", 0x9209, _lookup(FLASH_MODES)),
+    "FocalLength": ("ExifIFD", 0x920A, lambda value: f"{value:.1f} mm"),
+    "FocalLengthIn35mmFormat": ("ExifIFD", 0xA405, lambda value: f"{value} mm"),
+    "ISO": ("ExifIFD", 0x8827, str),
+    "LensMake": ("ExifIFD", 0xA433, str),
+    "LensModel": ("ExifIFD", 0xA434, str),
+    "MeteringMode": ("ExifIFD", 0x9207, _lookup(METERING_MODES)),
+    "ShutterSpeedValue": ("ExifIFD", 0x9201, _print_exposure_time),
+    "WhiteBalance": ("ExifIFD", 0xA403, _lookup(WHITE_BALANCES)),
+}
+
+
+def supports(features: Iterable[str]) -> bool:
+    """
+    Whether all the provided EXIF tags can be read natively.
+
+    Args:
+        features: the names of the EXIF tags to read.
+
+    Returns:
+        A boolean.
+    """
+    return all(feature in NATIVE_TAGS for feature in features)
+
+
+def _as_json_value(text: str) -> Any:
+    """Convert a printed value to a number when exiftool's JSON output would do so."""
+    if not _JSON_NUMBER.match(text):
+        return text
+    return int(text) if text.lstrip("-").isdigit() else float(text)
+
+
+def _find_tiff_header(data: mmap.mmap) -> int:
+    """Find the offset of the TIFF header holding the EXIF metadata."""
+    if data[:2] in (b"II", b"MM"):
+        return 0
+    if data[: len(_RAF_MAGIC)] == _RAF_MAGIC:
+        (jpeg_offset,) = struct.unpack_from(">L", data, _RAF_JPEG_OFFSET)
+        return _find_jpeg_exif(data, jpeg_offset)
+    if data[:2] == b"\xff\xd8":
+        return _find_jpeg_exif(data, 0)
+    msg = "Not a JPEG, TIFF-based or RAF file"
+    raise NativeReaderError(msg)
+
+
+def _find_jpeg_exif(data: mmap.mmap, start: int) -> int:
+    """Walk the segments of the JPEG starting at `start` until its EXIF APP1 segment."""
+    if data[start : start + 2] != b"\xff\xd8":
+        msg = "Invalid JPEG start of image"
+        raise NativeReaderError(msg)
+    position = start + 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            msg = "Invalid JPEG segment marker"
+            raise NativeReaderError(msg)
+        marker = data[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if marker in (0xD9, 0xDA):  # end of image or start of scan, no EXIF beyond this point
+            break
+        (length,) = struct.unpack_from(">H", data, position + 2)
+        if marker == 0xE1 and data[position + 4 : position + 10] == b"Exif\x00\x00":
+            return position + 10
+        position += 2 + length
+    msg = "No EXIF segment found in JPEG"
+    raise NativeReaderError(msg)
+
+
+def _read_ifd(data: mmap.mmap, base: int, offset: int, byte_order: str, wanted: set[int]) -> dict[int, Any]:
+    """Read the values of the wanted tags in the IFD at `offset` from the TIFF header at `base`."""
+    (entries,) = struct.unpack_from(f"{byte_order}H", data, base + offset)
+    values: dict[int, Any] = {}
+    for index in range(entries):
+        entry = base + offset + 2 + 12 * index
+        tag, field_type, count = struct.unpack_from(f"{byte_order}HHL", data, entry)
+        if tag not in wanted or field_type not in _TYPE_FORMATS or count == 0:
+            continue
+        fmt, size = _TYPE_FORMATS[field_type]
+        value_offset = entry + 8
+        if size * count > 4:  # value does not fit in the entry
+            (pointer,) = struct.unpack_from(f"{byte_order}L", data, value_offset)
+            value_offset = base + pointer
+        if value_offset + size * count > len(data):
+            msg = f"Value of tag {tag:#06x} lies beyond the end of file"
+            raise NativeReaderError(msg)
+
+        if field_type == 2:  # ASCII
+            raw = data[value_offset : value_offset + count].split(b"\x00", 1)[0]
+            values[tag] = raw.decode("utf-8", errors="replace").rstrip()
+        elif field_type in (5, 10):  # RATIONAL and SRATIONAL
+            numerator, denominator = struct.unpack_from(f"{byte_order}{fmt}{fmt}", data, value_offset)
+            if denominator:
+                values[tag] = numerator / denominator
+        else:
+            (values[tag],) = struct.unpack_from(f"{byte_order}{fmt}", data, value_offset)
+    return values
+
+
+def read_exif(photo_file: str, features: Iterable[str]) -> dict[str, Any]:
+    """
+    Returns a dictionary with the provided features from the image EXIF, without calling exiftool.
+
+    Args:
+        photo_file: the path to the file location.
+        features: the names of the EXIF tags to read, which should all be in `NATIVE_TAGS`.
+
+    Returns:
+        A dictionary with the exif fields and value for the specific file, formatted as would be
+        those of `PhotoCrawler.get_exif`.
+
+    Raises:
+        NativeReaderError: if the file's metadata cannot be read natively.
+    """
+    wanted = {name: NATIVE_TAGS[name] for name in features}
+    try:
+        with open(photo_file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            base = _find_tiff_header(data)
+            byte_order = {b"II": "<", b"MM": ">"}.get(data[base : base + 2])
+            if byte_order is None:
+                msg = "Invalid TIFF byte order"
+                raise NativeReaderError(msg)
+            magic, ifd0_offset = struct.unpack_from(f"{byte_order}HL", data, base + 2)
+            if magic not in _TIFF_MAGICS:
+                msg = f"Unsupported TIFF magic number {magic:#06x}"
+                raise NativeReaderError(msg)
+
+            ifd0_tags = {tag for ifd, tag, _ in wanted.values() if ifd == "IFD0"}
+            raw_values = _read_ifd(data, base, ifd0_offset, byte_order, {*ifd0_tags, _EXIF_IFD_POINTER})
+            exif_ifd_offset: Optional[int] = raw_values.pop(_EXIF_IFD_POINTER, None)
+            if exif_ifd_offset is not None:
+                exif_tags = {tag for ifd, tag, _ in wanted.values() if ifd == "ExifIFD"}
+                raw_values.update(_read_ifd(data, base, exif_ifd_offset, byte_order, exif_tags))
+    except (OSError, IndexError, ValueError, struct.error) as error:  # mmap raises ValueError on empty files
+        if isinstance(error, NativeReaderError):
+            raise
+        msg = f"Could not read file: {error}"
+        raise NativeReaderError(msg) from error
+
+    return {
+        name: _as_json_value(print_conversion(raw_values[tag]))
+        for name, (_, tag, print_conversion) in wanted.items()
+        if tag in raw_values
+    }
@@ -0,0 +1,108 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Grouping of the files of a same shot, such as the RAW and JPEG files written side by side by
+cameras shooting RAW+JPEG, so that each shot is extracted once and counted once.
+
+Files are of a same shot if they are in the same directory and share a name, case-insensitively,
+with different extensions. Metadata is read from one file of each group, preferably a JPEG file
+whose header is small and quick to read, and the formats of the group are recorded.
+"""
+
+import os
+from collections.abc import Iterable, Iterator
+
+JPEG_EXTENSIONS: frozenset[str] = frozenset({"JPG", "JPEG"})
+FORMATS_COLUMN: str = "Formats"
+
+
+def file_format(photo_file: str) -> str:
+    """
+    The format of a file, from its extension.
+
+    Args:
+        photo_file: the path to the file.
+
+    Returns:
+        The uppercase extension of the file, without the dot, e.g. 'RAF'.
+    """
+    return os.path.splitext(photo_file)[1][1:].upper()
+
+
+def shot_key(photo_file: str) -> tuple[str, str]:
+    """
+    The key shared by the files of a same shot.
+
+    Args:
+        photo_file: the path to the file.
+
+    Returns:
+        A tuple of the file's directory and lowercase name without extension.
+    """
+    directory, name = os.path.split(photo_file)
+    return directory, os.path.splitext(name)[0].lower()
+
+
+def representative(photo_files: Iterable[str]) -> str:
+    """
+    The file of a shot to read metadata from, the first JPEG file if any, otherwise the first file
+    in alphabetical order.
+
+    Args:
+        photo_files: the paths to the files of a same shot.
+
+    Returns:
+        The path to one of the files.
+    """
+    return min(photo_files, key=_preference)
+
+
+def formats(photo_files: Iterable[str]) -> str:
+    """
+    The formats of the files of a shot.
+
+    Args:
+        photo_files: the paths to the files of a same shot.
+
+    Returns:
+        The formats of the files in alphabetical order joined by '+', e.g. 'JPG+RAF'.
+    """
+    return "+".join(sorted({file_format(photo_file) for photo_file in photo_files}))
+
+
+def pair_files(photo_files: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """
+    Lazily group files of a same shot. Files of a directory are expected one after the other, as
+    yielded by `PhotoCrawler.crawl_files`, so that only the files of one directory are held at a
+    time.
+
+    Args:
+        photo_files: the paths to the crawled files.
+
+    Returns:
+        An iterator of tuples with the path to the representative file of each shot, and the
+        formats of its files, see `representative` and `formats`.
+    """
+    current_directory: str = ""
+    shots: dict[str, list[str]] = {}
+    for photo_file in photo_files:
+        directory, name = shot_key(photo_file)
+        if directory != current_directory:
+            yield from _grouped(shots)
+            shots = {}
+            current_directory = directory
+        shots.setdefault(name, []).append(photo_file)
+    yield from _grouped(shots)
+
+
+def _preference(photo_file: str) -> tuple[bool, str]:
+    return file_format(photo_file) not in JPEG_EXTENSIONS, photo_file
+
+
+def _grouped(shots: dict[str, list[str]]) -> Iterator[tuple[str, str]]:
+    for files in shots.values():
+        if len(files) == 1:
+            yield files[0], file_format(files[0])
+        else:
+            yield representative(files), formats(files)
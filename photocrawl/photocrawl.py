@@ -6,16 +6,30 @@ A simply script to run analysis and get insight on my use of equipment and setti
 practice of photography.
 """
 
+import fnmatch
+import os
 import pathlib
-import shlex
-from multiprocessing import Pool, cpu_count
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Optional
 
 import pandas as pd
-import pendulum
-import pyexifinfo as pyexif
 from loguru import logger
 
-from photocrawl.utils import figure_focal_range, timeit
+from photocrawl import metrics
+from photocrawl.backends import MetadataBackend, NativeBackend
+from photocrawl.cache import MetadataCache
+from photocrawl.checkpoint import Checkpoint
+from photocrawl.duplicates import DuplicateFinder
+from photocrawl.exiftool import get_exif
+from photocrawl.filters import ShotFilter
+from photocrawl.pairing import FORMATS_COLUMN, file_format, pair_files
+from photocrawl.sampling import STRATUM_COLUMN, StratifiedSampler
+from photocrawl.schema import apply_schema, bytes_per_row, concat_tables
+from photocrawl.sharding import SHARD_STRATEGIES, shard_key, shard_of
+from photocrawl.utils import FOCAL_BOUNDARIES, FOCAL_RANGES, chunked, prefetch, timeit
+
+CRAWL_QUEUE_SIZE: int = 10_000
+TABLE_CHUNK_SIZE: int = 10_000
 
 
 class PhotoCrawler:
@@ -25,6 +39,18 @@ class PhotoCrawler:
 
     __slots__ = {
         "top_level_location": "PosixPath object to the directory to crawl for images",
+        "backend": "MetadataBackend used to extract exif metadata of crawled files",
+        "cache": "MetadataCache of previously extracted metadata, None to always extract",
+        "checkpoint": "Checkpoint extracted metadata is appended to, None not to checkpoint the crawl",
+        "follow_symlinks": "boolean, whether to crawl into symlinked directories",
+        "exclude_dirs": "list of glob patterns of directory names not to crawl into",
+        "max_depth": "integer, maximum depth of sub-directories to crawl into, None for no limit",
+        "shard": "tuple of the index, from 1, and number of shards, to only crawl the files of a shard",
+        "shard_by": "string, how files are assigned to shards, one of SHARD_STRATEGIES",
+        "pair_formats": "boolean, whether to count files of a same shot, e.g. RAW+JPEG pairs, once",
+        "duplicate_finder": "DuplicateFinder excluding files with the same content, None to keep them",
+        "sampler": "StratifiedSampler drawing the files to process, None to process all files",
+        "shot_filter": "ShotFilter of the shots to process by location and metadata, None to process all",
         "categorical_columns": "list of EXIF properties to treat as categoories",
         "columns_renaming_dict": "dictionary of EXIF properties to rename",
         "interesting_features": "list of EXIF properties to look for and treat",
@@ -33,8 +59,41 @@ class PhotoCrawler:
         "raw_formats": "dictionary of RAW file formats and their descriptions",
     }
 
-    def __init__(self, directory_to_crawl: pathlib.Path):
+    def __init__(
+        self,
+        directory_to_crawl: pathlib.Path,
+        backend: Optional[MetadataBackend] = None,
+        cache: Optional[MetadataCache] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        *,
+        follow_symlinks: bool = False,
+        exclude_dirs: Iterable[str] = (),
+        max_depth: Optional[int] = None,
+        shard: Optional[tuple[int, int]] = None,
+        shard_by: str = "path",
+        pair_formats: bool = True,
+        duplicate_finder: Optional[DuplicateFinder] = None,
+        sampler: Optional[StratifiedSampler] = None,
+        shot_filter: Optional[ShotFilter] = None,
+    ):
+        if shard is not None and not 1 <= shard[0] <= shard[1]:
+            msg = f"Invalid shard {shard}, should be (index, count) with 1 <= index <= count"
+            raise ValueError(msg)
+        if shard_by not in SHARD_STRATEGIES:
+            msg = f"Invalid sharding strategy '{shard_by}', should be one of {SHARD_STRATEGIES}"
+            raise ValueError(msg)
         self.top_level_location: pathlib.Path = directory_to_crawl
+        self.backend: MetadataBackend = backend if backend is not None else NativeBackend()
+        self.cache: Optional[MetadataCache] = cache
+        self.checkpoint: Optional[Checkpoint] = checkpoint
+        self.follow_symlinks: bool = follow_symlinks
+        self.exclude_dirs: list[str] = list(exclude_dirs)
+        self.max_depth: Optional[int] = max_depth
+        self.shard: Optional[tuple[int, int]] = shard
+        self.shard_by: str = shard_by
+        self.pair_formats: bool = pair_formats
+        self.duplicate_finder: Optional[DuplicateFinder] = duplicate_finder
+        self.sampler: Optional[StratifiedSampler] = sampler
         self.categorical_columns: list[str] = [
             "Exposure_Compensation",
             "Exposure_Program",
@@ -132,6 +191,10 @@ class PhotoCrawler:
             "SRW": "Samsung RAW Image",
             "X3F": "SIGMA X3F Camera RAW File",
         }
+        # Lenses can be filtered by their EXIF name or by the name they are shown as in insights
+        self.shot_filter: Optional[ShotFilter] = (
+            shot_filter.with_lens_aliases(self.lens_tags_mapping) if shot_filter is not None else None
+        )
         logger.debug("PhotoCrawler instantiation successful")
 
     def get_exif(self, photo_file: str) -> dict[str, str]:
@@ -144,54 +207,283 @@ class PhotoCrawler:
         Returns:
             A dictionary with the exif fields and value for the specific file.
         """
-        logger.trace(f"Extracting exif for file {photo_file}")
-        return {
-            key[5:]: value
-            for key, value in pyexif.get_json(photo_file)[0].items()
-            if key[5:] in self.interesting_features
-        }
+        return get_exif(photo_file, self.interesting_features)
 
-    def crawl_files(self) -> list[str]:
+    def crawl_files(self) -> Iterator[str]:
         """
         Recursively go over relevant files in the `top_level_localtion` directory and
-        sub-directories, and return a list of PosixPath to each relevant file.
+        sub-directories, and lazily yield the path to each relevant file as the directory tree is
+        walked. The tree is walked once, and file extensions are matched case-insensitively against
+        `raw_formats`. Symlinks to files are always included, while symlinked directories are only
+        crawled into if `follow_symlinks` is set. If the crawler has a `shard`, only the files of
+        this shard are yielded, and other shards' top-level sub-directories are not walked when
+        sharding by directory, see `photocrawl.sharding`. If the crawler has a filter with subtrees,
+        only the directories leading to them and their content are walked, see `photocrawl.filters`.
 
         Returns:
-            A list.
+            An iterator of paths, in the order they are found.
         """
         logger.debug(f"Crawling '{self.top_level_location.absolute()}' for relevant files")
-        crawled_images: list[str] = []
-        with timeit(
+        extensions: frozenset[str] = frozenset(f".{extension.lower()}" for extension in self.raw_formats)
+        crawled_images: int = 0
+        crawled_directories: int = 0
+        prefix_length: int = len(os.path.join(str(self.top_level_location), ""))
+        visited: set[tuple[int, int]] = set()  # (device, inode) of crawled directories, against loops
+        to_crawl: list[tuple[str, int]] = [(str(self.top_level_location), 0)]
+        if self.follow_symlinks:
+            top_level_stat = self.top_level_location.stat()
+            visited.add((top_level_stat.st_dev, top_level_stat.st_ino))
+        if self.shard is not None:
+            logger.debug(f"Crawling shard {self.shard[0]}/{self.shard[1]} by {self.shard_by}")
+
+        with metrics.stage("crawl"), timeit(
             lambda spanned: logger.info(
-                f"Crawled and found {len(crawled_images)} relevant files in {spanned:.4f} seconds"
+                f"Crawled {crawled_directories} directories and found {crawled_images} relevant "
+                f"files in {spanned:.4f} seconds"
             )
         ):
-            for extension in self.raw_formats:
-                crawled_images.extend(self.top_level_location.rglob(f"*.{extension}"))
-                crawled_images.extend(self.top_level_location.rglob(f"*.{extension.lower()}"))
-            return sorted(str(result) for result in crawled_images)
+            while to_crawl:
+                directory, depth = to_crawl.pop()
+                crawled_directories += 1
+                files_wanted = self.shot_filter is None or self.shot_filter.includes_files_of(
+                    self._relative_path(directory)
+                )
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                                if self._should_crawl_into(entry, depth + 1, visited):
+                                    to_crawl.append((entry.path, depth + 1))
+                            elif (
+                                files_wanted
+                                and os.path.splitext(entry.name)[1].lower() in extensions
+                                and entry.is_file()
+                            ):
+                                if (
+                                    self.shard is not None
+                                    and (depth == 0 or self.shard_by == "path")
+                                    and not self._in_shard(entry.path[prefix_length:])
+                                ):
+                                    continue
+                                crawled_images += 1
+                                yield entry.path
+                except OSError as error:
+                    logger.warning(f"Could not crawl directory '{directory}': {error}")
+
+    def _should_crawl_into(self, entry: os.DirEntry, depth: int, visited: set[tuple[int, int]]) -> bool:
+        """
+        Whether the crawl should go into the provided directory, according to the `max_depth` and
+        `exclude_dirs` settings. When following symlinks, directories already crawled are skipped.
+        When sharding by directory, top-level sub-directories of other shards are skipped. With a
+        filter on subtrees, directories outside of them and not leading to them are skipped.
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        sharded_by_directory = self.shard is not None and self.shard_by == "directory"
+        if depth == 1 and sharded_by_directory and not self._in_shard(entry.name):
+            return False
+        if self.shot_filter is not None and not self.shot_filter.includes_directory(
+            self._relative_path(entry.path)
+        ):
+            return False
+        if any(fnmatch.fnmatch(entry.name, pattern) for pattern in self.exclude_dirs):
+            logger.trace(f"Excluding directory '{entry.path}'")
+            return False
+        if self.follow_symlinks:
+            stat = entry.stat()
+            if (stat.st_dev, stat.st_ino) in visited:
+                return False
+            visited.add((stat.st_dev, stat.st_ino))
+        return True
+
+    def _relative_path(self, path: str) -> str:
+        """The path relative to the crawled directory with '/' separators, empty for the directory itself."""
+        return path[len(os.path.join(str(self.top_level_location), "")) :].replace(os.sep, "/")
+
+    def _stratum(self, photo_file: str, prefix_length: int) -> str:
+        """The top-level sub-directory of a crawled file, empty if directly in the crawled directory."""
+        top_level_entry, separator, _ = photo_file[prefix_length:].partition(os.sep)
+        return top_level_entry if separator else ""
+
+    def _in_shard(self, relative_path: str) -> bool:
+        """Whether the file or top-level directory at the provided relative path is in the crawler's shard."""
+        index, count = self.shard
+        return shard_of(shard_key(relative_path.replace(os.sep, "/"), self.shard_by), count) == index
+
+    def extract_metadata(self, photo_files: Sequence[str]) -> Iterator[tuple[str, dict[str, str]]]:
+        """
+        Lazily extract the interesting features from the EXIF of the provided files, with the
+        crawler's metadata backend.
+
+        Args:
+            photo_files: the paths to the files to get metadata of.
+
+        Returns:
+            An iterator of tuples with each file's path and a dictionary with its exif fields and
+            values, in the order files are processed.
+        """
+        return self.backend.extract(photo_files, self.interesting_features)
 
     def process_files(self) -> pd.DataFrame:
         """
         Go over the crawled files in the `top_level_localtion` directory and sub-directories,
-        and organize their exif data in a `pandas.DataFrame`.
+        and organize their exif data in a `pandas.DataFrame`. The directory walk runs in the
+        background and feeds a bounded queue, from which files are extracted while the walk is
+        still going on. If the crawler has a cache, only new or modified files are given to the
+        metadata backend, and entries of deleted files are removed from the cache. If the crawler
+        has a checkpoint, results are appended to it as they arrive, and files it already holds
+        results of are not processed again. If `pair_formats` is set, files of a same shot, such as
+        RAW+JPEG pairs, are extracted and counted once, see `photocrawl.pairing`. If the crawler has
+        a duplicate finder, files with the same content as a previous one are left out, see
+        `photocrawl.duplicates`. If the crawler has a sampler, the whole library is crawled first and
+        only the files of a stratified random sample are processed, see `photocrawl.sampling`. If the
+        crawler has a filter, shots which do not match it are left out as soon as their metadata is
+        known, checked against the cache's index without reading entries of cached files, see
+        `photocrawl.filters`. Chunks of rows are typed according to `photocrawl.schema.EXIF_SCHEMA`
+        as they arrive.
 
         Returns:
-            A `pandas.DataFrame` with exif information for each file. Each file's information is
-            a row, and each column corresponds to an exif data field.
+            A `pandas.DataFrame` with exif information for each file, or each shot. Each file's
+            information is a row, and each column corresponds to an exif data field, with an
+            additional 'Formats' column of the formats of the files of the shot, e.g. 'JPG+RAF'.
+            When sampling, a 'Stratum' column holds the top-level sub-directory of each file.
         """
         logger.debug("Gathering exif metadata from crawled files")
-        crawled_images: list[str] = self.crawl_files()
+        crawled_images: Iterator[str] = prefetch(self.crawl_files(), maxsize=CRAWL_QUEUE_SIZE)
+        rows: list[dict[str, str]] = []
+        rows_files: list[str] = []
+        tables: list[pd.DataFrame] = []
+        gathered: int = 0
+        resumed: int = 0
+        paired: int = 0
+        filtered: int = 0
+        shots_formats: dict[str, str] = {}  # of shots with several files, by representative file
+        finder: Optional[DuplicateFinder] = self.duplicate_finder
+        known_duplicates: int = len(finder.duplicates) if finder is not None else 0
+        metadata_filter: Optional[ShotFilter] = (
+            self.shot_filter if self.shot_filter is not None and self.shot_filter.filters_metadata else None
+        )
+        cache_filtered: int = self.cache.filtered if self.cache is not None else 0
+
+        prefix_length: int = len(os.path.join(str(self.top_level_location), ""))
 
-        with (
-            timeit(
-                lambda spanned: logger.info(
-                    f"Gathered metadata of {len(crawled_images)} files in {spanned:.4f} seconds"
+        def _table() -> pd.DataFrame:
+            table = pd.DataFrame(rows, columns=self.interesting_features)
+            table[FORMATS_COLUMN] = pd.Categorical(
+                [shots_formats.pop(photo_file, None) or file_format(photo_file) for photo_file in rows_files]
+            )
+            if self.sampler is not None:
+                table[STRATUM_COLUMN] = pd.Categorical(
+                    [self._stratum(photo_file, prefix_length) for photo_file in rows_files]
                 )
-            ),
-            Pool(cpu_count()) as pool,
+            return apply_schema(table)
+
+        def _add_row(photo_file: str, metadata: dict[str, str]) -> None:
+            nonlocal gathered, filtered
+            gathered += 1
+            if metadata_filter is not None and not metadata_filter.matches(metadata):
+                filtered += 1
+                shots_formats.pop(photo_file, None)
+                return
+            if finder is not None and finder.is_duplicate(photo_file, metadata):
+                shots_formats.pop(photo_file, None)
+                return
+            rows.append(metadata)
+            rows_files.append(photo_file)
+            if len(rows) >= TABLE_CHUNK_SIZE:  # typed as rows arrive, to keep memory low
+                tables.append(_table())
+                rows.clear()
+                rows_files.clear()
+
+        def _add_result(photo_file: str, metadata: dict[str, str]) -> None:
+            if self.checkpoint is not None:
+                self.checkpoint.append(photo_file, metadata)
+            _add_row(photo_file, metadata)
+
+        if self.pair_formats:
+
+            def _paired(photo_files: Iterator[str]) -> Iterator[str]:
+                nonlocal paired
+                for photo_file, shot_formats in pair_files(photo_files):
+                    if "+" in shot_formats:
+                        shots_formats[photo_file] = shot_formats
+                        paired += 1
+                    yield photo_file
+
+            crawled_images = _paired(crawled_images)
+
+        if self.sampler is not None:
+            stratified = ((self._stratum(path, prefix_length), path) for path in crawled_images)
+            crawled_images = iter(self.sampler.draw(stratified))
+
+        if self.checkpoint is not None:
+            checkpointed: dict[str, dict] = self.checkpoint.load()
+
+            def _not_checkpointed(photo_files: Iterator[str]) -> Iterator[str]:
+                nonlocal resumed
+                for photo_file in photo_files:
+                    metadata = checkpointed.get(photo_file)
+                    if metadata is None:
+                        yield photo_file
+                    else:
+                        resumed += 1
+                        _add_row(photo_file, metadata)
+
+            crawled_images = _not_checkpointed(crawled_images)
+
+        with metrics.stage("extract"), timeit(
+            lambda spanned: logger.info(f"Gathered metadata of {gathered} files in {spanned:.4f} seconds")
         ):
-            return pd.DataFrame(list(pool.imap_unordered(self.get_exif, crawled_images)))
+            try:
+                if self.cache is None:
+                    extracted = metrics.timed(
+                        self.extract_metadata(crawled_images), "extraction_interarrival"
+                    )
+                    for photo_file, metadata in extracted:
+                        _add_result(photo_file, metadata)
+                    metrics.count("extracted_files", gathered - resumed)
+                else:
+
+                    def _not_in_cache() -> Iterator[str]:
+                        for photo_file, metadata in self.cache.lookup(crawled_images, metadata_filter):
+                            if metadata is None:
+                                yield photo_file
+                            else:
+                                _add_result(photo_file, metadata)
+
+                    extracted = metrics.timed(
+                        self.extract_metadata(_not_in_cache()), "extraction_interarrival"
+                    )
+                    for results in chunked(extracted, 1000):
+                        self.cache.store(results)
+                        for photo_file, metadata in results:
+                            _add_result(photo_file, metadata)
+                    logger.info(
+                        f"Found {self.cache.hits} files in cache, extracted {self.cache.misses} files"
+                    )
+                    metrics.count("extracted_files", self.cache.misses)
+                    metrics.count("metadata_cache_hits", self.cache.hits)
+                    metrics.count("metadata_cache_misses", self.cache.misses)
+                    self.cache.prune(self.top_level_location)
+            finally:  # results of an interrupted crawl are kept, to resume from
+                if self.checkpoint is not None:
+                    self.checkpoint.flush()
+
+            if metadata_filter is not None:
+                filtered += self.cache.filtered - cache_filtered if self.cache is not None else 0
+                logger.info(f"Left out {filtered} shots not matching {metadata_filter}")
+                metrics.count("filtered_files", filtered)
+            if paired:
+                logger.info(f"Found {paired} shots of several files, e.g. RAW+JPEG pairs, counted once")
+            if finder is not None:
+                duplicates = len(finder.duplicates) - known_duplicates
+                logger.info(f"Excluded {duplicates} duplicate files, with {finder}")
+                metrics.count("duplicate_files", duplicates)
+            if rows or not tables:
+                tables.append(_table())
+            exif_data_df: pd.DataFrame = concat_tables(tables)
+        logger.debug(f"Exif data takes {bytes_per_row(exif_data_df):.0f} bytes per row")
+        return exif_data_df
 
     @logger.catch()
     def refactor_exif_data(self, crawled_exif: pd.DataFrame) -> pd.DataFrame:
@@ -203,21 +495,39 @@ class PhotoCrawler:
             A new `pandas.DataFrame` with refactored data.
         """
         logger.debug("Refactoring gathered exif metadata for plotting")
-        with timeit(lambda spanned: logger.info(f"Refactorred metadata in {spanned:.4f} seconds")):
-            working_df: pd.DataFrame = crawled_exif.copy(deep=True)
+        with metrics.stage("refactor"), timeit(
+            lambda spanned: logger.info(f"Refactorred metadata in {spanned:.4f} seconds")
+        ):
+            # Only columns which are not typed yet are converted, others share the input's data
+            working_df: pd.DataFrame = apply_schema(crawled_exif)
+
+            # Both map to 'Focal_Length', keep the FF equivalent one and fall back to the other
+            if {"FocalLength", "FocalLengthIn35mmFormat"}.issubset(working_df.columns):
+                logger.debug("Merging focal length fields")
+                working_df["FocalLengthIn35mmFormat"] = working_df["FocalLengthIn35mmFormat"].fillna(
+                    working_df["FocalLength"]
+                )
+                working_df.drop(columns="FocalLength", inplace=True)
 
             logger.debug("Renaming exif fields")
             working_df.rename(self.columns_renaming_dict, axis="columns", inplace=True)
             working_df.dropna(inplace=True)
 
             logger.debug("Refactoring shots dates")
-            working_df["Year"] = working_df["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).year)
-            working_df["Month"] = working_df["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).month)
-            working_df["Day"] = working_df["DateTimeOriginal"].apply(lambda x: pendulum.parse(x).day)
+            capture_times = working_df["DateTimeOriginal"]
+            working_df["Year"] = capture_times.dt.year
+            working_df["Month"] = capture_times.dt.month
+            working_df["Day"] = capture_times.dt.day
 
             logger.debug("Extrapolating focal ranges")
-            working_df["Focal_Length"] = working_df["Focal_Length"].apply(lambda x: float(shlex.split(x)[0]))
-            working_df["Focal_Range"] = working_df["Focal_Length"].apply(figure_focal_range)
+            focal_lengths = working_df["Focal_Length"]
+            if not (focal_lengths > 0).all():
+                logger.warning(f"Dropping {(~(focal_lengths > 0)).sum()} shots with an invalid focal length")
+                focal_lengths = focal_lengths.where(focal_lengths > 0)
+                working_df["Focal_Length"] = focal_lengths
+            working_df["Focal_Range"] = pd.cut(
+                focal_lengths, bins=FOCAL_BOUNDARIES, labels=FOCAL_RANGES, right=False
+            )
 
             logger.debug("Making data categorical")
             for column in self.categorical_columns:
@@ -5,25 +5,53 @@ Created on 2019.08.13
 Plotting functions for main script.
 """
 
+import math
+import os
 import pathlib
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Optional, Union
 
+import matplotlib
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 from loguru import logger
 from matplotlib.axes import Axes
 
-sns.set_palette("pastel")
-sns.set_style("whitegrid")
+from photocrawl import __version__, metrics
+from photocrawl.aggregates import COUNT_COLUMN, MARGIN_COLUMN, InsightAggregates
+from photocrawl.render_cache import RenderCache
+from photocrawl.utils import timeit
 
 
-def plot_shots_per_camera(subplot: Axes, data: pd.DataFrame) -> None:
+def _bars(data: pd.DataFrame) -> dict:
+    """
+    Keyword arguments of `seaborn.barplot` drawing the counts of `data`. Estimated counts are given
+    as their lower bound, value and upper bound, so that their median is drawn as the bar and the
+    95% confidence interval as an error bar.
+    """
+    if MARGIN_COLUMN not in data.columns:
+        return {"data": data, "errorbar": None}
+    counts = data.drop(columns=MARGIN_COLUMN)
+    lower = counts.assign(**{COUNT_COLUMN: (data[COUNT_COLUMN] - data[MARGIN_COLUMN]).clip(lower=0)})
+    upper = counts.assign(**{COUNT_COLUMN: data[COUNT_COLUMN] + data[MARGIN_COLUMN]})
+    return {
+        "data": pd.concat([lower, counts, upper], ignore_index=True),
+        "estimator": "median",
+        "errorbar": ("pi", 100),
+        "capsize": 0.2,
+    }
+
+
+def plot_shots_per_camera(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
         Barplot of the number of shots per camera, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot matplotlib.axes.Axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
@@ -33,7 +61,15 @@ def plot_shots_per_camera(subplot: Axes, data: pd.DataFrame) -> None:
         Here is how to bypass it :)
     """
     logger.debug("Plotting shots per camera")
-    sns.countplot(y="Camera", hue="Brand", data=data, ax=subplot, order=data.Camera.value_counts().index)
+    sns.barplot(
+        x=COUNT_COLUMN,
+        y="Camera",
+        hue="Brand",
+        **_bars(aggregates.crosstab("Camera", "Brand")),
+        ax=subplot,
+        order=aggregates.order("Camera"),
+        orient="h",
+    )
     subplot.set_title("Number of Shots per Camera Model", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
     subplot.set_xlabel("Number of Shots", fontsize=20)
@@ -41,19 +77,25 @@ def plot_shots_per_camera(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.legend(loc="lower right", fontsize=18, title_fontsize=22)
 
 
-def plot_shots_per_fnumber(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_fnumber(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per F number, on the provided subplot.
 
     Args:
         subplot: the subplot matplotlib.axes.Axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per aperture number")
-    sns.countplot(x="F_Number", data=data, ax=subplot)
+    sns.barplot(
+        x="F_Number",
+        y=COUNT_COLUMN,
+        **_bars(aggregates.counts("F_Number")),
+        ax=subplot,
+        order=aggregates.order("F_Number", by_count=False),
+    )
     subplot.set_title("Distribution of Apertures", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
     subplot.tick_params(axis="x", rotation=70)
@@ -61,24 +103,25 @@ def plot_shots_per_fnumber(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_focal_length(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_focal_length(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per focal length (FF equivalent), on the provided subplot.
 
     Args:
         subplot: the subplot matplotlib.axes.Axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per focal length")
-    sns.countplot(
+    sns.barplot(
         x="Focal_Range",
+        y=COUNT_COLUMN,
         hue="Lens",
-        data=data,
+        **_bars(aggregates.crosstab("Focal_Range", "Lens")),
         ax=subplot,
-        order=data.Focal_Range.value_counts().index,
+        order=aggregates.order("Focal_Range"),
     )
     subplot.set_title("Number of shots per Focal Length (FF equivalent)", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -87,19 +130,27 @@ def plot_shots_per_focal_length(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.legend(loc="upper center", fontsize=15, title_fontsize=21)
 
 
-def plot_shots_per_lens(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_lens(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per lens used, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per lens")
-    sns.countplot(y="Lens", hue="Brand", data=data, ax=subplot, order=data.Lens.value_counts().index)
+    sns.barplot(
+        x=COUNT_COLUMN,
+        y="Lens",
+        hue="Brand",
+        **_bars(aggregates.crosstab("Lens", "Brand")),
+        ax=subplot,
+        order=aggregates.order("Lens"),
+        orient="h",
+    )
     subplot.set_title("Number of Shots per Lens Model", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
     subplot.set_xlabel("Number of Shots", fontsize=20)
@@ -107,38 +158,52 @@ def plot_shots_per_lens(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.legend(loc="lower right", fontsize=18, title_fontsize=25)
 
 
-def plot_shots_per_shutter_speed(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_shutter_speed(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per shutter speed, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per shutter speed")
-    sns.countplot(x="Shutter_Speed", data=data, ax=subplot, order=data.Shutter_Speed.value_counts().index)
+    sns.barplot(
+        x="Shutter_Speed",
+        y=COUNT_COLUMN,
+        **_bars(aggregates.counts("Shutter_Speed")),
+        ax=subplot,
+        order=aggregates.order("Shutter_Speed"),
+    )
     subplot.set_title("Number of Shots per Shutter Speed", fontsize=25)
     subplot.tick_params(axis="x", which="major", rotation=70)
     subplot.set_xlabel("Shutter Speed", fontsize=20)
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_year(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_year(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots taken each year, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per year")
-    sns.countplot(y="Year", hue="Brand", data=data, ax=subplot, order=data.Year.value_counts().index)
+    sns.barplot(
+        x=COUNT_COLUMN,
+        y="Year",
+        hue="Brand",
+        **_bars(aggregates.crosstab("Year", "Brand")),
+        ax=subplot,
+        order=aggregates.order("Year"),
+        orient="h",
+    )
     subplot.set_title("Number of Shots per Year", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
     subplot.set_xlabel("Number of Shots", fontsize=20)
@@ -146,25 +211,26 @@ def plot_shots_per_year(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.legend(loc="lower right", fontsize=18, title_fontsize=22)
 
 
-def plot_shots_per_exposure_program_setting(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_exposure_program_setting(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per camera, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per exposure program")
-    sns.countplot(
+    sns.barplot(
         x="Exposure_Program",
+        y=COUNT_COLUMN,
         hue=None,
         palette="pastel",
-        data=data,
+        **_bars(aggregates.counts("Exposure_Program")),
         ax=subplot,
-        order=data.Exposure_Program.value_counts().index,
+        order=aggregates.order("Exposure_Program"),
     )
     subplot.set_title("Number of Shots per Exposure Program", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -172,25 +238,26 @@ def plot_shots_per_exposure_program_setting(subplot: Axes, data: pd.DataFrame) -
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_flash_setting(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_flash_setting(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots with or without flash, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per flash setting")
-    sns.countplot(
+    sns.barplot(
         x="Flash",
+        y=COUNT_COLUMN,
         hue=None,
         palette="pastel",
-        data=data,
+        **_bars(aggregates.counts("Flash")),
         ax=subplot,
-        order=data.Flash.value_counts().index,
+        order=aggregates.order("Flash"),
     )
     subplot.set_title("Number of Shots with and without Flash", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -198,25 +265,26 @@ def plot_shots_per_flash_setting(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_metering_mode(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_metering_mode(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per metering mode, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per metering mode")
-    sns.countplot(
+    sns.barplot(
         x="Metering_Mode",
+        y=COUNT_COLUMN,
         hue=None,
         palette="pastel",
-        data=data,
+        **_bars(aggregates.counts("Metering_Mode")),
         ax=subplot,
-        order=data.Metering_Mode.value_counts().index,
+        order=aggregates.order("Metering_Mode"),
     )
     subplot.set_title("Number of Shots per Metering Mode", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -225,26 +293,28 @@ def plot_shots_per_metering_mode(subplot: Axes, data: pd.DataFrame) -> None:
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_white_balance_setting(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_white_balance_setting(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per white balance setting, on the provided subplot. Acts in
     place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per white balance setting")
-    sns.countplot(
+    sns.barplot(
+        x=COUNT_COLUMN,
         y="White_Balance",
         hue=None,
         palette="pastel",
-        data=data,
+        **_bars(aggregates.counts("White_Balance")),
         ax=subplot,
-        order=data.White_Balance.value_counts().index,
+        order=aggregates.order("White_Balance"),
+        orient="h",
     )
     subplot.set_title("Number of Shots per White Balance Setting", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -252,26 +322,27 @@ def plot_shots_per_white_balance_setting(subplot: Axes, data: pd.DataFrame) -> N
     subplot.set_ylabel("White Balance", fontsize=20)
 
 
-def plot_shots_per_exposure_compensation_setting(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_exposure_compensation_setting(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per Exposure Compensation setting, on the provided subplot.
     Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per exposure compensation setting")
-    sns.countplot(
+    sns.barplot(
         x="Exposure_Compensation",
+        y=COUNT_COLUMN,
         hue=None,
         palette="pastel",
-        data=data,
+        **_bars(aggregates.counts("Exposure_Compensation")),
         ax=subplot,
-        # order=data.Exposure_Compensation.value_counts().index,
+        order=aggregates.order("Exposure_Compensation", by_count=False),
     )
     subplot.set_title("Number of Shots per Exposure Compensation Setting", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
@@ -279,83 +350,226 @@ def plot_shots_per_exposure_compensation_setting(subplot: Axes, data: pd.DataFra
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_shots_per_iso_setting(subplot: Axes, data: pd.DataFrame) -> None:
+def plot_shots_per_iso_setting(subplot: Axes, aggregates: InsightAggregates) -> None:
     """
     Barplot of the number of shots per ISO setting, on the provided subplot. Acts in place.
 
     Args:
         subplot: the subplot plt.axes on which to plot.
-        data: the pandas DataFrame with your exif data.
+        aggregates: the InsightAggregates of your exif data.
 
     Returns:
         Nothing, plots in place.
     """
     logger.debug("Plotting shots per ISO")
-    sns.countplot(x="ISO", hue=None, data=data, ax=subplot)  # order=data.ISO.value_counts().index)
+    sns.barplot(
+        x="ISO",
+        y=COUNT_COLUMN,
+        hue=None,
+        **_bars(aggregates.counts("ISO")),
+        ax=subplot,
+        order=aggregates.order("ISO", by_count=False),
+    )
     subplot.set_title("Number of Shots per ISO Setting", fontsize=25)
     subplot.tick_params(axis="both", which="major", labelsize=13)
     subplot.set_xlabel("ISO Value", fontsize=20)
     subplot.set_ylabel("Number of Shots", fontsize=20)
 
 
-def plot_insight(
-    data: pd.DataFrame, output_directory: pathlib.Path, *, showfig: bool = False, savefig: bool = True
-) -> None:
+# Panels of the insights figures, by name, in the order they are drawn
+PANELS: dict[str, Callable[[Axes, InsightAggregates], None]] = {
+    "year": plot_shots_per_year,
+    "camera": plot_shots_per_camera,
+    "lens": plot_shots_per_lens,
+    "focal_length": plot_shots_per_focal_length,
+    "fnumber": plot_shots_per_fnumber,
+    "shutter_speed": plot_shots_per_shutter_speed,
+    "exposure_program": plot_shots_per_exposure_program_setting,
+    "flash": plot_shots_per_flash_setting,
+    "metering_mode": plot_shots_per_metering_mode,
+    "white_balance": plot_shots_per_white_balance_setting,
+    "exposure_compensation": plot_shots_per_exposure_compensation_setting,
+    "iso": plot_shots_per_iso_setting,
+}
+# The aggregated tables each panel is drawn from, see photocrawl.aggregates.COUNT_TABLES
+PANEL_TABLES: dict[str, tuple[str, ...]] = {
+    "year": ("Year", "Brand"),
+    "camera": ("Camera", "Brand"),
+    "lens": ("Lens", "Brand"),
+    "focal_length": ("Focal_Range", "Lens"),
+    "fnumber": ("F_Number",),
+    "shutter_speed": ("Shutter_Speed",),
+    "exposure_program": ("Exposure_Program",),
+    "flash": ("Flash",),
+    "metering_mode": ("Metering_Mode",),
+    "white_balance": ("White_Balance",),
+    "exposure_compensation": ("Exposure_Compensation",),
+    "iso": ("ISO",),
+}
+FIGURES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    (
+        "Your Photography Habits - Part 1",
+        ("year", "camera", "lens", "focal_length", "fnumber", "shutter_speed"),
+    ),
+    (
+        "Your Photography Habits - Part 2",
+        ("exposure_program", "flash", "metering_mode", "white_balance", "exposure_compensation", "iso"),
+    ),
+)
+FIGURE_FORMATS: tuple[str, ...] = ("jpg", "png", "svg", "pdf")
+
+
+def render_figure(
+    aggregates: InsightAggregates,
+    title: str,
+    panels: Sequence[str],
+    output_file: Optional[pathlib.Path] = None,
+    *,
+    dpi: int = 500,
+    showfig: bool = False,
+) -> Optional[pathlib.Path]:
     """
-    Combines all the different plots into subplots on two figure.
+    Build one insights figure with the provided panels as subplots, two per row, and save it to
+    `output_file` in the format given by its extension. Sets the seaborn style of the figures.
 
     Args:
-        data: the pandas DataFrame with your exif data.
-        output_directory: the folder in which to save the figures.
+        aggregates: the InsightAggregates of your exif data.
+        title: the title of the figure.
+        panels: the names of the panels to draw, keys of `PANELS`.
+        output_file: the location of the file to save the figure to. Defaults to None, in which
+            case the figure is not saved.
+        dpi: the resolution of the saved figure, for raster formats. Defaults to 500.
         showfig: if set to True, the figure will be shown. Defaults to False.
-        savefig: if set to True, the figure will be saved. Defaults to True.
 
     Returns:
-        Nothing, plots in place.
+        The `output_file`, once the figure is saved.
     """
-    logger.info("Plotting first insights figure")
-
-    fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(20, 22))
-    fig.suptitle("Your Photography Habits - Part 1", fontsize=35)
-    plot_shots_per_year(axes[0, 0], data)
-    plot_shots_per_camera(axes[0, 1], data)
-    plot_shots_per_lens(axes[1, 0], data)
-    plot_shots_per_focal_length(axes[1, 1], data)
-    plot_shots_per_fnumber(axes[2, 0], data)
-    plot_shots_per_shutter_speed(axes[2, 1], data)
+    sns.set_palette("pastel")
+    sns.set_style("whitegrid")
+    nrows: int = math.ceil(len(panels) / 2)
+    fig, axes = plt.subplots(nrows=nrows, ncols=2, figsize=(20, 22 * nrows / 3), squeeze=False)
+    fig.suptitle(title, fontsize=35)
+    for panel, subplot in zip(panels, axes.flat):
+        PANELS[panel](subplot, aggregates)
+    for subplot in axes.flat[len(panels) :]:
+        fig.delaxes(subplot)
     fig.tight_layout()
-    fig.subplots_adjust(top=0.93)
+    fig.subplots_adjust(top=1 - 0.21 / nrows)
 
     if showfig:
-        logger.debug("Showing first insight figure.")
+        logger.debug(f"Showing figure '{title}'")
         plt.show()
 
-    if savefig:
-        logger.debug(f"Saving first insights figure as {output_directory}/insight_1.png")
-        plt.savefig(f"{output_directory}/insight_1.jpg", format="jpg", dpi=500)
-        logger.success(f"Saved as {output_directory}/insight_1.jpg")
-
-    logger.info("Plotting second insights figure")
-
-    fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(20, 22))
-    fig.suptitle("Your Photography Habits - Part 2", fontsize=35)
-    plot_shots_per_exposure_program_setting(axes[0, 0], data)
-    plot_shots_per_flash_setting(axes[0, 1], data)
-    plot_shots_per_metering_mode(axes[1, 0], data)
-    plot_shots_per_white_balance_setting(axes[1, 1], data)
-    plot_shots_per_exposure_compensation_setting(axes[2, 0], data)
-    plot_shots_per_iso_setting(axes[2, 1], data)
-    fig.tight_layout()
-    fig.subplots_adjust(top=0.93)
+    if output_file is not None:
+        logger.debug(f"Saving figure '{title}' as {output_file}")
+        fig.savefig(output_file, format=output_file.suffix[1:], dpi=dpi)
+    plt.close(fig)
+    return output_file
+
+
+def _figure_fingerprint(aggregates: InsightAggregates, title: str, panels: Sequence[str], dpi: int) -> str:
+    """Fingerprint of everything a saved figure depends on, for the render cache."""
+    return RenderCache.fingerprint(
+        aggregates.fingerprint(PANEL_TABLES[panel] for panel in panels),
+        title,
+        list(panels),
+        dpi,
+        [__version__, matplotlib.__version__, sns.__version__],
+    )
 
-    if showfig:
-        logger.debug("Showing second insight figure.")
-        plt.show()
 
-    if savefig:
-        logger.debug(f"Saving second insights figure as {output_directory}/insight_2.png")
-        plt.savefig(f"{output_directory}/insight_2.jpg", format="jpg", dpi=500)
-        logger.success(f"Saved as {output_directory}/insight_2.jpg")
+def _use_agg_backend() -> None:
+    """Initializer of the processes rendering figures, which have no display."""
+    plt.switch_backend("Agg")
+
+
+def plot_insight(
+    data: Union[pd.DataFrame, InsightAggregates],
+    output_directory: pathlib.Path,
+    *,
+    showfig: bool = False,
+    savefig: bool = True,
+    dpi: int = 500,
+    file_format: str = "jpg",
+    panels: Optional[Sequence[str]] = None,
+    use_render_cache: bool = True,
+) -> list[pathlib.Path]:
+    """
+    Combines all the different plots into subplots on two figure. When figures are only saved,
+    and several CPUs are available, each one is built and saved in its own process on the Agg
+    backend. Saved figures whose data and plot options did not change since they were last saved
+    are not rendered again, see `photocrawl.render_cache`.
+
+    Args:
+        data: the pandas DataFrame with your exif data, or its precomputed InsightAggregates.
+        output_directory: the folder in which to save the figures.
+        showfig: if set to True, the figure will be shown. Defaults to False.
+        savefig: if set to True, the figure will be saved. Defaults to True.
+        dpi: the resolution of saved figures, for raster formats. Defaults to 500.
+        file_format: the format of saved figures, one of FIGURE_FORMATS. Defaults to 'jpg'.
+        panels: the names of the panels to draw, keys of `PANELS`. Figures without any of these
+            panels are skipped. Defaults to all panels.
+        use_render_cache: if set to True, saved figures which are up to date are not rendered
+            again. Figures are always rendered when shown. Defaults to True.
+
+    Returns:
+        A list of the saved files, including up to date ones which were not rendered again.
+    """
+    if file_format not in FIGURE_FORMATS:
+        msg = f"Invalid figure format '{file_format}', should be one of {FIGURE_FORMATS}"
+        raise ValueError(msg)
+    if panels is not None and not set(panels).issubset(PANELS):
+        msg = f"Invalid panels {sorted(set(panels) - set(PANELS))}, should be in {list(PANELS)}"
+        raise ValueError(msg)
+
+    aggregates = data if isinstance(data, InsightAggregates) else InsightAggregates.from_data(data)
+    figures: list[tuple[str, list[str], Optional[pathlib.Path]]] = [
+        (
+            title,
+            [panel for panel in figure_panels if panels is None or panel in panels],
+            output_directory / f"insight_{number}.{file_format}" if savefig else None,
+        )
+        for number, (title, figure_panels) in enumerate(FIGURES, start=1)
+    ]
+    figures = [figure for figure in figures if figure[1]]
+
+    # Fingerprints are recorded whenever figures are saved, so that the cache never goes stale
+    render_cache = RenderCache(output_directory)
+    fingerprints: dict[pathlib.Path, str] = {
+        output_file: _figure_fingerprint(aggregates, title, figure_panels, dpi)
+        for title, figure_panels, output_file in figures
+        if output_file is not None
+    }
+    up_to_date_files: list[pathlib.Path] = []
+    if use_render_cache and savefig and not showfig:
+        up_to_date_files = [
+            output_file
+            for output_file, fingerprint in fingerprints.items()
+            if render_cache.is_fresh(output_file, fingerprint)
+        ]
+        figures = [figure for figure in figures if figure[2] not in up_to_date_files]
+        logger.info(f"Render cache: {render_cache.hits} figures up to date, {render_cache.misses} to render")
+        metrics.count("render_cache_hits", render_cache.hits)
+        metrics.count("render_cache_misses", render_cache.misses)
+
+    with metrics.stage("render"), timeit(
+        lambda spanned: logger.info(f"Plotted {len(figures)} insights figures in {spanned:.4f} seconds")
+    ):
+        workers: int = min(len(figures), os.cpu_count() or 1)
+        if showfig or not savefig or workers < 2:
+            saved_files = [
+                render_figure(aggregates, title, figure_panels, output_file, dpi=dpi, showfig=showfig)
+                for title, figure_panels, output_file in figures
+            ]
+        else:
+            with ProcessPoolExecutor(workers, initializer=_use_agg_backend) as executor:
+                saved_files = list(executor.map(partial(render_figure, aggregates, dpi=dpi), *zip(*figures)))
+
+    saved_files = [output_file for output_file in saved_files if output_file is not None]
+    for output_file in saved_files:
+        render_cache.record(output_file, fingerprints[output_file])
+        logger.success(f"Saved as {output_file}")
+    return up_to_date_files + saved_files
 
 
 # ================================================================================================ #
@@ -0,0 +1,84 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+A cache of rendered insights figures, so that figures are only drawn and encoded again when the
+data they show or the plot options changed.
+
+Fingerprints of the saved figures are stored in a JSON file next to them, in the output directory.
+"""
+
+import hashlib
+import json
+import pathlib
+from typing import Union
+
+from loguru import logger
+
+RENDER_CACHE_FILE: str = ".insights_cache.json"
+
+
+class RenderCache:
+    """
+    Class to handle the fingerprints of figures saved in an output directory.
+    """
+
+    __slots__ = {
+        "path": "PosixPath object to the JSON file of fingerprints",
+        "hits": "integer, number of figures found up to date this session",
+        "misses": "integer, number of figures absent or outdated this session",
+        "_fingerprints": "dictionary of figure file names to the fingerprint of their inputs",
+    }
+
+    def __init__(self, output_directory: Union[str, pathlib.Path]):
+        self.path: pathlib.Path = pathlib.Path(output_directory) / RENDER_CACHE_FILE
+        self.hits: int = 0
+        self.misses: int = 0
+        self._fingerprints: dict[str, str] = {}
+        if self.path.is_file():
+            try:
+                self._fingerprints = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning(f"Ignoring invalid render cache at '{self.path}'")
+
+    @staticmethod
+    def fingerprint(*inputs: object) -> str:
+        """
+        A hash of the provided inputs of a figure, e.g. fingerprints of its data and plot options.
+
+        Args:
+            *inputs: JSON-serializable inputs of the figure.
+
+        Returns:
+            The hexadecimal SHA-256 digest of the inputs.
+        """
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def is_fresh(self, output_file: pathlib.Path, fingerprint: str) -> bool:
+        """
+        Whether the figure saved at `output_file` exists and was rendered from the same inputs.
+
+        Args:
+            output_file: the location of the saved figure.
+            fingerprint: the fingerprint of the figure's current inputs.
+
+        Returns:
+            A boolean.
+        """
+        fresh: bool = output_file.is_file() and self._fingerprints.get(output_file.name) == fingerprint
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def record(self, output_file: pathlib.Path, fingerprint: str) -> None:
+        """
+        Record the fingerprint of the inputs of a newly saved figure, and write the cache file.
+
+        Args:
+            output_file: the location of the saved figure.
+            fingerprint: the fingerprint of the figure's inputs.
+        """
+        self._fingerprints[output_file.name] = fingerprint
+        self.path.write_text(json.dumps(self._fingerprints, indent=2, sort_keys=True))
@@ -0,0 +1,135 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Stratified random sampling of crawled files, to estimate insights of a large library from the
+metadata of a part of it.
+
+Files are stratified by the top-level sub-directory they are in, e.g. by year or by event, and a
+simple random sample is drawn in each stratum with a size proportional to that of the stratum.
+Counts of the sampled shots are then scaled up to the stratum sizes, with confidence intervals,
+see `InsightAggregates.from_sample`.
+"""
+
+import heapq
+import random
+from collections.abc import Iterable
+from typing import Optional, Union
+
+import pandas as pd
+from loguru import logger
+
+from photocrawl.aggregates import InsightAggregates
+
+STRATUM_COLUMN: str = "Stratum"
+
+
+def parse_sample(sample: str) -> Union[int, float]:
+    """
+    Read a sample size given either as a fraction of the files, e.g. '0.05', or as a number of
+    files, e.g. '5000'.
+
+    Args:
+        sample: the sample size specification.
+
+    Returns:
+        A float fraction between 0 and 1, or an integer number of files.
+    """
+    try:
+        size = int(sample)
+    except ValueError:
+        try:
+            size = float(sample)
+        except ValueError:
+            size = 0
+    if (isinstance(size, int) and size < 1) or (isinstance(size, float) and not 0 < size < 1):
+        msg = f"Invalid sample '{sample}', should be a fraction between 0 and 1 or a number of files"
+        raise ValueError(msg)
+    return size
+
+
+class StratifiedSampler:
+    """
+    Class to handle the stratified random sampling of crawled files.
+    """
+
+    __slots__ = {
+        "size": "integer number, or float fraction, of files to sample",
+        "population": "dictionary of strata to their number of crawled files",
+        "sampled": "dictionary of strata to their number of sampled files",
+        "_random": "random.Random generator of the sampling keys",
+    }
+
+    def __init__(self, size: Union[int, float], seed: Optional[int] = None):
+        """
+        Args:
+            size: the number of files to sample, or the fraction of files to sample if a float,
+                see `parse_sample`.
+            seed: the seed of the random sampling, to draw the same sample again. Defaults to
+                None, for a different sample each time.
+        """
+        self.size: Union[int, float] = size
+        self.population: dict[str, int] = {}
+        self.sampled: dict[str, int] = {}
+        self._random: random.Random = random.Random(seed)
+
+    def draw(self, photo_files: Iterable[tuple[str, str]]) -> list[str]:
+        """
+        Draw a stratified random sample of files. Each stratum gets a number of files proportional
+        to its size, and at least one. Random keys are given to files as they arrive: when sampling
+        a fraction, files whose key is under it are sampled, and when sampling a number of files,
+        only the files with the lowest keys in each stratum are held, so that the whole list of
+        crawled files is never kept in memory.
+
+        Args:
+            photo_files: tuples of the stratum of each crawled file and its path.
+
+        Returns:
+            A list of the paths of the sampled files.
+        """
+        kept: dict[str, list[tuple[float, str]]] = {}  # heaps of the negated keys of held files
+        capacity: Optional[int] = self.size if isinstance(self.size, int) else None
+        for stratum, photo_file in photo_files:
+            key = self._random.random()
+            self.population[stratum] = self.population.get(stratum, 0) + 1
+            heap = kept.setdefault(stratum, [])
+            if capacity is None:
+                has_fallback = bool(heap) and -heap[0][0] >= self.size
+                if key < self.size:
+                    if has_fallback:
+                        heapq.heapreplace(heap, (-key, photo_file))
+                    else:
+                        heapq.heappush(heap, (-key, photo_file))
+                elif not heap or has_fallback and key < -heap[0][0]:
+                    heap[:] = [(-key, photo_file)]  # lowest key, in case no file is under the fraction
+            elif len(heap) < capacity:
+                heapq.heappush(heap, (-key, photo_file))
+            elif -key > heap[0][0]:
+                heapq.heapreplace(heap, (-key, photo_file))
+
+        total: int = sum(self.population.values())
+        sample: list[str] = []
+        for stratum, heap in kept.items():
+            population = self.population[stratum]
+            if capacity is None:
+                files = [photo_file for _, photo_file in heap]
+            else:
+                size = min(population, max(1, round(capacity * population / total)))
+                files = [photo_file for _, photo_file in heapq.nlargest(size, heap)]
+            self.sampled[stratum] = len(files)
+            sample.extend(files)
+        logger.info(f"Sampled {len(sample)} of {total} files, in {len(kept)} strata")
+        return sample
+
+    def estimate(self, data: pd.DataFrame) -> InsightAggregates:
+        """
+        Estimate the aggregates of the whole library from the data of the sampled files.
+
+        Args:
+            data: the pandas DataFrame with the exif data of the sampled files, as returned by
+                `PhotoCrawler.refactor_exif_data`, with their stratum in a 'Stratum' column.
+
+        Returns:
+            An `InsightAggregates` object, with the estimated counts and their margins of error.
+        """
+        return InsightAggregates.from_sample(data, STRATUM_COLUMN, self.population, self.sampled)
@@ -0,0 +1,146 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+An explicit, compact schema for the EXIF table built from crawled files.
+
+Exiftool outputs every value as a string or a Python number, which makes an `object` dtype
+DataFrame costing a few hundred bytes per cell. Applying the schema as rows arrive keeps the
+table small: repeated labels become categoricals, numbers become fixed-width types and capture
+times become `datetime64`.
+"""
+
+from collections.abc import Iterable
+
+import pandas as pd
+from loguru import logger
+from pandas.api.types import union_categoricals
+
+# Exif dates are written as '%Y:%m:%d %H:%M:%S', but pandas parses the ISO format much faster
+_ISO_DATETIME_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+
+# Keys are exif tags as output by the metadata backends, the categorical ones are the tags of
+# PhotoCrawler.categorical_columns once renamed
+EXIF_SCHEMA: dict[str, str] = {
+    "DateTimeOriginal": "datetime64[ns]",
+    "ExposureCompensation": "category",
+    "ExposureProgram": "category",
+    "FNumber": "float32",
+    "Flash": "category",
+    "FocalLength": "float32",
+    "FocalLengthIn35mmFormat": "float32",
+    "ISO": "UInt32",  # nullable, as some files have no ISO tag
+    "LensMake": "category",
+    "LensModel": "category",
+    "Make": "category",
+    "MeteringMode": "category",
+    "Model": "category",
+    "ShutterSpeedValue": "category",
+    "WhiteBalance": "category",
+}
+
+_LEADING_NUMBER: str = r"^\s*(\d*\.?\d+)"
+
+
+def _to_category(values: pd.Series) -> pd.Series:
+    # Exiftool outputs some values of a same tag as numbers and others as strings, e.g. 0 and '+1/3'
+    strings = values.astype(str).where(values.notna())
+    if strings.isna().all():
+        return pd.Series(pd.Categorical(strings, categories=pd.Index([], dtype=str)), index=values.index)
+    return strings.astype("category")
+
+
+def _to_float32(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float32")
+    # Few distinct values, e.g. apertures: only parse categories, handling units as in '23.0 mm'
+    categorical = values.astype("category")
+    categories = pd.Series(categorical.cat.categories.astype(str))
+    numbers = pd.to_numeric(categories.str.extract(_LEADING_NUMBER, expand=False), errors="coerce")
+    return pd.Series(
+        numbers.to_numpy("float32", na_value=float("nan")).take(categorical.cat.codes.to_numpy()),
+        index=values.index,
+    ).where(categorical.notna())
+
+
+def _to_uint32(values: pd.Series) -> pd.Series:
+    numbers = pd.to_numeric(values, errors="coerce")
+    return numbers.where(numbers >= 0).round().astype("UInt32")
+
+
+def _to_datetime(values: pd.Series) -> pd.Series:
+    # Subseconds or time zones, which some cameras write, are ignored
+    iso_strings = values.astype(str).where(values.notna()).str.slice(0, 19).str.replace(":", "-", n=2)
+    return pd.to_datetime(iso_strings, format=_ISO_DATETIME_FORMAT, errors="coerce").astype("datetime64[ns]")
+
+
+_CONVERTERS = {
+    "category": _to_category,
+    "float32": _to_float32,
+    "UInt32": _to_uint32,
+    "datetime64[ns]": _to_datetime,
+}
+
+
+def apply_schema(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the columns of an EXIF table to the types of `EXIF_SCHEMA`. Columns which already have
+    the right type, or are not in the schema, are left as is. Values which cannot be converted
+    become missing, and are reported.
+
+    Args:
+        data: the pandas DataFrame with your exif data, as built from metadata dictionaries.
+
+    Returns:
+        A new `pandas.DataFrame`, sharing the data of columns which were not converted.
+    """
+    typed_df: pd.DataFrame = data.copy(deep=False)
+    for column, dtype in EXIF_SCHEMA.items():
+        if column not in typed_df.columns or typed_df[column].dtype == dtype:
+            continue
+        values = typed_df[column]
+        converted = _CONVERTERS[dtype](values)
+        invalid = int((converted.isna() & values.notna()).sum())
+        if invalid:
+            logger.warning(f"Could not convert {invalid} values of '{column}' to {dtype}, dropping them")
+        typed_df[column] = converted
+    return typed_df
+
+
+def concat_tables(tables: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate typed EXIF tables, e.g. built from successive chunks of rows. Categorical columns
+    stay categorical, with the union of categories, where `pandas.concat` would fall back to
+    `object` dtype for differing categories. Columns missing in all rows are dropped, unless there
+    are no rows at all, e.g. for an empty shard of a library.
+
+    Args:
+        tables: the typed pandas DataFrames to concatenate, with the same columns.
+
+    Returns:
+        A `pandas.DataFrame` with a fresh `RangeIndex`.
+    """
+    tables = list(tables)
+    if not tables:
+        return pd.DataFrame()
+    categorical = [
+        column for column, dtype in tables[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)
+    ]
+    result = pd.concat([table.drop(columns=categorical) for table in tables], ignore_index=True)
+    for column in categorical:
+        result[column] = pd.Categorical(union_categoricals([table[column] for table in tables]))
+    result = result[tables[0].columns]
+    return result.dropna(axis="columns", how="all") if len(result) else result
+
+
+def bytes_per_row(data: pd.DataFrame) -> float:
+    """
+    The memory used by each row of the provided table, including the content of Python objects.
+
+    Args:
+        data: the pandas DataFrame to measure.
+
+    Returns:
+        The number of bytes per row, 0 for an empty table.
+    """
+    return data.memory_usage(deep=True, index=False).sum() / len(data) if len(data) else 0.0
@@ -0,0 +1,174 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Deterministic partitioning of a library into shards, so that it can be crawled by several
+processes or hosts, and merging of the partial results they write.
+
+Files are assigned to a shard from a hash of their path relative to the crawled directory, or of
+the top-level sub-directory they are in, so that every job agrees on the partition wherever the
+library is mounted. Partial results are either refactored EXIF tables, see `photocrawl.storage`,
+or JSON aggregates of shot counts, see `photocrawl.aggregates`.
+"""
+
+import hashlib
+import pathlib
+import posixpath
+from collections.abc import Sequence
+from functools import reduce
+from typing import Union
+
+import pandas as pd
+from loguru import logger
+
+from photocrawl.aggregates import InsightAggregates
+from photocrawl.schema import concat_tables
+
+SHARD_STRATEGIES: tuple[str, ...] = ("path", "directory")
+AGGREGATES_EXTENSION: str = ".json"
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """
+    Read a shard given as 'INDEX/COUNT', e.g. '2/4' for the second of four shards.
+
+    Args:
+        shard: the shard specification.
+
+    Returns:
+        A tuple of the shard index, from 1, and the number of shards.
+    """
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        index, count = 0, 0
+    if not 1 <= index <= count:
+        msg = f"Invalid shard '{shard}', should be 'INDEX/COUNT' with 1 <= INDEX <= COUNT, e.g. '2/4'"
+        raise ValueError(msg)
+    return index, count
+
+
+def shard_key(relative_path: str, strategy: str = "path") -> str:
+    """
+    The part of a file's path which determines its shard.
+
+    Args:
+        relative_path: the path to the file relative to the crawled directory, with '/' separators.
+        strategy: 'path' to spread shots individually, or 'directory' to keep the files of each
+            top-level sub-directory, e.g. of a year or an event, in the same shard. Files directly
+            in the crawled directory are then spread individually. Files of a same shot, e.g.
+            RAW+JPEG pairs, are always in the same shard, see `photocrawl.pairing`. Defaults to 'path'.
+
+    Returns:
+        The key to hash, see `shard_of`.
+    """
+    if strategy not in SHARD_STRATEGIES:
+        msg = f"Invalid sharding strategy '{strategy}', should be one of {SHARD_STRATEGIES}"
+        raise ValueError(msg)
+    directory, separator, _ = relative_path.partition("/")
+    if strategy == "directory" and separator:
+        return directory
+    return posixpath.splitext(relative_path)[0].lower()  # files of a shot, e.g. RAW+JPEG, stay together
+
+
+def shard_of(key: str, count: int) -> int:
+    """
+    The shard a key is assigned to. Unlike the builtin `hash`, the result is the same in every
+    process and on every host.
+
+    Args:
+        key: the key of a file, see `shard_key`.
+        count: the number of shards.
+
+    Returns:
+        The index of the shard, from 1.
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % count + 1
+
+
+def is_aggregates_file(path: Union[str, pathlib.Path]) -> bool:
+    """
+    Whether the provided path has the extension of aggregates written by `write_partial`.
+
+    Args:
+        path: the path to check.
+
+    Returns:
+        A boolean.
+    """
+    return pathlib.Path(path).suffix.lower() == AGGREGATES_EXTENSION
+
+
+def write_partial(data: pd.DataFrame, path: Union[str, pathlib.Path]) -> pathlib.Path:
+    """
+    Write the refactored EXIF table of a shard, or only its aggregated shot counts if `path` has
+    a '.json' extension. Tables are written as by `photocrawl.storage.export_table`.
+
+    Args:
+        data: the pandas DataFrame with your exif data, as returned by
+            `PhotoCrawler.refactor_exif_data`.
+        path: the location of the file to write.
+
+    Returns:
+        A `pathlib.Path` object of the written file.
+    """
+    if is_aggregates_file(path):
+        return InsightAggregates.from_data(data).save(path)
+
+    from photocrawl.storage import export_table
+
+    return export_table(data, path)
+
+
+def merge_partials(paths: Sequence[Union[str, pathlib.Path]]) -> Union[pd.DataFrame, InsightAggregates]:
+    """
+    Combine the partial results of shards, written by `write_partial`, into one dataset which can
+    be given to `plot_insight`. All partial results should be of the same kind.
+
+    Args:
+        paths: the locations of the partial results, either table files of refactored data or
+            JSON aggregates.
+
+    Returns:
+        A `pandas.DataFrame` with the rows of all tables, or `InsightAggregates` with the shots
+        of all aggregates.
+    """
+    if not paths:
+        msg = "No partial results to merge"
+        raise ValueError(msg)
+    aggregated = [is_aggregates_file(path) for path in paths]
+    if any(aggregated) and not all(aggregated):
+        msg = "Cannot merge tables with aggregates, partial results should all be written the same way"
+        raise ValueError(msg)
+
+    if all(aggregated):
+        merged = reduce(InsightAggregates.merge, (InsightAggregates.load(path) for path in paths))
+        logger.info(f"Merged aggregates of {len(paths)} partial results, with {merged.total} shots")
+        return merged
+
+    from photocrawl.storage import load_table
+
+    tables = [load_table(path) for path in paths]
+    merged = concat_tables(_align_categories([table for table in tables if len(table)] or tables[:1]))
+    logger.info(f"Merged tables of {len(paths)} partial results, with {len(merged)} shots")
+    return merged
+
+
+def _align_categories(tables: list[pd.DataFrame]) -> list[pd.DataFrame]:
+    """
+    Categories of a column are read back with the type of their values in each table, e.g. numbers
+    in one shard but strings in another, they are made strings where types differ across tables.
+    """
+    category_dtypes: dict[str, set] = {}
+    for table in tables:
+        for column, dtype in table.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                category_dtypes.setdefault(column, set()).add(dtype.categories.dtype)
+    mixed = [column for column, dtypes in category_dtypes.items() if len(dtypes) > 1]
+    if not mixed:
+        return tables
+    return [
+        table.assign(**{column: table[column].astype("string").astype("category") for column in mixed})
+        for table in tables
+    ]
@@ -0,0 +1,190 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Columnar export and import of EXIF tables, to Parquet, Feather or Arrow IPC files, so that an
+analysis does not require crawling the whole library again.
+
+Categorical columns are stored with dictionary encoding and come back as categoricals. These
+functions need the optional `pyarrow` dependency, installable with `pip install photocrawl[arrow]`.
+"""
+
+import pathlib
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Optional, Union
+
+import pandas as pd
+from loguru import logger
+
+from photocrawl import metrics
+from photocrawl.utils import timeit
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+TABLE_FORMATS: dict[str, str] = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as error:
+        msg = "Tables require the 'pyarrow' package, install it with 'pip install photocrawl[arrow]'"
+        raise ImportError(msg) from error
+    return pa
+
+
+def is_table_file(path: Union[str, pathlib.Path]) -> bool:
+    """
+    Whether the provided path is an existing file with a supported table format extension.
+
+    Args:
+        path: the path to check.
+
+    Returns:
+        A boolean.
+    """
+    path = pathlib.Path(path)
+    return path.is_file() and path.suffix.lower() in TABLE_FORMATS
+
+
+def table_format(path: Union[str, pathlib.Path]) -> str:
+    """
+    Determine the table format from the extension of the provided path.
+
+    Args:
+        path: the path to the table file.
+
+    Returns:
+        One of 'parquet', 'feather' and 'arrow'.
+    """
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix not in TABLE_FORMATS:
+        msg = f"Unsupported table file extension '{suffix}', should be one of {list(TABLE_FORMATS)}"
+        raise ValueError(msg)
+    return TABLE_FORMATS[suffix]
+
+
+def _arrow_compatible(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Exiftool values can mix numbers and strings in a column, e.g. '0' is output as a number but
+    '+1/3' as a string, which Arrow cannot store. Such columns, and categories, are made strings.
+    """
+    conversions: dict[str, pd.Series] = {}
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.dtype == object:
+            # renaming categories could collide, e.g. 0 and '0'
+            conversions[column] = values.astype("string").astype("category")
+        elif values.dtype == object:
+            conversions[column] = values.astype("string")
+    return data.assign(**conversions) if conversions else data
+
+
+def export_table(data: pd.DataFrame, path: Union[str, pathlib.Path]) -> pathlib.Path:
+    """
+    Write an EXIF table, as returned by `PhotoCrawler.process_files` or
+    `PhotoCrawler.refactor_exif_data`, to a Parquet, Feather or Arrow IPC file depending on the
+    extension of `path`.
+
+    Args:
+        data: the pandas DataFrame with your exif data.
+        path: the location of the file to write.
+
+    Returns:
+        A `pathlib.Path` object of the written file.
+    """
+    pa = _import_pyarrow()
+    path = pathlib.Path(path)
+    file_format = table_format(path)
+
+    with timeit(
+        lambda spanned: logger.info(f"Exported {len(data)} rows to '{path}' in {spanned:.4f} seconds")
+    ):
+        table: pa.Table = pa.Table.from_pandas(_arrow_compatible(data), preserve_index=False)
+
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            pq.write_table(table, path)
+        elif file_format == "feather":
+            import pyarrow.feather as feather
+
+            feather.write_feather(table, path)
+        else:
+            with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return path
+
+
+def load_table(
+    path: Union[str, pathlib.Path],
+    columns: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[int]] = None,
+    *,
+    memory_map: bool = False,
+) -> pd.DataFrame:
+    """
+    Read an EXIF table from a Parquet, Feather or Arrow IPC file, depending on the extension of
+    `path`.
+
+    Args:
+        path: the location of the file to read.
+        columns: if given, only these columns are read. Defaults to all columns.
+        years: if given, only rows whose 'Year' is one of these are kept. Requires a table
+            written from refactored data. Defaults to all rows.
+        memory_map: if set to True, the file is memory-mapped instead of read into memory, which
+            avoids a copy for uncompressed formats. Defaults to False.
+
+    Returns:
+        A `pandas.DataFrame` with the exif data, with categorical columns restored.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    path = pathlib.Path(path)
+    file_format = table_format(path)
+    read_columns = list(columns) if columns is not None else None
+    if years is not None and read_columns is not None and "Year" not in read_columns:
+        read_columns.append("Year")  # needed for filtering, dropped afterwards
+
+    with metrics.stage("load"), timeit(
+        lambda spanned: logger.info(f"Loaded table '{path}' in {spanned:.4f} seconds")
+    ):
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(
+                path,
+                columns=read_columns,
+                filters=[("Year", "in", list(years))] if years is not None else None,
+                memory_map=memory_map,
+            )
+        elif file_format == "feather":
+            import pyarrow.feather as feather
+
+            table = feather.read_table(path, columns=read_columns, memory_map=memory_map)
+        else:
+            source = pa.memory_map(str(path)) if memory_map else pa.OSFile(str(path))
+            with source:
+                table = pa.ipc.open_file(source).read_all()
+            if read_columns is not None:
+                table = table.select(read_columns)
+
+        if years is not None and file_format != "parquet":
+            if "Year" not in table.column_names:
+                msg = "Filtering by year requires a 'Year' column, export refactored data to use it"
+                raise ValueError(msg)
+            table = table.filter(pc.is_in(table["Year"], value_set=pa.array(list(years), table["Year"].type)))
+        if columns is not None:
+            table = table.select(list(columns))
+
+        data = table.to_pandas()
+    logger.debug(f"Loaded {len(data)} rows and {len(data.columns)} columns")
+    return data
@@ -5,12 +5,16 @@ Created on 2019.08.15
 Some utilities for main functionality.
 """
 
+import itertools
 import pathlib
+import queue
 import sys
+import threading
 import time
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, as_completed, wait
 from contextlib import contextmanager
-from typing import Callable
+from typing import Any, Callable
 
 from loguru import logger
 
@@ -19,6 +23,8 @@ FOCAL_23: int = 23
 FOCAL_70: int = 70
 FOCAL_200: int = 200
 FOCAL_400: int = 400
+FOCAL_BOUNDARIES: tuple[float, ...] = (0, FOCAL_16, FOCAL_23, FOCAL_70, FOCAL_200, FOCAL_400, float("inf"))
+FOCAL_RANGES: tuple[str, ...] = ("1-15mm", "16-23mm", "24-70mm", "70-200mm", "200-400mm", "400mm+")
 
 
 @contextmanager
@@ -46,6 +52,119 @@ def timeit(function: Callable) -> Iterator[None]:
         function(time_used)
 
 
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Lazily split an iterable into lists of `size` elements, the last one possibly shorter.
+
+    Args:
+        iterable: the elements to split. Can be a lazy iterator.
+        size: the number of elements in each chunk.
+
+    Returns:
+        An iterator of lists.
+    """
+    if size < 1:
+        msg = "Chunk size should be a strictly positive integer"
+        raise ValueError(msg)
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def adaptive_chunksize(tasks: int, workers: int, max_chunksize: int = 64) -> int:
+    """
+    The number of tasks to send to a process pool worker at once, so that each worker gets about
+    four chunks. Larger chunks amortize the IPC round-trip of each task, while several chunks per
+    worker keep the load balanced and results flowing.
+
+    Args:
+        tasks: the number of tasks to run.
+        workers: the number of worker processes.
+        max_chunksize: the maximum size of a chunk. Defaults to 64.
+
+    Returns:
+        The chunk size, at least 1.
+    """
+    return max(1, min(max_chunksize, -(-tasks // (4 * workers))))
+
+
+def bounded_imap_unordered(
+    executor: Executor, function: Callable, iterable: Iterable, window: int
+) -> Iterator[Any]:
+    """
+    Lazily apply `function` to each element of `iterable` in the provided executor, yielding
+    results as they complete. At most `window` tasks are submitted at any given time, so that
+    the iterable is only consumed as fast as results are produced.
+
+    Args:
+        executor: the `concurrent.futures.Executor` in which to run the tasks.
+        function: any callable taking one argument.
+        iterable: the elements to apply `function` to. Can be a lazy iterator.
+        window: the maximum number of tasks pending at any given time.
+
+    Returns:
+        An iterator of the results, in completion order.
+    """
+    pending: set[Future] = set()
+    for element in iterable:
+        pending.add(executor.submit(function, element))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in as_completed(pending):
+        yield future.result()
+
+
+def prefetch(iterable: Iterable, maxsize: int) -> Iterator[Any]:
+    """
+    Consume `iterable` in a background thread, through a bounded queue, while the returned iterator
+    is being consumed. This lets an I/O-bound producer, such as a directory walk, run concurrently
+    with its consumer, while never holding more than `maxsize` elements in memory.
+
+    Args:
+        iterable: the elements to prefetch. Can be a lazy iterator.
+        maxsize: the maximum number of elements waiting in the queue.
+
+    Returns:
+        An iterator of the elements of `iterable`, in the same order. Exceptions raised while
+        consuming `iterable` are raised again from this iterator.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def _put(item: tuple[str, Any]) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def _produce() -> None:
+        try:
+            for element in iterable:
+                if not _put(("element", element)):
+                    return
+        except Exception as error:  # noqa: BLE001
+            _put(("error", error))  # raised again on the consumer side
+        else:
+            _put(("done", None))
+
+    threading.Thread(target=_produce, name="prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
 def figure_focal_range(focal_length: float) -> str:
     """
     Categorize the focal length value in different ranges. This is better for plotting the
@@ -68,9 +187,9 @@ def figure_focal_range(focal_length: float) -> str:
         return "16-23mm"
     if FOCAL_23 <= focal_length < FOCAL_70:
         return "24-70mm"
-    if FOCAL_200 <= focal_length < FOCAL_200:
+    if FOCAL_70 <= focal_length < FOCAL_200:
         return "70-200mm"
-    if FOCAL_400 <= focal_length < FOCAL_400:
+    if FOCAL_200 <= focal_length < FOCAL_400:
         return "200-400mm"
     return "400mm+"
 
@@ -0,0 +1,439 @@
+"""
+Created on 2026.10.18
+:author: Felix Soubelet
+
+Watching of a photo library, to keep insights up to date as files are added, modified or removed.
+
+Changes are detected with inotify on Linux, called through ctypes, or by periodically scanning
+the library elsewhere or when inotify is not available. Only changed files are extracted, their
+shots are added to or removed from the aggregates, and figures are rendered again once no change
+happened for a debounce interval.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+from collections.abc import Hashable, Iterable, Sequence
+from typing import Optional, Union
+
+import pandas as pd
+from loguru import logger
+
+from photocrawl.aggregates import InsightAggregates
+from photocrawl.pairing import representative, shot_key
+from photocrawl.photocrawl import PhotoCrawler
+from photocrawl.plotting_functions import plot_insight
+
+DEFAULT_DEBOUNCE: float = 5.0
+DEFAULT_POLL_INTERVAL: float = 2.0
+
+# inotify flags, from <sys/inotify.h>
+_IN_CLOSE_WRITE: int = 0x00000008
+_IN_MOVED_FROM: int = 0x00000040
+_IN_MOVED_TO: int = 0x00000080
+_IN_CREATE: int = 0x00000100
+_IN_DELETE: int = 0x00000200
+_IN_DELETE_SELF: int = 0x00000400
+_IN_MOVE_SELF: int = 0x00000800
+_IN_Q_OVERFLOW: int = 0x00004000
+_IN_IGNORED: int = 0x00008000
+_IN_ONLYDIR: int = 0x01000000
+_IN_ISDIR: int = 0x40000000
+_FILE_EVENTS: int = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+_WATCH_MASK: int = _FILE_EVENTS | _IN_CREATE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len, followed by a name of len bytes
+_READ_SIZE: int = 64 * 1024
+
+Signature = tuple[int, int]  # size and modification time in nanoseconds of a file
+
+
+class PollingWatcher:
+    """
+    Class to detect changes to the relevant files of a library by scanning it periodically.
+    """
+
+    __slots__ = {
+        "crawler": "PhotoCrawler whose crawl defines the watched files",
+        "interval": "float, number of seconds between two scans",
+        "_signatures": "dictionary of the paths of files found by the last scan to their signature",
+        "_next_scan": "float, the monotonic time of the next scan",
+    }
+
+    name: str = "polling"
+
+    def __init__(self, crawler: PhotoCrawler, interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            crawler: the `PhotoCrawler` whose crawl defines the watched files.
+            interval: the number of seconds between two scans of the library. Defaults to 2.
+        """
+        self.crawler: PhotoCrawler = crawler
+        self.interval: float = interval
+        self._signatures: dict[str, Signature] = self._scan()
+        self._next_scan: float = time.monotonic() + interval
+
+    def _scan(self) -> dict[str, Signature]:
+        signatures: dict[str, Signature] = {}
+        for photo_file in self.crawler.crawl_files():
+            signature = _signature(photo_file)
+            if signature is not None:
+                signatures[photo_file] = signature
+        return signatures
+
+    def poll(self, timeout: float) -> Optional[set[str]]:
+        """
+        Wait for the next scan of the library, at most `timeout` seconds.
+
+        Returns:
+            The set of paths of files created, modified or deleted since the previous scan, empty
+            if the library did not change or was not scanned.
+        """
+        remaining = self._next_scan - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        self._next_scan = time.monotonic() + self.interval
+        previous, self._signatures = self._signatures, self._scan()
+        return {
+            photo_file
+            for photo_file in previous.keys() | self._signatures.keys()
+            if previous.get(photo_file) != self._signatures.get(photo_file)
+        }
+
+    def close(self) -> None:
+        """Nothing to release for polling."""
+
+
+class InotifyWatcher:
+    """
+    Class to detect changes to the relevant files of a library with the inotify API of Linux,
+    watching every crawled directory.
+    """
+
+    __slots__ = {
+        "crawler": "PhotoCrawler whose crawl defines the watched files",
+        "_libc": "the ctypes.CDLL of the C library providing inotify functions",
+        "_fd": "integer, the file descriptor of the inotify instance",
+        "_directories": "dictionary of watch descriptors to the path of the watched directory",
+        "_extensions": "frozenset of the lowercase extensions of relevant files",
+    }
+
+    name: str = "inotify"
+
+    def __init__(self, crawler: PhotoCrawler):
+        """
+        Args:
+            crawler: the `PhotoCrawler` whose crawl defines the watched files.
+
+        Raises:
+            OSError: if inotify is not available, or its limit of watches is reached.
+        """
+        self.crawler: PhotoCrawler = crawler
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._directories: dict[int, str] = {}
+        self._extensions: frozenset[str] = frozenset(
+            f".{extension.lower()}" for extension in crawler.raw_formats
+        )
+        self._fd: int = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise _last_os_error("inotify_init1")
+        try:
+            self._watch_tree(str(crawler.top_level_location))
+        except OSError:
+            self.close()
+            raise
+        logger.debug(f"Watching {len(self._directories)} directories with inotify")
+
+    def _watch_tree(self, directory: str) -> list[str]:
+        """
+        Watch a directory and the sub-directories the crawler would crawl into.
+
+        Returns:
+            The paths of the relevant files found in these directories.
+        """
+        found: list[str] = []
+        to_watch: list[str] = [directory]
+        while to_watch:
+            path = to_watch.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK | _IN_ONLYDIR)
+            if wd < 0:
+                error = _last_os_error("inotify_add_watch", path)
+                if error.errno == errno.ENOSPC:
+                    raise error
+                logger.warning(f"Could not watch directory '{path}': {error}")
+                continue
+            if wd in self._directories:  # same inode as a watched directory, through a symlink
+                continue
+            self._directories[wd] = path
+            depth = self._depth(path)
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=self.crawler.follow_symlinks):
+                            if self._should_watch(entry.name, depth + 1):
+                                to_watch.append(entry.path)
+                        elif self._is_relevant(entry.name):
+                            found.append(entry.path)
+            except OSError as error:
+                logger.warning(f"Could not list directory '{path}': {error}")
+        return found
+
+    def _depth(self, directory: str) -> int:
+        relative_path = os.path.relpath(directory, self.crawler.top_level_location)
+        return 0 if relative_path == os.curdir else relative_path.count(os.sep) + 1
+
+    def _should_watch(self, name: str, depth: int) -> bool:
+        if self.crawler.max_depth is not None and depth > self.crawler.max_depth:
+            return False
+        return not any(fnmatch.fnmatch(name, pattern) for pattern in self.crawler.exclude_dirs)
+
+    def _is_relevant(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self._extensions
+
+    def poll(self, timeout: float) -> Optional[set[str]]:
+        """
+        Wait for changes to the watched directories, at most `timeout` seconds.
+
+        Returns:
+            The set of paths of files created, modified or deleted, empty if nothing changed, or
+            `None` if changes were lost, e.g. on an overflow of the event queue or the removal of
+            a directory, and the whole library should be scanned again.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: set[str] = set()
+        rescan: bool = False
+        while True:
+            try:
+                buffer = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                name = buffer[offset + _EVENT_HEADER.size : offset + _EVENT_HEADER.size + length]
+                offset += _EVENT_HEADER.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    logger.warning("Events were lost by inotify, scanning the library again")
+                    rescan = True
+                    continue
+                if mask & _IN_IGNORED:
+                    self._directories.pop(wd, None)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None:
+                    continue
+                if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                    rescan = True
+                    continue
+                path = os.path.join(directory, os.fsdecode(name.rstrip(b"\x00")))
+                if not mask & _IN_ISDIR:
+                    if mask & _FILE_EVENTS and self._is_relevant(path):
+                        changed.add(path)
+                elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                    if self._should_watch(os.path.basename(path), self._depth(path)):
+                        changed.update(self._watch_tree(path))
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    rescan = True  # the files it held are not known here
+        return None if rescan else changed
+
+    def close(self) -> None:
+        """Close the inotify instance, which removes all its watches."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(
+    crawler: PhotoCrawler, *, polling: bool = False, poll_interval: float = DEFAULT_POLL_INTERVAL
+) -> Union[InotifyWatcher, PollingWatcher]:
+    """
+    Create a watcher of the library of a crawler, using inotify when available.
+
+    Args:
+        crawler: the `PhotoCrawler` whose crawl defines the watched files.
+        polling: if set to True, the library is scanned periodically even if inotify is
+            available. Defaults to False.
+        poll_interval: the number of seconds between two scans, when polling. Defaults to 2.
+
+    Returns:
+        An `InotifyWatcher` or `PollingWatcher` object.
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(crawler)
+        except (OSError, AttributeError) as error:  # AttributeError if libc has no inotify functions
+            logger.warning(f"Could not watch the library with inotify, polling instead: {error}")
+    return PollingWatcher(crawler, poll_interval)
+
+
+class WatchedLibrary:
+    """
+    Class to handle the metadata and aggregates of a watched library, updated incrementally.
+    """
+
+    __slots__ = {
+        "crawler": "PhotoCrawler used to crawl the library and extract metadata",
+        "files": "dictionary of the paths of known files to their signature and metadata",
+        "shots": "dictionary of the key of each shot to the paths of its known files",
+        "aggregates": "InsightAggregates of the shots of all known files",
+    }
+
+    def __init__(self, crawler: PhotoCrawler):
+        """
+        Args:
+            crawler: the `PhotoCrawler` used to crawl the library and extract metadata. If it has
+                a cache, metadata is looked up in it first, and extracted metadata stored in it.
+        """
+        self.crawler: PhotoCrawler = crawler
+        self.files: dict[str, tuple[Signature, dict]] = {}
+        self.shots: dict[Hashable, set[str]] = {}
+        self.aggregates: InsightAggregates = self._aggregate([])
+
+    def _aggregate(self, rows: Sequence[dict]) -> InsightAggregates:
+        data = pd.DataFrame(list(rows), columns=self.crawler.interesting_features)
+        return InsightAggregates.from_data(self.crawler.refactor_exif_data(data))
+
+    def _shot_key(self, path: str) -> Hashable:
+        return shot_key(path) if self.crawler.pair_formats else path
+
+    def _shot_rows(self, shots: Iterable[Hashable]) -> list[dict]:
+        """The metadata of the representative file of each of the provided shots, as counted."""
+        return [self.files[representative(self.shots[shot])][1] for shot in shots if shot in self.shots]
+
+    def _extract(self, photo_files: Sequence[str]) -> Iterable[tuple[str, dict]]:
+        if self.crawler.cache is None:
+            return list(self.crawler.extract_metadata(photo_files))
+        results: list[tuple[str, dict]] = []
+        missing: list[str] = []
+        for photo_file, metadata in self.crawler.cache.lookup(photo_files):
+            if metadata is None:
+                missing.append(photo_file)
+            else:
+                results.append((photo_file, metadata))
+        extracted = list(self.crawler.extract_metadata(missing))
+        self.crawler.cache.store(extracted)
+        return results + extracted
+
+    def update(self, paths: Optional[Iterable[str]] = None) -> int:
+        """
+        Bring the library up to date with the files at the provided paths: files which appeared
+        or changed are extracted, and files which disappeared are forgotten. Aggregates are
+        updated with the shots of these files only. If the crawler pairs formats, files of a same
+        shot are counted once, see `photocrawl.pairing`.
+
+        Args:
+            paths: the paths of files which may have changed. Defaults to all known files and
+                all files found by crawling the library.
+
+        Returns:
+            The number of files added, modified or removed.
+        """
+        if paths is None:
+            paths = set(self.crawler.crawl_files()) | self.files.keys()
+        changed: dict[str, Optional[Signature]] = {}
+        for path in paths:
+            signature = _signature(path)
+            known = self.files.get(path)
+            if (known[0] if known is not None else None) != signature:
+                changed[path] = signature
+        if not changed:
+            return 0
+
+        shots: set[Hashable] = {self._shot_key(path) for path in changed}
+        removed_rows: list[dict] = self._shot_rows(shots)
+        for path in changed:
+            if self.files.pop(path, None) is not None:
+                shot = self._shot_key(path)
+                self.shots[shot].discard(path)
+                if not self.shots[shot]:
+                    del self.shots[shot]
+        to_extract = [path for path, signature in changed.items() if signature is not None]
+        for photo_file, metadata in self._extract(to_extract):
+            self.files[photo_file] = (changed[photo_file], metadata)
+            self.shots.setdefault(self._shot_key(photo_file), set()).add(photo_file)
+        added_rows: list[dict] = self._shot_rows(shots)
+
+        aggregates = self.aggregates.merge(self._aggregate(added_rows)) if added_rows else self.aggregates
+        self.aggregates = aggregates.subtract(self._aggregate(removed_rows)) if removed_rows else aggregates
+        logger.info(f"Updated {len(changed)} files, the library now holds {self.aggregates.total} shots")
+        return len(changed)
+
+
+def watch(
+    crawler: PhotoCrawler,
+    output_directory: pathlib.Path,
+    *,
+    debounce: float = DEFAULT_DEBOUNCE,
+    polling: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    **plot_options,
+) -> None:
+    """
+    Watch the library of a crawler until interrupted, and keep the insights figures in the output
+    directory up to date. Changed files are processed, and figures saved again, once no change
+    happened for `debounce` seconds. Figures whose data did not change are not saved again.
+
+    Args:
+        crawler: the `PhotoCrawler` of the library to watch.
+        output_directory: the directory to save figures in.
+        debounce: the number of seconds without changes to wait for before updating insights.
+            Defaults to 5.
+        polling: if set to True, the library is scanned periodically instead of using inotify.
+            Defaults to False.
+        poll_interval: the number of seconds between two scans, when polling. Defaults to 2.
+        **plot_options: options given to `plot_insight`, such as `dpi` or `file_format`.
+    """
+    watcher = make_watcher(crawler, polling=polling, poll_interval=poll_interval)  # before crawling
+    library = WatchedLibrary(crawler)
+
+    def _render() -> None:
+        if library.aggregates.total:
+            plot_insight(library.aggregates, output_directory, savefig=True, showfig=False, **plot_options)
+        else:
+            logger.warning("No shots in the library yet, not plotting insights")
+
+    try:
+        library.update()
+        _render()
+        logger.info(f"Watching '{crawler.top_level_location}' for changes with {watcher.name}")
+        pending: Optional[set[str]] = set()  # None when the whole library should be scanned
+        last_change: float = 0.0
+        while True:
+            changed = watcher.poll(timeout=min(debounce, poll_interval))
+            if changed is None or changed:
+                pending = None if changed is None or pending is None else pending | changed
+                last_change = time.monotonic()
+            elif (pending is None or pending) and time.monotonic() - last_change >= debounce:
+                if library.update(pending):
+                    _render()
+                pending = set()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        watcher.close()
+
+
+def _signature(path: str) -> Optional[Signature]:
+    """The size and modification time in nanoseconds of the file at `path`, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _last_os_error(function: str, path: Optional[str] = None) -> OSError:
+    """The `OSError` of the last failed C library call, from errno."""
+    code = ctypes.get_errno()
+    return OSError(code, f"{function}: {os.strerror(code)}", path)